@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class FriendslistConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Friendslist'
+
+    def ready(self):
+        from . import signals  # noqa
+        from posting.scheduler import scheduler
+        from . import suggestions
+        scheduler.register("friend_suggestions", suggestions.run_scheduled, suggestions.pending_due_times)
@@ -0,0 +1,132 @@
+"""
+Cached friend graph.
+
+Each user's friends are kept as a frozenset of user ids, in a bounded per-worker
+LRU in front of the shared Django cache, so `are_friends`, `friend_ids` and
+`mutual_count` are set operations instead of queries. Both layers are tagged
+with a graph version kept in the shared cache (settings.CACHES). Friend
+save/delete signals (Friendslist/signals.py) bump it, so every worker drops its
+copies on its next lookup and entries loaded before the change are never read
+again. The version is bumped again after commit, so a lookup that read the old
+friendships mid-transaction can't outlive it.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db.models import Q
+
+LOCAL_MAX_USERS = 10000
+SHARED_TTL = 60 * 60
+VERSION_KEY = "friends:version"
+
+
+def _user_id(user):
+    return getattr(user, "pk", user)
+
+
+def _cache_key(version, user_id):
+    return f"friends:{version}:{user_id}"
+
+
+class FriendGraph:
+    def __init__(self, max_users=LOCAL_MAX_USERS):
+        self.max_users = max_users
+        self._local = OrderedDict()  # user id -> frozenset of friend ids, for self._version
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _current_version(self):
+        """The shared graph version; local entries from any other version are dropped"""
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            version = time.time_ns()
+            cache.add(VERSION_KEY, version, None)
+        with self._lock:
+            if version != self._version:
+                self._local.clear()
+                self._version = version
+        return version
+
+    def _get_local(self, user_id):
+        with self._lock:
+            ids = self._local.get(user_id)
+            if ids is not None:
+                self._local.move_to_end(user_id)
+            return ids
+
+    def _set_local(self, version, user_id, ids):
+        with self._lock:
+            if version != self._version:
+                return  # the graph changed while these were loaded
+            self._local[user_id] = ids
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.max_users:
+                self._local.popitem(last=False)
+
+    def friend_ids_many(self, users):
+        """{user id: frozenset of friend ids} for several users, with at most one query"""
+        version = self._current_version()
+        result = {}
+        missing = []
+        for user_id in {_user_id(user) for user in users}:
+            ids = self._get_local(user_id)
+            if ids is None:
+                missing.append(user_id)
+            else:
+                result[user_id] = ids
+
+        if missing:
+            shared = cache.get_many([_cache_key(version, user_id) for user_id in missing])
+            to_load = []
+            for user_id in missing:
+                ids = shared.get(_cache_key(version, user_id))
+                if ids is None:
+                    to_load.append(user_id)
+                else:
+                    result[user_id] = frozenset(ids)
+                    self._set_local(version, user_id, result[user_id])
+            if to_load:
+                loaded = self._load(to_load)
+                cache.set_many(
+                    {_cache_key(version, user_id): list(ids) for user_id, ids in loaded.items()}, SHARED_TTL
+                )
+                for user_id, ids in loaded.items():
+                    self._set_local(version, user_id, ids)
+                result.update(loaded)
+        return result
+
+    def _load(self, user_ids):
+        from .models import Friend
+        adjacency = {user_id: set() for user_id in user_ids}
+        edges = Friend.objects.filter(
+            Q(user1_id__in=user_ids) | Q(user2_id__in=user_ids)
+        ).values_list("user1_id", "user2_id")
+        for user1_id, user2_id in edges:
+            if user1_id in adjacency:
+                adjacency[user1_id].add(user2_id)
+            if user2_id in adjacency:
+                adjacency[user2_id].add(user1_id)
+        return {user_id: frozenset(ids) for user_id, ids in adjacency.items()}
+
+    def friend_ids(self, user):
+        user_id = _user_id(user)
+        return self.friend_ids_many([user_id])[user_id]
+
+    def are_friends(self, a, b):
+        return _user_id(b) in self.friend_ids(a)
+
+    def mutual_count(self, a, b):
+        graph = self.friend_ids_many([a, b])
+        return len(graph[_user_id(a)] & graph[_user_id(b)])
+
+    def invalidate(self):
+        """Start a new graph version, here and in every other process"""
+        cache.set(VERSION_KEY, time.time_ns(), None)
+        with self._lock:
+            self._local.clear()
+            self._version = None
+
+
+friend_graph = FriendGraph()
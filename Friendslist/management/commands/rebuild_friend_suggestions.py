@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from Friendslist import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recomputes every user\'s friend suggestions from scratch'
+
+    def handle(self, *args, **options):
+        count = suggestions.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt friend suggestions for {count} users.'))
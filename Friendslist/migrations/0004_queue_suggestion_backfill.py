@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def queue_existing_users(apps, schema_editor):
+    """Queue a full refresh for every existing user; the friend_suggestions job fills their rows."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    SuggestionRefresh = apps.get_model('Friendslist', 'SuggestionRefresh')
+    SuggestionRefresh.objects.bulk_create(
+        (SuggestionRefresh(user_id=user_id) for user_id in User.objects.values_list('id', flat=True).iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('Friendslist', '0003_suggestionrefresh'),
+    ]
+
+    operations = [
+        migrations.RunPython(queue_existing_users, migrations.RunPython.noop),
+    ]
@@ -38,15 +38,14 @@ class Friend(models.Model):
 
     @classmethod
     def are_friends(cls, a: User, b: User) -> bool:
-        u1, u2 = cls.normalize_pair(a, b)
-        return cls.objects.filter(user1=u1, user2=u2).exists()
+        from .graph import friend_graph
+        return friend_graph.are_friends(a, b)
 
     @classmethod
     def get_friends(cls, user: User):
-        return User.objects.filter(
-            Q(friend_edges_as_user1__user2=user) |  # entries where other is user2 and user is user1
-            Q(friend_edges_as_user2__user1=user)    # entries where other is user1 and user is user2
-        ).distinct()
+        # Friend ids come from the cached friend graph, so this is a plain id lookup
+        from .graph import friend_graph
+        return User.objects.filter(id__in=friend_graph.friend_ids(user))
 
     def other_user(self, me: User) -> User:
         return self.user2 if self.user1_id == me.id else self.user1
@@ -70,3 +69,40 @@ class FriendRequest(models.Model):
 
     def __str__(self):
         return f"{self.from_user.username} → {self.to_user.username} ({self.status})"
+
+
+class FriendSuggestion(models.Model):
+    """
+    A precomputed "people you may know" entry: `candidate` suggested to `user`.
+    Maintained by Friendslist/suggestions.py when friendships or profiles change.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='friend_suggestions')
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    mutual_count = models.PositiveIntegerField(default=0)
+    shared_cuisines = models.PositiveIntegerField(default=0)
+    same_major = models.BooleanField(default=False)
+    score = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'candidate')
+        indexes = [models.Index(fields=['user', '-score'], name='friend_suggestion_rank_idx')]
+
+    def __str__(self):
+        return f"{self.candidate} for {self.user} ({self.score})"
+
+
+class SuggestionRefresh(models.Model):
+    """
+    Queued work for Friendslist/suggestions.py: the friendship between `user`
+    and `other` changed, or (no `other`) `user`'s profile did. Rows are saved
+    with the change and handled by the `friend_suggestions` scheduler job.
+    Plain ids rather than foreign keys, since deleting a user queues changes
+    for their friendships while the user row itself is being deleted.
+    """
+    user_id = models.PositiveIntegerField()
+    other_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id} ↔ {self.other_id}" if self.other_id else f"profile {self.user_id}"
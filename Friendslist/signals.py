@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from profiles.models import Profile
+
+from . import suggestions
+from .graph import friend_graph
+from .models import Friend
+
+_UNKNOWN = object()
+
+
+@receiver(post_save, sender=Friend)
+@receiver(post_delete, sender=Friend)
+def invalidate_friend_graph(sender, instance, **kwargs):
+    """Every worker sees a new or removed friendship on its next lookup"""
+    friend_graph.invalidate()
+    # Again after commit, in case a concurrent lookup cached the old state meanwhile
+    transaction.on_commit(friend_graph.invalidate)
+    suggestions.queue_friendship_change(instance.user1_id, instance.user2_id)
+
+
+@receiver(post_init, sender=Profile)
+def remember_major(sender, instance, **kwargs):
+    # The major as loaded, so a save can tell whether it changed without a query.
+    # Read from __dict__ so a deferred major isn't fetched.
+    instance._loaded_major = instance.__dict__.get("major", _UNKNOWN)
+
+
+@receiver(post_save, sender=Profile)
+def major_changed(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and "major" not in update_fields:
+        return
+    loaded, major = getattr(instance, "_loaded_major", _UNKNOWN), instance.__dict__.get("major", _UNKNOWN)
+    instance._loaded_major = major
+    if created or major is _UNKNOWN or loaded == major:
+        return
+    suggestions.queue_profile_change(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Profile.preferences.through)
+def cuisines_changed(sender, instance, action, reverse, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear") or reverse:
+        return
+    suggestions.queue_profile_change(instance.user_id)
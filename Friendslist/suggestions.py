@@ -0,0 +1,235 @@
+"""
+Friend-of-friend suggestions.
+
+Candidates for a user are friends of their friends, plus (so new users get
+suggestions too) a few people with the same major. Each is scored by mutual
+friends, shared cuisine preferences and a shared major, and stored in
+FriendSuggestion, so the find-friends page is one indexed read.
+
+Rows are kept current incrementally:
+- a friendship A-B changes: A's and B's suggestions are recomputed, and so are
+  the pairs (friend of A, B) and (friend of B, A), whose mutual count moved;
+- a profile's major or cuisines change: the user's suggestions and every row
+  that suggests them to someone else are recomputed.
+The signals in Friendslist/signals.py only queue a SuggestionRefresh row with
+the change; the `friend_suggestions` scheduler job (woken on commit) does the
+work in batches, recomputing each affected user once per batch, so accepting a
+friend request doesn't wait for it.
+`python manage.py rebuild_friend_suggestions` recomputes everything.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from posting.scheduler import scheduler
+
+from .graph import friend_graph
+
+MUTUAL_WEIGHT = 3
+CUISINE_WEIGHT = 1
+MAJOR_WEIGHT = 2
+MAX_SUGGESTIONS = 100  # stored per user
+SAME_MAJOR_CANDIDATES = 50  # extra non-friend-of-friend candidates per user
+BATCH_SIZE = 200  # queued changes per scheduler run
+
+
+def compute_score(mutual_count, shared_cuisines, same_major):
+    return mutual_count * MUTUAL_WEIGHT + shared_cuisines * CUISINE_WEIGHT + (MAJOR_WEIGHT if same_major else 0)
+
+
+def _normalize_major(major):
+    return (major or "").strip().lower()
+
+
+def _profile_data(user_ids):
+    """{user id: (normalized major, set of cuisine ids)} in two queries"""
+    from profiles.models import Profile
+    data = {user_id: ("", set()) for user_id in user_ids}
+    for user_id, major in Profile.objects.filter(user_id__in=user_ids).values_list("user_id", "major"):
+        data[user_id] = (_normalize_major(major), set())
+    cuisines = Profile.preferences.through.objects.filter(profile__user_id__in=user_ids)
+    for user_id, cuisine_id in cuisines.values_list("profile__user_id", "cuisine_id"):
+        data[user_id][1].add(cuisine_id)
+    return data
+
+
+def _score_pairs(pairs):
+    """
+    Build FriendSuggestion rows for (user id, candidate id) pairs.
+    Returns (rows, pairs that should not be suggested any more).
+    """
+    from .models import FriendSuggestion
+    user_ids = {user_id for pair in pairs for user_id in pair}
+    graph = friend_graph.friend_ids_many(user_ids)
+    profiles = _profile_data(user_ids)
+
+    rows, stale = [], []
+    for user_id, candidate_id in pairs:
+        friends = graph[user_id]
+        if candidate_id == user_id or candidate_id in friends:
+            stale.append((user_id, candidate_id))
+            continue
+        mutual = len(friends & graph[candidate_id])
+        major, cuisines = profiles[user_id]
+        candidate_major, candidate_cuisines = profiles[candidate_id]
+        same_major = bool(major) and major == candidate_major
+        if not mutual and not same_major:
+            stale.append((user_id, candidate_id))
+            continue
+        shared = len(cuisines & candidate_cuisines)
+        rows.append(FriendSuggestion(
+            user_id=user_id,
+            candidate_id=candidate_id,
+            mutual_count=mutual,
+            shared_cuisines=shared,
+            same_major=same_major,
+            score=compute_score(mutual, shared, same_major),
+        ))
+    return rows, stale
+
+
+def _same_major_candidates(user_id, exclude):
+    from profiles.models import Profile
+    major = Profile.objects.filter(user_id=user_id).values_list("major", flat=True).first()
+    major = (major or "").strip()
+    if not major:
+        return []
+    return list(
+        Profile.objects
+        .filter(major__iexact=major)
+        .exclude(user_id__in=exclude)
+        .values_list("user_id", flat=True)[:SAME_MAJOR_CANDIDATES]
+    )
+
+
+def refresh_user(user_id):
+    """Recompute all of one user's suggestions"""
+    from .models import FriendSuggestion
+    friends = friend_graph.friend_ids(user_id)
+    friends_of_friends = set()
+    for ids in friend_graph.friend_ids_many(friends).values():
+        friends_of_friends |= ids
+    friends_of_friends -= friends | {user_id}
+    candidates = friends_of_friends | set(
+        _same_major_candidates(user_id, exclude=friends | friends_of_friends | {user_id})
+    )
+
+    rows, _ = _score_pairs([(user_id, candidate_id) for candidate_id in candidates])
+    rows.sort(key=lambda row: row.score, reverse=True)
+    with transaction.atomic():
+        FriendSuggestion.objects.filter(user_id=user_id).delete()
+        FriendSuggestion.objects.bulk_create(rows[:MAX_SUGGESTIONS])
+
+
+def refresh_pairs(pairs):
+    """Recompute specific (user id, candidate id) rows, adding or dropping them as needed"""
+    from .models import FriendSuggestion
+    pairs = list(set(pairs))
+    if not pairs:
+        return
+    rows, stale = _score_pairs(pairs)
+    stale_by_user = defaultdict(list)
+    for user_id, candidate_id in stale:
+        stale_by_user[user_id].append(candidate_id)
+    with transaction.atomic():
+        for user_id, candidate_ids in stale_by_user.items():
+            FriendSuggestion.objects.filter(user_id=user_id, candidate_id__in=candidate_ids).delete()
+        FriendSuggestion.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["user", "candidate"],
+            update_fields=["mutual_count", "shared_cuisines", "same_major", "score", "updated_at"],
+        )
+
+
+def _friendship_pairs(user_a_id, user_b_id):
+    """Rows whose mutual count moved when a and b became (or stopped being) friends"""
+    graph = friend_graph.friend_ids_many([user_a_id, user_b_id])
+    pairs = []
+    for friend_id in graph[user_a_id] - {user_b_id}:
+        pairs += [(friend_id, user_b_id), (user_b_id, friend_id)]
+    for friend_id in graph[user_b_id] - {user_a_id}:
+        pairs += [(friend_id, user_a_id), (user_a_id, friend_id)]
+    return pairs
+
+
+def _profile_pairs(user_id):
+    """Scores are symmetric, so a changed profile is rescored for everyone it is suggested to"""
+    from .models import FriendSuggestion
+    others = set(FriendSuggestion.objects.filter(candidate_id=user_id).values_list("user_id", flat=True))
+    others |= set(FriendSuggestion.objects.filter(user_id=user_id).values_list("candidate_id", flat=True))
+    return [(other_id, user_id) for other_id in others]
+
+
+def _apply(friendships, profiles):
+    for user_id in {user_id for pair in friendships for user_id in pair} | set(profiles):
+        refresh_user(user_id)
+    pairs = [pair for a, b in friendships for pair in _friendship_pairs(a, b)]
+    pairs += [pair for user_id in profiles for pair in _profile_pairs(user_id)]
+    refresh_pairs(pairs)
+
+
+def friendship_changed(user_a_id, user_b_id):
+    """A friendship between a and b was made or broken"""
+    _apply({(user_a_id, user_b_id)}, set())
+
+
+def profile_changed(user_id):
+    """A user's major or cuisine preferences changed"""
+    _apply(set(), {user_id})
+
+
+def queue_friendship_change(user_a_id, user_b_id):
+    """Queue friendship_changed() with the current transaction, and wake the job on commit"""
+    from .models import SuggestionRefresh
+    SuggestionRefresh.objects.create(user_id=user_a_id, other_id=user_b_id)
+    _wake_later()
+
+
+def queue_profile_change(user_id):
+    """Queue profile_changed() with the current transaction, and wake the job on commit"""
+    from .models import SuggestionRefresh
+    SuggestionRefresh.objects.create(user_id=user_id)
+    _wake_later()
+
+
+def _wake_later():
+    transaction.on_commit(lambda: scheduler.schedule("friend_suggestions", timezone.now()))
+
+
+def pending_due_times():
+    """For the scheduler: due now if any change is queued"""
+    from .models import SuggestionRefresh
+    if SuggestionRefresh.objects.exists():
+        return [timezone.now()]
+    return []
+
+
+def process_queue(limit=BATCH_SIZE):
+    """Handle up to `limit` queued changes. Returns how many were handled."""
+    from .models import SuggestionRefresh
+    queued = list(SuggestionRefresh.objects.order_by("id").values_list("id", "user_id", "other_id")[:limit])
+    if not queued:
+        return 0
+    friendships = {tuple(sorted((user_id, other_id))) for _, user_id, other_id in queued if other_id}
+    profiles = {user_id for _, user_id, other_id in queued if not other_id}
+    _apply(friendships, profiles)
+    SuggestionRefresh.objects.filter(id__in=[row[0] for row in queued]).delete()
+    return len(queued)
+
+
+def run_scheduled(now):
+    """Scheduler job: handle one batch, and come back right away if more are waiting"""
+    if process_queue() >= BATCH_SIZE:
+        scheduler.schedule("friend_suggestions", timezone.now())
+
+
+def rebuild():
+    """Recompute every user's suggestions. Returns the number of users processed."""
+    from django.contrib.auth import get_user_model
+    count = 0
+    for user_id in get_user_model().objects.values_list("id", flat=True).iterator():
+        refresh_user(user_id)
+        count += 1
+    return count
@@ -1,3 +1,99 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from profiles.models import Profile
+
+from . import suggestions
+from .graph import friend_graph
+from .models import Friend, FriendSuggestion, SuggestionRefresh
+
+
+class FriendSuggestionQueueTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = (User.objects.create_user(name) for name in ("alice", "bob", "carol"))
+        self.addCleanup(friend_graph.invalidate)
+
+    def suggested(self, user):
+        return set(FriendSuggestion.objects.filter(user=user).values_list("candidate_id", flat=True))
+
+    def test_friendship_is_queued_not_computed(self):
+        Friend.make_friends(self.alice, self.bob)
+        Friend.make_friends(self.bob, self.carol)
+
+        self.assertEqual(SuggestionRefresh.objects.count(), 2)
+        self.assertEqual(self.suggested(self.alice), set())
+
+        self.assertEqual(suggestions.process_queue(), 2)
+        self.assertEqual(self.suggested(self.alice), {self.carol.id})
+        self.assertEqual(self.suggested(self.carol), {self.alice.id})
+        self.assertFalse(SuggestionRefresh.objects.exists())
+        self.assertEqual(suggestions.pending_due_times(), [])
+
+    def test_broken_friendship_drops_suggestions(self):
+        Friend.make_friends(self.alice, self.bob)
+        Friend.make_friends(self.bob, self.carol)
+        suggestions.process_queue()
+
+        Friend.break_friends(self.bob, self.carol)
+        suggestions.process_queue()
+        self.assertEqual(self.suggested(self.alice), set())
+        self.assertEqual(self.suggested(self.carol), set())
+
+    def test_process_queue_uses_the_current_graph(self):
+        Friend.make_friends(self.alice, self.bob)
+        suggestions.process_queue()
+        # Cached before the next friendship
+        friend_graph.friend_ids_many([self.alice.id, self.bob.id])
+        Friend.make_friends(self.bob, self.carol)
+
+        suggestions.process_queue()
+        self.assertEqual(self.suggested(self.alice), {self.carol.id})
+
+    def test_profile_saves_queue_only_major_changes(self):
+        profile = Profile.objects.get(user=self.alice)
+        profile.bio = "hi"
+        profile.save()
+        profile.major = "History"
+        profile.save(update_fields=["bio"])
+        self.assertFalse(SuggestionRefresh.objects.exists())
+
+        profile.save()
+        self.assertEqual(list(SuggestionRefresh.objects.values_list("user_id", "other_id")), [(self.alice.id, None)])
+        profile.save()
+        self.assertEqual(SuggestionRefresh.objects.count(), 1)
+
+    def test_same_major_suggestions_after_processing(self):
+        for user in (self.alice, self.bob):
+            profile = Profile.objects.get(user=user)
+            profile.major = "History"
+            profile.save()
+        suggestions.process_queue()
+        self.assertEqual(self.suggested(self.alice), {self.bob.id})
+        self.assertEqual(self.suggested(self.bob), {self.alice.id})
+
+    def test_deleting_a_user_with_friends(self):
+        Friend.make_friends(self.alice, self.bob)
+        Friend.make_friends(self.bob, self.carol)
+        suggestions.process_queue()
+
+        self.bob.delete()
+        suggestions.process_queue()
+        self.assertEqual(self.suggested(self.alice), set())
+        self.assertFalse(SuggestionRefresh.objects.exists())
+
+    def test_backfill_migration_queues_existing_users(self):
+        Friend.make_friends(self.alice, self.bob)
+        Friend.make_friends(self.bob, self.carol)
+        # Friendships from before suggestions were tracked
+        SuggestionRefresh.objects.all().delete()
+
+        backfill = import_module("Friendslist.migrations.0004_queue_suggestion_backfill")
+        backfill.queue_existing_users(apps, None)
+        self.assertEqual(SuggestionRefresh.objects.count(), User.objects.count())
+
+        suggestions.process_queue()
+        self.assertEqual(self.suggested(self.alice), {self.carol.id})
+        self.assertEqual(self.suggested(self.carol), {self.alice.id})
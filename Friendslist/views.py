@@ -5,14 +5,18 @@ from django.db.models import Q
 from django.db import transaction
 from django.shortcuts import render, redirect, get_object_or_404
 
+from profiles import search as people_search
+
+from .graph import friend_graph
 from .models import Friend, FriendRequest
 
 @login_required
 def FriendsList_index(request):
     user = request.user
 
+    friend_ids = friend_graph.friend_ids(user)
     friends = (
-        Friend.get_friends(user)
+        User.objects.filter(id__in=friend_ids)
         .select_related('profile')
         .order_by('username')
     )
@@ -38,21 +42,11 @@ def FriendsList_index(request):
     if search_query:
         # IDs you should NOT show in results
         exclude_ids = {user.id}
-        exclude_ids.update(friends.values_list("id", flat=True))
+        exclude_ids.update(friend_ids)
         exclude_ids.update(received_reqs.values_list("from_user_id", flat=True))
         exclude_ids.update(sent_reqs.values_list("to_user_id", flat=True))
 
-        search_results = (
-            User.objects
-            .filter(
-                Q(profile__display_name__icontains=search_query) |
-                Q(username__icontains=search_query) |
-                Q(email__icontains=search_query)
-            )
-            .exclude(id__in=exclude_ids)
-            .select_related("profile")
-            .order_by("username")[:20]
-        )
+        search_results = people_search.search_users(search_query, limit=20, exclude=exclude_ids)
     # -----------------------------------
 
     return render(request, 'Friendslist/index.html', {
@@ -60,7 +54,7 @@ def FriendsList_index(request):
         'received_reqs': received_reqs,
         'sent_reqs': sent_reqs,
         'counts': {
-            'friends': friends.count(),
+            'friends': len(friend_ids),
             'received': received_reqs.count(),
             'sent': sent_reqs.count(),
         },
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions
+
+
+def backfill_last_message(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    latest = Message.objects.filter(conversation=models.OuterRef('pk')).order_by('-timestamp', '-id')
+    Conversation.objects.update(
+        last_message_at=models.Subquery(latest.values('timestamp')[:1]),
+        last_message_preview=models.functions.Coalesce(
+            models.functions.Substr(models.Subquery(latest.values('content')[:1]), 1, 255), models.Value('')
+        ),
+        last_message_sender=models.Subquery(latest.values('sender')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0010_conversation_dm_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_preview',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
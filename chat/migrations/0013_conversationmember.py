@@ -0,0 +1,77 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_last_read(apps, schema_editor):
+    """
+    Start each member's watermark just below the oldest message they hadn't read,
+    or at the latest message if they had read everything.
+    """
+    ConversationMember = apps.get_model('chat', 'ConversationMember')
+    Message = apps.get_model('chat', 'Message')
+    in_conversation = Message.objects.filter(conversation=models.OuterRef('conversation'))
+    first_unread = (
+        in_conversation
+        .filter(is_read=False)
+        .exclude(sender=models.OuterRef('user'))
+        .order_by('id')
+        .values('id')[:1]
+    )
+    latest = in_conversation.order_by('-id').values('id')[:1]
+    ConversationMember.objects.update(
+        last_read_message_id=models.functions.Coalesce(
+            models.Subquery(first_unread) - 1,
+            models.Subquery(latest),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0012_message_history_idx'),
+    ]
+
+    operations = [
+        # Adopt the existing participants join table as an explicit through model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ConversationMember',
+                    fields=[
+                        ('id', models.AutoField(primary_key=True, serialize=False)),
+                        ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.conversation')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'chat_conversation_participants',
+                        'unique_together': {('conversation', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='conversations', through='chat.ConversationMember', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='last_read_message_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_last_read, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'id'], name='chat_message_unread_idx'),
+        ),
+    ]
@@ -1,16 +1,23 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from profiles.models import Profile
-from django.db.models import Q
+from django.db.models import Q, F, Func, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.db.models import Count
 from Friendslist.models import Friend, FriendRequest
+from posting.pagination import decode_cursor, encode_cursor
+from django.utils.dateformat import format as date_format
+from django.utils.timezone import localtime
 from datetime import datetime
 # Create your models here.
 
+MESSAGE_PAGE_SIZE = 50  # messages per history window
+
+
 class Conversation(models.Model):
     name = models.CharField(max_length=255, blank=True)  # for group name
     is_group = models.BooleanField(default=False)
-    participants = models.ManyToManyField(User, related_name='conversations')
+    participants = models.ManyToManyField(User, related_name='conversations', through='ConversationMember')
     created_at = models.DateTimeField(auto_now_add=True)
     dm_key = models.CharField(
         max_length=50,
@@ -19,6 +26,13 @@ class Conversation(models.Model):
         null=True,
         help_text="Canonical key for 1:1 DMs, e.g. '3:7'. Null for group chats."
     )
+    # Denormalized copy of the latest message, kept current by Message.save/delete,
+    # so conversation lists don't have to look at the messages table
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=255, blank=True)
+    last_message_sender = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
 
     def __str__(self):
         if self.is_group and self.name:
@@ -42,6 +56,93 @@ class Conversation(models.Model):
 
         return convo
 
+    @classmethod
+    def summaries(cls, user):
+        """
+        All of the user's conversations with last message, time and unread count,
+        most recent first, in one aggregated query (plus one to prefetch participants).
+        """
+        # Unread = messages above this user's watermark: a range scan on (conversation, id)
+        unread = (
+            Message.objects
+            .filter(conversation=OuterRef('pk'), id__gt=OuterRef('memberships__last_read_message_id'))
+            .exclude(sender=user)
+            .order_by()
+            .annotate(n=Func(F('id'), function='COUNT'))
+            .values('n')
+        )
+        return (
+            cls.objects
+            .filter(memberships__user=user)
+            .annotate(unread_count=Coalesce(Subquery(unread, output_field=models.IntegerField()), 0))
+            .select_related('last_message_sender')
+            .prefetch_related('participants__profile')
+            .order_by(F('last_message_at').desc(nulls_last=True), '-id')
+        )
+
+    def message_page(self, before=None, limit=MESSAGE_PAGE_SIZE):
+        """
+        One window of history, newest `limit` messages older than the `before`
+        cursor (or the latest ones). Returns (messages oldest-first, cursor for
+        the next older window or None).
+        """
+        qs = self.messages.select_related('sender__profile').order_by('-timestamp', '-id')
+        position = decode_cursor(before, datetime.fromisoformat, int)
+        if position:
+            timestamp, message_id = position
+            qs = qs.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id))
+        rows = list(qs[:limit + 1])
+        older = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            older = encode_cursor(rows[-1].timestamp.isoformat(), rows[-1].id)
+        return rows[::-1], older
+
+    def refresh_last_message(self):
+        """Recompute the last_message_* columns from the messages table"""
+        last = self.messages.order_by('-timestamp', '-id').first()
+        Conversation.objects.filter(id=self.id).update(
+            last_message_at=last.timestamp if last else None,
+            last_message_preview=last.content[:255] if last else '',
+            last_message_sender=last.sender_id if last else None,
+        )
+
+
+class ConversationMember(models.Model):
+    """
+    A participant of a conversation and how far they have read it.
+    Messages with an id above last_read_message_id (and not sent by the
+    member) are unread for them.
+    """
+    id = models.AutoField(primary_key=True)  # matches the table's existing integer key
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_memberships')
+    last_read_message_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'chat_conversation_participants'  # the table of the former plain M2M
+        unique_together = [('conversation', 'user')]
+
+    def __str__(self):
+        return f"{self.user} in {self.conversation}"
+
+    @classmethod
+    def mark_read(cls, conversation, user, up_to_message_id=None):
+        """
+        Move the user's watermark up to the given message (default: the latest one).
+        Never moves it back. Returns True if anything changed.
+        """
+        if up_to_message_id is None:
+            latest = conversation.messages.order_by('-id').values_list('id', flat=True).first()
+            if latest is None:
+                return False
+            up_to_message_id = latest
+        return bool(
+            cls.objects
+            .filter(conversation=conversation, user=user, last_read_message_id__lt=up_to_message_id)
+            .update(last_read_message_id=up_to_message_id)
+        )
+
 
 class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="messages")
@@ -55,59 +156,67 @@ class Message(models.Model):
     )
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Unread counts: messages in a conversation above a member's watermark
+            models.Index(fields=['conversation', 'id'], name='chat_message_unread_idx'),
+            # Message history is read newest-first per conversation, keyed on (timestamp, id)
+            models.Index(fields=['conversation', '-timestamp', '-id'], name='chat_message_history_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender} -> {self.recipient}: {self.content[:30]}"
 
-    @classmethod
-    def get_conversations(cls, user):
-        # 1) Who have I chatted with?
-        sent_to = cls.objects.filter(sender=user).values_list('recipient', flat=True).distinct()
-        received_from = cls.objects.filter(recipient=user).values_list('sender', flat=True).distinct()
-        user_ids = set(sent_to).union(set(received_from))
-        if not user_ids:
-            return []
-
-        # 2) Load all “other” users in bulk (avoid N+1)
-        others = User.objects.in_bulk(user_ids)  # dict {id: User}
-
-        conversations = []
-        for oid, other_user in others.items():
-            # 3) Latest message between us
-            last_msg = (
-                cls.objects
-                .filter(
-                    Q(sender=user, recipient=other_user) |
-                    Q(sender=other_user, recipient=user)
-                )
-                .only('content', 'timestamp')  # small optimization
-                .order_by('-timestamp')
-                .first()
+    def as_event(self):
+        """The message as sent to clients (history JSON and the live stream)"""
+        return {
+            "conversation_id": self.conversation_id,
+            "id": self.id,
+            "sender_id": self.sender_id,
+            "sender": getattr(getattr(self.sender, "profile", None), "display_name", "") or "Deleted User",
+            "content": self.content,
+            "timestamp": self.timestamp.isoformat(),
+            "time_display": date_format(localtime(self.timestamp), "M d, g:i A"),
+        }
+
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        super().save(*args, **kwargs)
+        if created:
+            from .realtime import publish_message
+            transaction.on_commit(lambda: publish_message(self))
+            # Conditional, so a message saved late never replaces a newer one
+            Conversation.objects.filter(id=self.conversation_id).filter(
+                Q(last_message_at__isnull=True) | Q(last_message_at__lte=self.timestamp)
+            ).update(
+                last_message_at=self.timestamp,
+                last_message_preview=self.content[:255],
+                last_message_sender=self.sender_id,
             )
 
-            # 4) Unread messages from the other user → me
-            unread_count = cls.objects.filter(
-                sender=other_user,
-                recipient=user,
-                is_read=False
-            ).count()
+    def delete(self, *args, **kwargs):
+        conversation = self.conversation
+        result = super().delete(*args, **kwargs)
+        if conversation.last_message_at == self.timestamp:
+            conversation.refresh_last_message()
+        return result
 
+    @classmethod
+    def get_conversations(cls, user):
+        """Summary of each of the user's 1:1 conversations, most recent first"""
+        conversations = []
+        for convo in Conversation.summaries(user).filter(is_group=False):
+            other_user = next((p for p in convo.participants.all() if p.id != user.id), None)
+            if other_user is None:
+                continue
             conversations.append({
                 'other_user': other_user,
-                'last_message': last_msg.content if last_msg else '',
-                'last_message_time': last_msg.timestamp if last_msg else None,
-                'unread_count': unread_count,
+                'last_message': convo.last_message_preview,
+                'last_message_time': convo.last_message_at,
+                'unread_count': convo.unread_count,
             })
-
-        # 5) Sort most-recent first (None goes last)
-        conversations.sort(
-            key=lambda c: c['last_message_time'] or datetime.min,
-            reverse=True
-        )
         return conversations
 
     @classmethod
@@ -0,0 +1,186 @@
+"""
+Real-time delivery of chat messages.
+
+New messages are published (after commit) to a pub/sub backend, which hands them
+to the in-process Hub of every worker. The Hub fans each message out to the
+Server-Sent Events streams open on that worker for the message's conversation
+(see chat.views.message_stream).
+
+Backends:
+- InProcessBackend: delivers to this process only (single worker, dev server).
+- PostgresNotifyBackend: NOTIFY on publish, and one LISTEN thread per process,
+  so every worker sees every message.
+
+Pick one with CHAT_PUBSUB_BACKEND (a dotted path); by default Postgres uses
+LISTEN/NOTIFY and everything else stays in-process.
+"""
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100  # a stream this far behind is dropped; it reconnects and catches up
+NOTIFY_CHANNEL = "chat_messages"
+NOTIFY_MAX_PAYLOAD = 7500  # bytes; Postgres caps NOTIFY payloads at 8000
+
+
+class Subscription:
+    """One open stream's view of a conversation: an asyncio queue on the stream's loop"""
+
+    def __init__(self, conversation_id):
+        self.conversation_id = conversation_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class Hub:
+    """Fans events out to this process' subscribers, by conversation id"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, conversation_id):
+        subscription = Subscription(conversation_id)
+        with self._lock:
+            self._subscribers.setdefault(conversation_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.conversation_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.conversation_id]
+
+    def dispatch(self, event):
+        """Thread-safe: called from request threads or a LISTEN thread"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(event["conversation_id"], ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:
+                self.unsubscribe(subscription)  # its event loop has closed
+
+
+hub = Hub()
+
+
+class InProcessBackend:
+    def start(self):
+        pass
+
+    def publish(self, event):
+        hub.dispatch(event)
+
+
+class PostgresNotifyBackend(InProcessBackend):
+    """Fan-out across worker processes with Postgres LISTEN/NOTIFY"""
+
+    def __init__(self):
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        """Start this process' LISTEN thread (once per process)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._listen_forever, name="chat-listen", daemon=True)
+        self._thread.start()
+
+    def publish(self, event):
+        self.start()
+        payload = json.dumps(event)
+        if len(payload.encode()) > NOTIFY_MAX_PAYLOAD:
+            # Too big for NOTIFY; listeners load the message themselves
+            payload = json.dumps({"conversation_id": event["conversation_id"], "id": event["id"]})
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [NOTIFY_CHANNEL, payload])
+
+    def _listen_forever(self):
+        while True:
+            try:
+                self._listen()
+            except (DatabaseError, OSError):
+                logger.exception("Chat LISTEN connection failed, reconnecting")
+                time.sleep(5)
+
+    def _listen(self):
+        db = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            db.ensure_connection()  # autocommit, so notifications arrive right away
+            raw = db.connection
+            with raw.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            if callable(getattr(raw, "notifies", None)):  # psycopg 3
+                for notify in raw.notifies():
+                    self._receive(notify.payload)
+            else:  # psycopg2
+                while True:
+                    select.select([raw], [], [], 60)
+                    raw.poll()
+                    while raw.notifies:
+                        self._receive(raw.notifies.pop(0).payload)
+        finally:
+            db.close()
+
+    def _receive(self, payload):
+        event = json.loads(payload)
+        if "content" not in event:
+            from .models import Message
+            message = Message.objects.select_related("sender__profile").filter(id=event["id"]).first()
+            if message is None:
+                return
+            event = message.as_event()
+        hub.dispatch(event)
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "CHAT_PUBSUB_BACKEND", None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == "postgresql":
+            _backend = PostgresNotifyBackend()
+        else:
+            _backend = InProcessBackend()
+    return _backend
+
+
+def publish_message(message):
+    """Deliver a newly saved message to every open stream of its conversation"""
+    try:
+        get_backend().publish(message.as_event())
+    except DatabaseError:
+        # Streams catch up from the database when they reconnect
+        logger.exception("Could not publish chat message %s", message.id)
+
+
+def format_sse(event, event_type="message"):
+    return f"id: {event['id']}\nevent: {event_type}\ndata: {json.dumps(event)}\n\n"
@@ -1,3 +1,183 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from .models import MESSAGE_PAGE_SIZE, Conversation, ConversationMember, Message
+
+
+class MessageStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="pw")
+        other = User.objects.create_user("bob", password="pw")
+        self.conversation = Conversation.get_or_create_dm(self.user, other)
+        self.client.force_login(self.user)
+
+    def test_wsgi_page_does_not_open_a_stream(self):
+        response = self.client.get(reverse("chat:conversation", args=[self.conversation.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "data-stream-url")
+
+    def test_wsgi_stream_tells_eventsource_to_stop(self):
+        response = self.client.get(reverse("chat:message_stream", args=[self.conversation.id]))
+        self.assertEqual(response.status_code, 204)
+
+    def test_send_with_fetch_returns_the_message(self):
+        response = self.client.post(
+            reverse("chat:conversation", args=[self.conversation.id]),
+            {"message": "hello"},
+            HTTP_ACCEPT="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["message"]["content"], "hello")
+        self.assertEqual(self.conversation.messages.count(), 1)
+
+
+class ReadWatermarkTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+        self.conversation = Conversation.get_or_create_dm(self.alice, self.bob)
+
+    def send(self, sender, content="hi"):
+        return Message.objects.create(conversation=self.conversation, sender=sender, content=content)
+
+    def unread(self, user):
+        return Conversation.summaries(user).get(id=self.conversation.id).unread_count
+
+    def test_unread_counts_follow_each_members_watermark(self):
+        first = self.send(self.alice)
+        self.send(self.alice)
+        self.send(self.bob)  # own messages are never unread
+        self.assertEqual((self.unread(self.alice), self.unread(self.bob)), (1, 2))
+
+        self.assertTrue(ConversationMember.mark_read(self.conversation, self.bob, first.id))
+        self.assertEqual((self.unread(self.alice), self.unread(self.bob)), (1, 1))
+
+        self.assertTrue(ConversationMember.mark_read(self.conversation, self.bob))
+        self.assertEqual((self.unread(self.alice), self.unread(self.bob)), (1, 0))
+
+    def test_watermark_never_moves_back(self):
+        first = self.send(self.alice)
+        self.send(self.alice)
+        self.assertTrue(ConversationMember.mark_read(self.conversation, self.bob))
+        self.assertFalse(ConversationMember.mark_read(self.conversation, self.bob, first.id))
+        self.assertEqual(self.unread(self.bob), 0)
+
+    def test_empty_conversation(self):
+        self.assertFalse(ConversationMember.mark_read(self.conversation, self.bob))
+
+
+class ConversationMemberMigrationTests(TransactionTestCase):
+    before = [("chat", "0012_message_history_idx")]
+    after = [("chat", "0013_conversationmember")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_adopts_the_participants_table_and_backfills_watermarks(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model("auth", "User")
+        Conversation = apps.get_model("chat", "Conversation")
+        Message = apps.get_model("chat", "Message")
+        alice = User.objects.create(username="alice")
+        bob = User.objects.create(username="bob")
+        conversation = Conversation.objects.create(dm_key=f"{alice.id}:{bob.id}")
+        conversation.participants.add(alice, bob)
+        read = Message.objects.create(conversation=conversation, sender=alice, content="read", is_read=True)
+        Message.objects.create(conversation=conversation, sender=alice, content="unread", is_read=False)
+        last = Message.objects.create(conversation=conversation, sender=bob, content="reply", is_read=True)
+
+        apps = self.migrate(self.after)
+        Member = apps.get_model("chat", "ConversationMember")
+        self.assertNotIn("is_read", [field.name for field in apps.get_model("chat", "Message")._meta.fields])
+        watermarks = dict(Member.objects.filter(conversation_id=conversation.id).values_list("user_id",
+                                                                                           "last_read_message_id"))
+        # Bob stops just before Alice's first unread message; Alice had read all of Bob's
+        self.assertEqual(watermarks, {bob.id: read.id, alice.id: last.id})
+
+
+class ConversationSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice")
+
+    def dm_with(self, name, *contents):
+        other = User.objects.create_user(name)
+        conversation = Conversation.get_or_create_dm(self.user, other)
+        for content in contents:
+            Message.objects.create(conversation=conversation, sender=other, content=content)
+        return conversation
+
+    def summary_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            summaries = list(Conversation.summaries(self.user))
+            for summary in summaries:
+                list(summary.participants.all())
+        return len(queries), summaries
+
+    def test_query_count_does_not_grow_with_partners(self):
+        self.dm_with("bob", "hi")
+        few, _ = self.summary_queries()
+        for name in ("carol", "dave", "erin", "frank"):
+            self.dm_with(name, "hello", "there")
+        many, summaries = self.summary_queries()
+        self.assertEqual(few, many)
+        self.assertEqual([summary.unread_count for summary in summaries], [2, 2, 2, 2, 1])
+
+    def test_last_message_columns_follow_inserts_and_deletes(self):
+        conversation = self.dm_with("bob", "first", "second")
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.last_message_preview, "second")
+
+        conversation.messages.order_by("-id").first().delete()
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.last_message_preview, "first")
+
+        conversation.messages.get().delete()
+        conversation.refresh_from_db()
+        self.assertEqual((conversation.last_message_preview, conversation.last_message_at), ("", None))
+
+
+class MessageHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice")
+        other = User.objects.create_user("bob")
+        self.conversation = Conversation.get_or_create_dm(self.user, other)
+        Message.objects.bulk_create(
+            Message(conversation=self.conversation, sender=other, content=str(n))
+            for n in range(MESSAGE_PAGE_SIZE * 2 + 5)
+        )
+        self.all_ids = list(self.conversation.messages.order_by("timestamp", "id").values_list("id", flat=True))
+        self.client.force_login(self.user)
+
+    def test_first_render_is_capped(self):
+        response = self.client.get(reverse("chat:conversation", args=[self.conversation.id]))
+        self.assertEqual([m.id for m in response.context["messages"]], self.all_ids[-MESSAGE_PAGE_SIZE:])
+        self.assertIsNotNone(response.context["older_cursor"])
+
+    def test_load_older_walks_the_whole_history_once(self):
+        url = reverse("chat:message_history", args=[self.conversation.id])
+        seen, cursor = [], None
+        while True:
+            data = self.client.get(url, {"before": cursor} if cursor else {}).json()
+            self.assertLessEqual(len(data["messages"]), MESSAGE_PAGE_SIZE)
+            seen = [m["id"] for m in data["messages"]] + seen
+            cursor = data["older_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.all_ids)
+
+    def test_ties_on_timestamp_are_broken_by_id(self):
+        Message.objects.filter(conversation=self.conversation).update(timestamp=self.conversation.created_at)
+        newest, cursor = self.conversation.message_page(limit=3)
+        older, _ = self.conversation.message_page(cursor, limit=3)
+        self.assertEqual([m.id for m in older + newest], self.all_ids[-6:])
@@ -6,6 +6,9 @@ app_name = 'chat'
 urlpatterns = [
     path('', views.messages_index, name="index"),
     path("conversation/<int:convo_id>/", views.conversation_detail, name="conversation"),
+    path("conversation/<int:convo_id>/messages/", views.message_history, name="message_history"),
+    path("conversation/<int:convo_id>/stream/", views.message_stream, name="message_stream"),
+    path("conversation/<int:convo_id>/read/", views.mark_read, name="mark_read"),
     path("start-converstaion/", views.start_conversation, name="start_conversation"),
     path("dm/<int:user_id>/", views.dm_with_user, name="dm_with_user"),
     path("find-friends/", views.find_friends, name="find_friends"),
@@ -1,34 +1,41 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 from django.contrib.auth.models import User
-from django.db.models import Q, Case, When, IntegerField
 from django.contrib.contenttypes.models import ContentType
 from .models import Message
-from .models import Friend
-from .models import FriendRequest, Conversation
+from .models import FriendRequest, Conversation, ConversationMember
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Max, Count, Q
+from Friendslist.graph import friend_graph
+from Friendslist.models import FriendSuggestion
+from profiles import search as people_search
+from posting import badges
+from . import realtime
+
+STREAM_BACKLOG_LIMIT = 200  # messages sent to a (re)connecting stream
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_MAX_SECONDS = 300
 
 
 
 # Create your views here.
 @login_required
 def messages_index(request):
-    qs = (
+    latest = (
         request.user.conversations
-        .annotate(
-            last_time=Max('messages__timestamp'),
-            unread_count=Count(
-                'messages',
-                filter=Q(messages__is_read=False) & ~Q(messages__sender=request.user)
-            )
-        )
-        .order_by('-last_time')
+        .filter(last_message_at__isnull=False)
+        .order_by('-last_message_at')
+        .only('id')
+        .first()
     )
-
-    latest = qs.first()
-    if latest and latest.last_time is not None:
+    if latest:
         return redirect('chat:conversation', convo_id=latest.id)
 
     return render(request, 'chat/index.html', {
@@ -44,13 +51,12 @@ def conversation_detail(request, convo_id):
         participants=request.user
     )
 
-    # 2) All messages in this conversation
-    messages_qs = conversation.messages.select_related("sender").all()
+    # 2) The latest window of messages (or an older one, via ?before=)
+    messages_page, older_cursor = conversation.message_page(request.GET.get("before"))
 
-    # mark messages in this convo as read (except ones I sent)
-    conversation.messages.filter(
-        is_read=False
-    ).exclude(sender=request.user).update(is_read=True)
+    # mark messages in this convo as read, up to the newest one shown
+    if messages_page and ConversationMember.mark_read(conversation, request.user, messages_page[-1].id):
+        badges.invalidate_user(request.user.id)
 
     # 3) For 1:1 chat, figure out the "other_user"
     other_user = None
@@ -60,27 +66,22 @@ def conversation_detail(request, convo_id):
     # 4) Handle sending a new message
     if request.method == "POST":
         content = (request.POST.get("message") or "").strip()
+        message = None
         if content:
-            Message.objects.create(
+            message = Message.objects.create(
                 conversation=conversation,
                 sender=request.user,
                 content=content,
             )
+        # Sent with fetch(): no redirect and re-render, the stream shows the message
+        if "application/json" in request.headers.get("Accept", ""):
+            if message is None:
+                return JsonResponse({"error": "Message is empty."}, status=400)
+            return JsonResponse({"message": dict(message.as_event(), own=True)}, status=201)
         return redirect("chat:conversation", convo_id=conversation.id)
 
     
-    all_conversations = (
-        request.user.conversations
-        .annotate(
-            last_time=Max('messages__timestamp'),
-            unread_count=Count(
-                'messages',
-                filter=Q(messages__is_read=False) & ~Q(messages__sender=request.user)
-            )
-        )
-        .order_by('-last_time')
-        .prefetch_related("participants")
-    )
+    all_conversations = Conversation.summaries(request.user)
 
     # Get content type for Message model (for flagging)
     from django.contrib.contenttypes.models import ContentType
@@ -89,12 +90,120 @@ def conversation_detail(request, convo_id):
     return render(request, "chat/conversation.html", {
         "conversation": conversation,
         "other_user": other_user,          # None for groups
-        "messages": messages_qs,
+        "messages": messages_page,
+        "older_cursor": older_cursor,
+        "latest_message_id": messages_page[-1].id if messages_page else 0,
+        # Live updates need a held-open stream, i.e. ASGI; an older window doesn't take new messages
+        "is_live": isinstance(request, ASGIRequest) and not request.GET.get("before"),
         "all_conversations": all_conversations,
         "message_content_type_id": message_content_type.id,
     })
 
 
+@login_required
+def message_history(request, convo_id):
+    """JSON "load older" endpoint: the window of messages before ?before=<cursor>"""
+    conversation = get_object_or_404(Conversation, id=convo_id, participants=request.user)
+    messages_page, older_cursor = conversation.message_page(request.GET.get("before"))
+
+    return JsonResponse({
+        "messages": [
+            dict(message.as_event(), own=message.sender_id == request.user.id)
+            for message in messages_page
+        ],
+        "older_cursor": older_cursor,
+    })
+
+
+@login_required
+@require_POST
+def mark_read(request, convo_id):
+    """Called by the conversation page when it shows messages that arrived live"""
+    conversation = get_object_or_404(Conversation, id=convo_id, participants=request.user)
+    try:
+        up_to = int(request.POST.get("up_to", ""))
+    except ValueError:
+        return JsonResponse({"error": "up_to must be a message id."}, status=400)
+    if ConversationMember.mark_read(conversation, request.user, up_to):
+        badges.invalidate_user(request.user.id)
+    return JsonResponse({"status": "ok"})
+
+
+def _stream_backlog(request, convo_id):
+    """
+    For message_stream: check access and load what the client missed, i.e. messages
+    after Last-Event-ID (sent by EventSource on reconnect) or ?after=<message id>.
+    Returns (conversation or None, list of events).
+    """
+    if not request.user.is_authenticated:
+        return None, []
+    conversation = Conversation.objects.filter(id=convo_id, participants=request.user).first()
+    if conversation is None:
+        return None, []
+
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.GET.get("after") or 0)
+    except ValueError:
+        after = 0
+    backlog = (
+        conversation.messages
+        .filter(id__gt=after)
+        .select_related("sender__profile")
+        .order_by("id")[:STREAM_BACKLOG_LIMIT]
+    )
+    return conversation, [message.as_event() for message in backlog]
+
+
+async def message_stream(request, convo_id):
+    """
+    Server-Sent Events stream of new messages in a conversation.
+    Only served under ASGI, where it stays open and pushes messages as they're
+    sent. A WSGI worker can't hold it open, so there the conversation page
+    doesn't open a stream and this answers 204, which tells EventSource to stop
+    reconnecting.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    realtime.get_backend().start()
+    # Subscribe before reading the backlog so nothing sent in between is missed
+    subscription = realtime.hub.subscribe(convo_id)
+    conversation, backlog = await sync_to_async(_stream_backlog)(request, convo_id)
+    if conversation is None:
+        realtime.hub.unsubscribe(subscription)
+        raise Http404("Conversation not found")
+
+    async def events():
+        sent = {event["id"] for event in backlog}
+        # A full backlog may not be everything: close, and resume from its last id
+        deadline = time.monotonic() + (0 if len(backlog) >= STREAM_BACKLOG_LIMIT else STREAM_MAX_SECONDS)
+        try:
+            yield "retry: 2000\n\n"
+            for event in backlog:
+                yield realtime.format_sse(event)
+            # Close now and then; EventSource reconnects with Last-Event-ID
+            while time.monotonic() < deadline and not subscription.overflowed:
+                try:
+                    event = await subscription.get(STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event["id"] not in sent:
+                    sent.add(event["id"])
+                    yield realtime.format_sse(event)
+        finally:
+            realtime.hub.unsubscribe(subscription)
+
+    return _sse_response(events())
+
+
+def _sse_response(events):
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let proxies buffer the stream
+    return response
+
+
 @login_required
 def start_conversation(request):
     # ---------- POST: create DM or group ----------
@@ -128,19 +237,15 @@ def start_conversation(request):
     query = (request.GET.get('q') or '').strip()
 
     # All friends (so we know who is already a friend)
-    friends_qs = Friend.get_friends(request.user).select_related('profile').order_by('username')
-    friend_ids = list(friends_qs.values_list('id', flat=True))
+    friend_ids = friend_graph.friend_ids(request.user)
+    friends_qs = User.objects.filter(id__in=friend_ids).select_related('profile').order_by('username')
 
     # Base queryset: by default, show just friends
     users_qs = friends_qs
 
-    # Optional search: filter friends by display_name OR username OR email
+    # Optional search among friends, best match first
     if query:
-        users_qs = users_qs.filter(
-            Q(profile__display_name__icontains=query) |
-            Q(username__icontains=query) |
-            Q(email__icontains=query)
-        )
+        users_qs = people_search.search_users(query, among=friend_ids, limit=100)
 
     # Pagination
     page_number = request.GET.get('page', 1)
@@ -188,7 +293,7 @@ def find_friends(request):
     q = request.GET.get('q', '').strip()
 
     # current friends
-    friend_ids = set(Friend.get_friends(request.user).values_list('id', flat=True))
+    friend_ids = friend_graph.friend_ids(request.user)
 
     # outgoing pending (map to_user_id -> request id)
     outgoing = {
@@ -205,11 +310,24 @@ def find_friends(request):
             .values_list('from_user_id', flat=True)
     )
 
-    # candidate users
-    qs = User.objects.exclude(id=request.user.id)
-    if q:
-        qs = qs.filter(Q(username__icontains=q) | Q(email__icontains=q))
-    qs = qs.order_by('username')[:50]
+    if not q:
+        # precomputed friend-of-friend suggestions (Friendslist/suggestions.py)
+        rows = (
+            FriendSuggestion.objects
+            .filter(user=request.user)
+            .exclude(candidate_id__in=set(outgoing) | incoming_ids)
+            .select_related('candidate')
+            .order_by('-score', 'candidate_id')[:50]
+        )
+        suggested = [
+            {'user': row.candidate, 'status': 'none', 'cancel_req_id': None,
+             'mutual_count': row.mutual_count, 'same_major': row.same_major}
+            for row in rows
+        ]
+        return render(request, 'chat/find_friends.html', {'users': suggested, 'query': q})
+
+    # candidate users, best match first
+    qs = people_search.search_users(q, limit=50, exclude={request.user.id})
 
     users = []
     for u in qs:
@@ -0,0 +1,229 @@
+"""
+Buffered, append-only writer for ModeratorActivityLog.
+
+`record()` only appends the entry to this worker's journal file (after the
+surrounding transaction commits), so requests never wait on audit-log writes.
+A background thread writes the journal with bulk_create once it holds
+FLUSH_SIZE entries or FLUSH_INTERVAL seconds have passed, and again at process
+exit.
+
+Nothing is dropped silently:
+- every entry is on disk (MODERATION_ACTIVITY_LOG_SPOOL_DIR) before it is
+  counted as buffered, so a worker that is killed, times out or runs out of
+  memory leaves its unwritten entries behind; another worker replays them once
+  they have been untouched for STALE_AFTER (a host crash can still lose the
+  last few entries, which are not fsynced);
+- if the database is unavailable, the batch stays in the spool directory and is
+  replayed by the next successful flush in any worker;
+- if a batch is rejected (e.g. it points at a row that no longer exists), its
+  entries are retried one by one and any that still fail are logged in full.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = 100  # entries
+FLUSH_INTERVAL = 2  # seconds
+# A journal or in-flight batch left alone this long belongs to a dead worker
+STALE_AFTER = 600  # seconds
+
+
+def spool_dir():
+    return getattr(settings, "MODERATION_ACTIVITY_LOG_SPOOL_DIR",
+                   os.path.join(settings.BASE_DIR, "activity_log_spool"))
+
+
+class ActivityLogWriter:
+    """
+    Spool directory layout:
+    - <pid>.journal: entries appended by a live worker, not yet flushed
+    - <pid>.<n>.writing: a batch that worker is writing to the database
+    - <pid>.<n>.jsonl: a batch whose write failed, replayed by any worker
+    - <pid>.<n>.replaying: a spooled batch claimed by a replaying worker
+    """
+
+    def __init__(self, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL, directory=None):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._directory = directory
+        self._pending = 0
+        self._journal = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def directory(self):
+        return self._directory or spool_dir()
+
+    def _journal_path(self):
+        return os.path.join(self.directory, f"{os.getpid()}.journal")
+
+    def _batch_path(self, suffix):
+        return os.path.join(self.directory, f"{os.getpid()}.{time.time_ns()}.{suffix}")
+
+    def append(self, entry):
+        self._ensure_thread()
+        line = json.dumps({**entry, "created_at": entry["created_at"].isoformat()}) + "\n"
+        with self._cond:
+            if self._journal is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._journal = open(self._journal_path(), "a", encoding="utf-8")
+            self._journal.write(line)
+            self._journal.flush()  # into the OS, so it outlives this process
+            self._pending += 1
+            if self._pending >= self.flush_size:
+                self._cond.notify()
+
+    def _ensure_thread(self):
+        """Start this process' flusher thread (once per process, also after a fork)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid != os.getpid():
+                # The journal copied from the parent is the parent's to write
+                if self._journal is not None:
+                    self._journal.close()
+                self._journal = None
+                self._pending = 0
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="activity-log", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._pending < self.flush_size:
+                    self._cond.wait(self.flush_interval)
+            self.flush()
+            close_old_connections()
+
+    def _rotate(self):
+        """Close the journal and turn it into a batch file; returns its path, or None if empty"""
+        with self._cond:
+            if self._journal is None:
+                return None
+            self._journal.close()
+            self._journal = None
+            self._pending = 0
+            batch = self._batch_path("writing")
+            try:
+                os.rename(self._journal_path(), batch)
+            except FileNotFoundError:
+                return None  # taken over as stale by another worker, which writes it
+            os.utime(batch)  # fresh, so nobody takes it over while it is being written
+            return batch
+
+    def flush(self):
+        """Write everything journaled so far, plus any spooled entries. Safe to call from any thread."""
+        with self._flush_lock:
+            batch = self._rotate()
+            if batch is not None and not self._write_file(batch):
+                return
+            self._replay_spool()
+
+    def _write_file(self, path):
+        """Write a batch file to the database and remove it; on failure, leave it for replay"""
+        entries = self._read(path)
+        try:
+            self._write(entries)
+        except DatabaseError:
+            logger.exception("Activity log write failed; spooling %d entries", len(entries))
+            os.rename(path, self._batch_path("jsonl"))
+            return False
+        os.remove(path)
+        return True
+
+    def _read(self, path):
+        entries = []
+        with open(path, encoding="utf-8") as spool:
+            for line in spool:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A worker killed in the middle of a write leaves a torn last line
+                    logger.error("Unreadable activity log entry in %s: %r", path, line)
+                    continue
+                entry["created_at"] = datetime.fromisoformat(entry["created_at"])
+                entries.append(entry)
+        return entries
+
+    def _write(self, entries):
+        from .models import ModeratorActivityLog
+        try:
+            ModeratorActivityLog.objects.bulk_create(
+                [ModeratorActivityLog(**entry) for entry in entries], batch_size=self.flush_size
+            )
+        except IntegrityError:
+            # One bad entry should not take the rest of the batch with it. All or nothing, so a
+            # connection lost halfway leaves no rows behind to be duplicated by the replay.
+            with transaction.atomic():
+                for entry in entries:
+                    try:
+                        with transaction.atomic():
+                            ModeratorActivityLog.objects.create(**entry)
+                    except IntegrityError:
+                        logger.error("Activity log entry rejected by the database: %r", entry)
+
+    def _replayable(self, name, now):
+        if name.endswith(".jsonl"):
+            return True
+        if not name.endswith((".journal", ".writing", ".replaying")) or name == f"{os.getpid()}.journal":
+            return False
+        try:
+            return now - os.path.getmtime(os.path.join(self.directory, name)) > STALE_AFTER
+        except OSError:
+            return False
+
+    def _replay_spool(self):
+        directory = self.directory
+        if not os.path.isdir(directory):
+            return
+        now = time.time()
+        for name in sorted(os.listdir(directory)):
+            if not self._replayable(name, now):
+                continue
+            claimed = self._batch_path("replaying")
+            try:
+                os.rename(os.path.join(directory, name), claimed)  # atomic: one worker wins
+            except OSError:
+                continue
+            os.utime(claimed)
+            if not self._write_file(claimed):
+                return
+
+
+writer = ActivityLogWriter()
+atexit.register(writer.flush)
+
+
+def record(organization, action_type, performed_by, description, related_content=None):
+    """Queue an activity log entry; it is written once the current transaction commits"""
+    entry = {
+        "organization_id": getattr(organization, "pk", organization),
+        "action_type": action_type,
+        "performed_by_id": getattr(performed_by, "pk", performed_by),
+        "content_type_id": None,
+        "object_id": None,
+        "description": description,
+        "created_at": timezone.now(),
+    }
+    if related_content is not None:
+        # get_for_model is served from ContentType's in-process cache after the first call
+        entry["content_type_id"] = ContentType.objects.get_for_model(related_content.__class__).id
+        entry["object_id"] = related_content.pk
+    transaction.on_commit(lambda: writer.append(entry))
@@ -6,4 +6,10 @@ class ModerationConfig(AppConfig):
     name = "moderation"
     
     def ready(self):
-        import moderation.signals  # noqa
\ No newline at end of file
+        import moderation.signals  # noqa
+        from posting.scheduler import scheduler
+        from . import archive, notifications
+        from .suspensions import expire_suspensions, expiry_times
+        scheduler.register("expire_suspensions", expire_suspensions, expiry_times)
+        scheduler.register("moderator_notifications", notifications.run_scheduled, notifications.pending_due_times)
+        scheduler.register("archive_old_records", archive.run_scheduled, archive.next_run_times)
@@ -0,0 +1,271 @@
+"""
+Retention and archival for the tables that only ever grow.
+
+Rows older than MODERATION_ARCHIVE_AFTER_DAYS that nobody needs to act on any
+more are moved out of their hot table into ArchiveSegment rows: one segment
+per kind, owner and month, holding the rows as gzip-compressed JSON lines.
+ArchiveRollup keeps running totals per month and group, so summary counts
+survive archival.
+
+What is archived:
+- activity_log: every ModeratorActivityLog entry, per organization
+- notification: read RSVP Notifications, per user
+- moderator_notification: ModeratorNotifications that were read or whose flag
+  has been reviewed, per moderator
+- flag: FlaggedContent reviewed with no action taken (approved or dismissed),
+  per content author, once none of its ModeratorNotifications are left
+
+Flags whose content was deleted or edited are never archived: post_detail
+reads them to tell visitors a post was removed by a moderator, and they are
+the record that action was taken. A flag is only archived after its
+notifications, since deleting it would cascade to them, including any newer
+than the cutoff; those keep the flag in place until they are archived too.
+
+Archived history is read back on demand with `archived_rows()`, or page by
+page through `ArchivedRows`, which only decompresses the segments a page needs.
+The job runs nightly from the scheduler, or with
+`python manage.py archive_old_records`.
+"""
+import contextvars
+import gzip
+import json
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+DEFAULT_AFTER_DAYS = 180
+BATCH_SIZE = 1000
+
+# Set while archived rows are being deleted, so delete signals can tell
+# archival apart from real deletion (see moderation/signals.py)
+_archiving = contextvars.ContextVar("moderation_archiving", default=False)
+
+
+def is_archiving():
+    return _archiving.get()
+
+
+@dataclass
+class Kind:
+    model_path: str
+    time_field: str
+    owner_field: str
+    fields: list
+    group_field: str = ""
+    condition: Q = field(default_factory=Q)
+
+    @property
+    def model(self):
+        from django.apps import apps
+        return apps.get_model(self.model_path)
+
+
+def _kinds():
+    from .models import FlaggedContent
+    no_action = Q(status__in=[FlaggedContent.Status.APPROVED, FlaggedContent.Status.DISMISSED])
+    # Order matters: a flag's moderator notifications go before the flag itself
+    return {
+        "activity_log": Kind(
+            "moderation.ModeratorActivityLog", "created_at", "organization_id",
+            ["id", "organization_id", "action_type", "performed_by_id", "content_type_id",
+             "object_id", "description", "created_at"],
+            group_field="action_type",
+        ),
+        "notification": Kind(
+            "posting.Notification", "created_at", "user_id",
+            ["id", "user_id", "message", "post_id", "rsvp_id", "is_read", "created_at"],
+            condition=Q(is_read=True),
+        ),
+        "moderator_notification": Kind(
+            "moderation.ModeratorNotification", "created_at", "moderator_id",
+            ["id", "moderator_id", "flagged_content_id", "is_read", "created_at"],
+            condition=Q(is_read=True) | ~Q(flagged_content__status=FlaggedContent.Status.PENDING),
+        ),
+        "flag": Kind(
+            "moderation.FlaggedContent", "flagged_at", "content_author_id",
+            ["id", "content_type_id", "object_id", "content_author_id", "content_snapshot",
+             "flagged_by_id", "reason", "flagged_at", "status", "reviewed_by_id", "reviewed_at",
+             "moderator_notes"],
+            group_field="status",
+            condition=no_action & Q(notifications__isnull=True),
+        ),
+    }
+
+
+def horizon(now=None, days=None):
+    if days is None:
+        days = getattr(settings, "MODERATION_ARCHIVE_AFTER_DAYS", DEFAULT_AFTER_DAYS)
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def _month(value):
+    return timezone.localtime(value).date().replace(day=1)
+
+
+class _Conflict(Exception):
+    """Another process archived (some of) the same rows first"""
+
+
+def _archive_batch(kind_name, kind, cutoff):
+    from .models import ArchiveRollup, ArchiveSegment
+    model = kind.model
+    rows = list(
+        model.objects
+        .filter(kind.condition, **{f"{kind.time_field}__lt": cutoff})
+        .order_by(kind.time_field, "id")
+        .values(*kind.fields)[:BATCH_SIZE]
+    )
+    if not rows:
+        return 0
+
+    segments = defaultdict(list)
+    for row in rows:
+        segments[(row[kind.owner_field], _month(row[kind.time_field]))].append(row)
+
+    rollups = Counter()
+    new_segments = []
+    for (owner_id, month), segment_rows in segments.items():
+        groups = Counter(str(row[kind.group_field]) for row in segment_rows) if kind.group_field else Counter()
+        rollups.update({(month, group): n for group, n in groups.items()} or {(month, ""): len(segment_rows)})
+        payload = "\n".join(json.dumps(row, cls=DjangoJSONEncoder) for row in segment_rows)
+        new_segments.append(ArchiveSegment(
+            kind=kind_name,
+            owner_id=owner_id,
+            month=month,
+            row_count=len(segment_rows),
+            first_at=segment_rows[0][kind.time_field],
+            last_at=segment_rows[-1][kind.time_field],
+            summary=dict(groups),
+            data=gzip.compress(payload.encode()),
+        ))
+
+    with transaction.atomic():
+        ArchiveSegment.objects.bulk_create(new_segments)
+        for (month, group), n in rollups.items():
+            updated = ArchiveRollup.objects.filter(kind=kind_name, month=month, group=group).update(
+                row_count=F("row_count") + n
+            )
+            if not updated:
+                ArchiveRollup.objects.create(kind=kind_name, month=month, group=group, row_count=n)
+
+        token = _archiving.set(True)
+        try:
+            _, deleted = model.objects.filter(id__in=[row["id"] for row in rows]).delete()
+        finally:
+            _archiving.reset(token)
+        if deleted.get(model._meta.label, 0) != len(rows):
+            raise _Conflict()
+    return len(rows)
+
+
+def archive_old_records(now=None, days=None):
+    """Archive everything past the horizon. Returns {kind: rows archived}."""
+    cutoff = horizon(now, days)
+    archived = {}
+    for kind_name, kind in _kinds().items():
+        total = 0
+        while True:
+            try:
+                done = _archive_batch(kind_name, kind, cutoff)
+            except _Conflict:
+                break  # someone else is archiving this kind right now
+            total += done
+            if done < BATCH_SIZE:
+                break
+        archived[kind_name] = total
+    return archived
+
+
+def archived_count(kind, owner_id):
+    from .models import ArchiveSegment
+    return ArchiveSegment.objects.filter(kind=kind, owner_id=owner_id).aggregate(n=Sum("row_count"))["n"] or 0
+
+
+def rollup_totals(kind):
+    """{group: archived rows} for a kind, e.g. flag counts by status"""
+    from .models import ArchiveRollup
+    return dict(
+        ArchiveRollup.objects.filter(kind=kind).values_list("group").annotate(n=Sum("row_count")).order_by()
+    )
+
+
+def archived_rows(kind, owner_id, limit=None):
+    """
+    One owner's archived rows of a kind, newest first, as unsaved model instances
+    (so templates can use the usual display helpers). With a limit, segments are
+    read newest first and only until no older segment can hold one of the newest
+    `limit` rows, so the cost follows the limit rather than the archive size.
+    """
+    from .models import ArchiveSegment
+    spec = _kinds()[kind]
+    model = spec.model
+    time_fields = {f.attname for f in model._meta.concrete_fields if f.get_internal_type() == "DateTimeField"}
+
+    def newest_first(rows):
+        rows.sort(key=lambda obj: getattr(obj, spec.time_field), reverse=True)
+        return rows
+
+    segments = list(
+        ArchiveSegment.objects
+        .filter(kind=kind, owner_id=owner_id)
+        .order_by("-last_at", "-id")
+        .values_list("id", "last_at")
+    )
+    result = []
+    for segment_id, last_at in segments:
+        if limit is not None and len(result) >= limit and last_at <= getattr(result[-1], spec.time_field):
+            break  # this segment and every later one only has older rows
+        data = ArchiveSegment.objects.filter(id=segment_id).values_list("data", flat=True).first()
+        if data is None:
+            continue  # removed meanwhile
+        for line in gzip.decompress(bytes(data)).decode().splitlines():
+            if not line:
+                continue
+            row = json.loads(line)
+            for name in time_fields & row.keys():
+                if row[name]:
+                    row[name] = datetime.fromisoformat(row[name])
+            result.append(model(**row))
+        if limit is not None:
+            del newest_first(result)[limit:]
+    return newest_first(result)
+
+
+class ArchivedRows:
+    """
+    An owner's archived rows of a kind as a lazy sequence for Paginator: the count
+    comes from the segment row counts, and a page only reads the segments it needs.
+    """
+
+    def __init__(self, kind, owner_id):
+        self.kind = kind
+        self.owner_id = owner_id
+
+    def count(self):
+        return archived_count(self.kind, self.owner_id)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step is not None or index.start is None or index.stop is None:
+                raise TypeError("ArchivedRows only supports [start:stop] slices")
+            return archived_rows(self.kind, self.owner_id, limit=index.stop)[index.start:]
+        return archived_rows(self.kind, self.owner_id, limit=index + 1)[index]
+
+
+def next_run_times():
+    """For the scheduler: once a night, just after local midnight"""
+    tomorrow = timezone.localtime().date() + timedelta(days=1)
+    return [timezone.make_aware(datetime.combine(tomorrow, datetime.min.time())) + timedelta(minutes=30)]
+
+
+def run_scheduled(now):
+    archive_old_records(now)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from moderation import archive
+
+
+class Command(BaseCommand):
+    help = 'Moves old activity logs, read notifications and reviewed flags into archive segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Archive rows older than this many days (default: MODERATION_ARCHIVE_AFTER_DAYS)',
+        )
+
+    def handle(self, *args, **options):
+        archived = archive.archive_old_records(days=options['days'])
+        for kind, count in archived.items():
+            self.stdout.write(f'{kind}: {count} archived')
+        self.stdout.write(self.style.SUCCESS(f'Archived {sum(archived.values())} rows.'))
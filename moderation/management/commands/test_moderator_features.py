@@ -10,6 +10,7 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
+from moderation.notifications import fan_out as fan_out_notifications
 from moderation.models import (
     FlaggedContent, UserSuspension, ModeratorNotification, ModeratorActivityLog
 )
@@ -137,6 +138,9 @@ class Command(BaseCommand):
             status=FlaggedContent.Status.PENDING
         )
         
+        # Fan out now instead of waiting for the scheduler
+        fan_out_notifications()
+        
         # Check if notification was created
         notifications = ModeratorNotification.objects.filter(
             moderator=moderator,
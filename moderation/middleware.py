@@ -1,13 +1,14 @@
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib.auth import logout
-from .models import UserSuspension
+from .suspensions import suspensions
 from userprivileges.roles import is_moderator
 
 
 class SuspensionMiddleware:
     """
-    Middleware to block suspended users from accessing the site
+    Middleware to block suspended users from accessing the site.
+    Uses the in-process suspension cache, so normal requests don't query the database.
     """
     def __init__(self, get_response):
         self.get_response = get_response
@@ -17,10 +18,6 @@ class SuspensionMiddleware:
         if not request.user.is_authenticated:
             return self.get_response(request)
         
-        # Skip check for staff/superusers/moderators (they can always access)
-        if request.user.is_staff or request.user.is_superuser or is_moderator(request.user):
-            return self.get_response(request)
-        
         # Skip check for admin URLs
         if request.path.startswith('/admin/'):
             return self.get_response(request)
@@ -33,22 +30,14 @@ class SuspensionMiddleware:
         if request.path.startswith('/moderation/suspension-notice/'):
             return self.get_response(request)
         
-        # Check if user is suspended
-        active_suspension = UserSuspension.objects.filter(
-            user=request.user,
-            is_active=True
-        ).first()
+        # Check if user is suspended (expired suspensions don't count; the scheduler reinstates them)
+        suspension_id = suspensions.active_suspension_id(request.user.id)
+        if suspension_id is None:
+            return self.get_response(request)
         
-        if active_suspension:
-            # Check if temporary suspension has expired
-            if active_suspension.is_expired():
-                # Auto-reinstate expired suspensions
-                active_suspension.is_active = False
-                active_suspension.save()
-                return self.get_response(request)
-            
-            # Redirect to suspension notice page
-            return redirect('moderation:suspension_notice', suspension_id=active_suspension.id)
+        # Skip check for staff/superusers/moderators (they can always access)
+        if request.user.is_staff or request.user.is_superuser or is_moderator(request.user):
+            return self.get_response(request)
         
-        return self.get_response(request)
-
+        # Redirect to suspension notice page
+        return redirect('moderation:suspension_notice', suspension_id=suspension_id)
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_violation_stats(apps, schema_editor):
+    """Record each existing flag's content author, then count flags per author."""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    FlaggedContent = apps.get_model('moderation', 'FlaggedContent')
+    UserViolationStats = apps.get_model('moderation', 'UserViolationStats')
+    authors = {
+        ('posting', 'post'): (apps.get_model('posting', 'Post'), 'author_id'),
+        ('chat', 'message'): (apps.get_model('chat', 'Message'), 'sender_id'),
+    }
+    for (app_label, model), (model_class, author_field) in authors.items():
+        content_type = ContentType.objects.filter(app_label=app_label, model=model).first()
+        if content_type is None:
+            continue
+        FlaggedContent.objects.filter(content_type=content_type).update(
+            content_author_id=models.Subquery(
+                model_class.objects.filter(pk=models.OuterRef('object_id')).values(author_field)[:1]
+            )
+        )
+
+    UserViolationStats.objects.bulk_create(
+        UserViolationStats(user_id=row['content_author_id'], flag_count=row['n'], last_flagged_at=row['last'])
+        for row in (
+            FlaggedContent.objects
+            .filter(content_author__isnull=False)
+            .order_by()
+            .values('content_author_id')
+            .annotate(n=models.Count('id'), last=models.Max('flagged_at'))
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('moderation', '0004_moderatornotification_moderatoractivitylog'),
+        ('posting', '0023_postreadstate'),
+        ('chat', '0013_conversationmember'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserViolationStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='violation_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('flag_count', models.PositiveIntegerField(default=0)),
+                ('last_flagged_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'User Violation Stats',
+                'verbose_name_plural': 'User Violation Stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='flaggedcontent',
+            name='content_author',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='flags_received', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_violation_stats, migrations.RunPython.noop),
+    ]
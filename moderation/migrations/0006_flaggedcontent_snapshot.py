@@ -0,0 +1,48 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:35
+
+from django.db import migrations, models
+
+
+def backfill_snapshots(apps, schema_editor):
+    """Snapshot the text of content that existing flags still point at."""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    FlaggedContent = apps.get_model('moderation', 'FlaggedContent')
+    Post = apps.get_model('posting', 'Post')
+    Message = apps.get_model('chat', 'Message')
+    texts = {}
+    post_type = ContentType.objects.filter(app_label='posting', model='post').first()
+    if post_type:
+        for post in Post.objects.filter(
+            id__in=FlaggedContent.objects.filter(content_type=post_type).values('object_id')
+        ).only('id', 'event', 'event_description'):
+            texts[(post_type.id, post.id)] = f"{post.event}: {post.event_description or ''}"
+    message_type = ContentType.objects.filter(app_label='chat', model='message').first()
+    if message_type:
+        for message_id, content in Message.objects.filter(
+            id__in=FlaggedContent.objects.filter(content_type=message_type).values('object_id')
+        ).values_list('id', 'content'):
+            texts[(message_type.id, message_id)] = content
+
+    flags = []
+    for flag in FlaggedContent.objects.filter(content_snapshot='').only('id', 'content_type_id', 'object_id'):
+        text = texts.get((flag.content_type_id, flag.object_id))
+        if text:
+            flag.content_snapshot = text[:2000]
+            flags.append(flag)
+    FlaggedContent.objects.bulk_update(flags, ['content_snapshot'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moderation', '0005_userviolationstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flaggedcontent',
+            name='content_snapshot',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
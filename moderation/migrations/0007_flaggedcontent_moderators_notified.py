@@ -0,0 +1,28 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moderation', '0006_flaggedcontent_snapshot'),
+    ]
+
+    operations = [
+        # Existing flags were notified synchronously when they were created
+        migrations.AddField(
+            model_name='flaggedcontent',
+            name='moderators_notified',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='flaggedcontent',
+            name='moderators_notified',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='flaggedcontent',
+            index=models.Index(condition=models.Q(('moderators_notified', False)), fields=['id'], name='flag_notify_pending_idx'),
+        ),
+    ]
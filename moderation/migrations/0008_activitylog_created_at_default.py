@@ -0,0 +1,19 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:37
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moderation', '0007_flaggedcontent_moderators_notified'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='moderatoractivitylog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moderation', '0008_activitylog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=40)),
+                ('owner_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('month', models.DateField(help_text='First day of the month the rows belong to')),
+                ('row_count', models.PositiveIntegerField()),
+                ('first_at', models.DateTimeField()),
+                ('last_at', models.DateTimeField()),
+                ('summary', models.JSONField(blank=True, default=dict)),
+                ('data', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-month', '-last_at'],
+                'indexes': [models.Index(fields=['kind', 'owner_id', '-month'], name='archive_segment_owner_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchiveRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=40)),
+                ('month', models.DateField()),
+                ('group', models.CharField(blank=True, max_length=40)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('kind', 'month', 'group')},
+            },
+        ),
+    ]
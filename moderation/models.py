@@ -2,9 +2,25 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.utils import timezone
 
 
+SNAPSHOT_MAX_LENGTH = 2000
+
+
+def content_snapshot(content):
+    """The text a moderator needs to judge a piece of content, as it was when flagged"""
+    if content is None:
+        return ""
+    if hasattr(content, 'event'):
+        text = f"{content.event}: {content.event_description or ''}"
+    else:
+        text = getattr(content, 'content', None) or str(content)
+    return text[:SNAPSHOT_MAX_LENGTH]
+
+
 class FlaggedContent(models.Model):
     """
     Generic model to flag any content (Messages, Posts, etc.)
@@ -20,6 +36,17 @@ class FlaggedContent(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey('content_type', 'object_id')
+    # Author of the flagged content, kept after the content itself is deleted
+    content_author = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='flags_received'
+    )
+    # Text of the flagged content at flag time, so it stays reviewable after deletion
+    content_snapshot = models.TextField(blank=True, editable=False)
     
     # Who flagged it and why
     flagged_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='flags_submitted')
@@ -41,12 +68,19 @@ class FlaggedContent(models.Model):
     )
     reviewed_at = models.DateTimeField(null=True, blank=True)
     moderator_notes = models.TextField(blank=True, help_text="Internal notes from moderator")
+    # Set once moderators have been sent notifications (moderation/notifications.py)
+    moderators_notified = models.BooleanField(default=False, editable=False)
     
     class Meta:
         ordering = ['-flagged_at']
         indexes = [
             models.Index(fields=['content_type', 'object_id']),
             models.Index(fields=['status', '-flagged_at']),
+            models.Index(
+                fields=['id'],
+                condition=models.Q(moderators_notified=False),
+                name='flag_notify_pending_idx',
+            ),
         ]
         verbose_name = "Flagged Content"
         verbose_name_plural = "Flagged Content"
@@ -55,6 +89,37 @@ class FlaggedContent(models.Model):
         content_str = str(self.content_object)[:50] if self.content_object else "Unknown"
         return f"Flag #{self.id}: {content_str} ({self.get_status_display()})"
     
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            content = self.content_object
+            if self.content_author_id is None:
+                self.content_author_id = getattr(content, 'author_id', None) or getattr(content, 'sender_id', None)
+            if not self.content_snapshot:
+                self.content_snapshot = content_snapshot(content)
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def attach_targets(cls, flags):
+        """
+        Load the live content of several flags with one query per content type
+        and set it as `flag.target` (None when the content has been deleted).
+        """
+        ids_by_type = {}
+        for flag in flags:
+            ids_by_type.setdefault(flag.content_type_id, set()).add(flag.object_id)
+        objects = {}
+        for content_type_id, ids in ids_by_type.items():
+            model_class = ContentType.objects.get_for_id(content_type_id).model_class()
+            if model_class is None:
+                continue
+            for pk, obj in model_class._default_manager.in_bulk(ids).items():
+                objects[(content_type_id, pk)] = obj
+        for flag in flags:
+            flag.target = objects.get((flag.content_type_id, flag.object_id))
+            if flag.target is not None:
+                flag.content_object = flag.target
+        return flags
+    
     def get_content_type_name(self):
         """Get human-readable name of the content type"""
         return self.content_type.model_class()._meta.verbose_name.title()
@@ -155,6 +220,53 @@ class UserSuspension(models.Model):
         return f"Until {self.suspended_until.date()}"
 
 
+class UserViolationStats(models.Model):
+    """
+    Per-user count of flags raised against their content.
+    Kept current by the FlaggedContent signals in moderation/signals.py.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='violation_stats')
+    flag_count = models.PositiveIntegerField(default=0)
+    last_flagged_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "User Violation Stats"
+        verbose_name_plural = "User Violation Stats"
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.flag_count} flag(s)"
+    
+    @classmethod
+    def record_flag(cls, user_id, flagged_at):
+        """Count one more flag against the user"""
+        updated = cls.objects.filter(user_id=user_id).update(
+            flag_count=F('flag_count') + 1,
+            last_flagged_at=flagged_at,
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(user_id=user_id, flag_count=1, last_flagged_at=flagged_at)
+            except IntegrityError:
+                # Created concurrently; count on top of it
+                cls.record_flag(user_id, flagged_at)
+    
+    @classmethod
+    def remove_flag(cls, user_id):
+        cls.objects.filter(user_id=user_id, flag_count__gt=0).update(flag_count=F('flag_count') - 1)
+    
+    @classmethod
+    def counts_for(cls, user_ids):
+        """{user id: flag count} for several users in one query (users with none are left out)"""
+        return dict(
+            cls.objects.filter(user_id__in=user_ids, flag_count__gt=0).values_list('user_id', 'flag_count')
+        )
+    
+    @classmethod
+    def count_for(cls, user):
+        return cls.counts_for([user.pk]).get(user.pk, 0)
+
+
 class ModeratorNotification(models.Model):
     """
     Notifications for moderators when new reports are created
@@ -212,7 +324,8 @@ class ModeratorActivityLog(models.Model):
     object_id = models.PositiveIntegerField(null=True, blank=True)
     related_content = GenericForeignKey('content_type', 'object_id')
     description = models.TextField(help_text="Description of the action")
-    created_at = models.DateTimeField(auto_now_add=True)
+    # When the action happened, not when the buffered entry was written (see activity_log.py)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -226,3 +339,42 @@ class ModeratorActivityLog(models.Model):
     
     def __str__(self):
         return f"{self.get_action_type_display()} - {self.organization.username} ({self.created_at.date()})"
+
+
+class ArchiveSegment(models.Model):
+    """
+    Rows moved out of a hot table by moderation/archive.py: one owner's rows of one
+    kind for one month, as gzip-compressed JSON lines.
+    """
+    kind = models.CharField(max_length=40)
+    owner_id = models.PositiveIntegerField(null=True, blank=True)
+    month = models.DateField(help_text="First day of the month the rows belong to")
+    row_count = models.PositiveIntegerField()
+    first_at = models.DateTimeField()
+    last_at = models.DateTimeField()
+    summary = models.JSONField(default=dict, blank=True)
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-month', '-last_at']
+        indexes = [
+            models.Index(fields=['kind', 'owner_id', '-month'], name='archive_segment_owner_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} for {self.owner_id} ({self.month:%Y-%m}, {self.row_count} rows)"
+
+
+class ArchiveRollup(models.Model):
+    """Running totals of archived rows per kind, month and group (e.g. flag status)"""
+    kind = models.CharField(max_length=40)
+    month = models.DateField()
+    group = models.CharField(max_length=40, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = [['kind', 'month', 'group']]
+    
+    def __str__(self):
+        return f"{self.kind} {self.month:%Y-%m} {self.group}: {self.row_count}"
@@ -0,0 +1,66 @@
+"""
+Fan-out of new flags to moderator inboxes.
+
+Flagging content only saves the flag; the scheduler job `moderator_notifications`
+(woken on commit) then gives every moderator and staff user a
+ModeratorNotification for each new pending flag. A batch of flags is handled
+with one INSERT ... SELECT ... ON CONFLICT DO NOTHING, so the cost no longer
+grows with the number of moderators, and re-running the job is harmless.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from posting.scheduler import scheduler
+
+BATCH_SIZE = 200
+
+
+def notify_moderators_later():
+    transaction.on_commit(lambda: scheduler.schedule("moderator_notifications", timezone.now()))
+
+
+def pending_due_times():
+    """For the scheduler: due now if any flag has not been fanned out yet"""
+    from .models import FlaggedContent
+    if FlaggedContent.objects.filter(moderators_notified=False).exists():
+        return [timezone.now()]
+    return []
+
+
+def fan_out(now=None, limit=BATCH_SIZE):
+    """Create notifications for up to `limit` new flags. Returns how many flags were handled."""
+    from django.contrib.auth.models import User
+    from profiles.models import Profile
+    from .models import FlaggedContent, ModeratorNotification
+
+    now = now or timezone.now()
+    flag_ids = list(
+        FlaggedContent.objects
+        .filter(moderators_notified=False)
+        .order_by("id")
+        .values_list("id", flat=True)[:limit]
+    )
+    if not flag_ids:
+        return 0
+
+    placeholders = ", ".join(["%s"] * len(flag_ids))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {ModeratorNotification._meta.db_table} "
+            f"(moderator_id, flagged_content_id, is_read, created_at) "
+            f"SELECT u.id, f.id, %s, %s "
+            f"FROM {User._meta.db_table} u "
+            f"LEFT JOIN {Profile._meta.db_table} p ON p.user_id = u.id "
+            f"CROSS JOIN {FlaggedContent._meta.db_table} f "
+            f"WHERE (u.is_staff OR p.role = %s) AND f.status = %s AND f.id IN ({placeholders}) "
+            f"ON CONFLICT (moderator_id, flagged_content_id) DO NOTHING",
+            [False, now, Profile.Role.MODERATOR, FlaggedContent.Status.PENDING, *flag_ids],
+        )
+        FlaggedContent.objects.filter(id__in=flag_ids).update(moderators_notified=True)
+    return len(flag_ids)
+
+
+def run_scheduled(now):
+    """Scheduler job: handle one batch, and come back right away if more are waiting"""
+    if fan_out(now) >= BATCH_SIZE:
+        scheduler.schedule("moderator_notifications", timezone.now())
@@ -1,6 +1,10 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import FlaggedContent, ModeratorNotification
+from posting.scheduler import scheduler
+from .models import FlaggedContent, UserSuspension, UserViolationStats
+from . import archive, notifications, stats
+from .suspensions import suspensions
 from userprivileges.roles import is_moderator
 from django.contrib.auth import get_user_model
 
@@ -10,39 +14,39 @@ User = get_user_model()
 @receiver(post_save, sender=FlaggedContent)
 def create_moderator_notifications(sender, instance, created, **kwargs):
     """
-    Automatically create notifications for all moderators when a new flag is created
+    Notify all moderators of a new flag. The fan-out runs after commit in the
+    scheduler (moderation/notifications.py), not in the flagging request.
     """
     if created and instance.status == FlaggedContent.Status.PENDING:
-        # Get all moderators
-        from profiles.models import Profile
-        
-        # Get users with moderator role in profile
-        moderator_profiles = Profile.objects.filter(role=Profile.Role.MODERATOR).select_related('user')
-        moderator_users = [profile.user for profile in moderator_profiles]
-        
-        # Also get staff/superusers (they are also moderators)
-        staff_users = User.objects.filter(is_staff=True).distinct()
-        
-        # Combine and deduplicate
-        all_moderators = set(list(moderator_users) + list(staff_users))
-        
-        # Create notifications for each moderator
-        notifications = []
-        for moderator in all_moderators:
-            # Check if notification already exists (shouldn't, but just in case)
-            if not ModeratorNotification.objects.filter(
-                moderator=moderator,
-                flagged_content=instance
-            ).exists():
-                notifications.append(
-                    ModeratorNotification(
-                        moderator=moderator,
-                        flagged_content=instance,
-                        is_read=False
-                    )
-                )
-        
-        # Bulk create notifications
-        if notifications:
-            ModeratorNotification.objects.bulk_create(notifications)
+        notifications.notify_moderators_later()
 
+
+@receiver(post_save, sender=FlaggedContent)
+def count_violation(sender, instance, created, **kwargs):
+    """Keep the author's UserViolationStats in step with their flags"""
+    if created and instance.content_author_id:
+        UserViolationStats.record_flag(instance.content_author_id, instance.flagged_at)
+
+
+@receiver(post_delete, sender=FlaggedContent)
+def uncount_violation(sender, instance, **kwargs):
+    # Archived flags still count against their author
+    if instance.content_author_id and not archive.is_archiving():
+        UserViolationStats.remove_flag(instance.content_author_id)
+
+
+@receiver(post_save, sender=FlaggedContent)
+@receiver(post_delete, sender=FlaggedContent)
+def refresh_flag_stats(sender, instance, **kwargs):
+    transaction.on_commit(stats.invalidate_flags)
+
+
+@receiver(post_save, sender=UserSuspension)
+@receiver(post_delete, sender=UserSuspension)
+def refresh_suspension_cache(sender, instance, **kwargs):
+    """Suspending or reinstating a user takes effect on their next request"""
+    transaction.on_commit(suspensions.invalidate)
+    transaction.on_commit(stats.invalidate_suspensions)
+    if instance.is_active and instance.suspended_until:
+        suspended_until = instance.suspended_until
+        transaction.on_commit(lambda: scheduler.schedule("expire_suspensions", suspended_until))
@@ -0,0 +1,64 @@
+"""
+Status counts for the moderator dashboards.
+
+Each set of counts is one conditional aggregate (COUNT ... FILTER) instead of a
+COUNT(*) per status, cached for CACHE_TIMEOUT seconds. FlaggedContent and
+UserSuspension signals (moderation/signals.py) drop the cached copy when a flag
+or suspension changes, so the TTL only bounds staleness from bulk updates that
+bypass signals.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+CACHE_TIMEOUT = 30  # seconds
+FLAG_STATS_KEY = "moderation:stats:flags"
+SUSPENSION_STATS_KEY = "moderation:stats:suspensions"
+
+
+def _cached(key, compute):
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute()
+        cache.set(key, stats, CACHE_TIMEOUT)
+    return stats
+
+
+def _compute_flag_stats():
+    from . import archive
+    from .models import FlaggedContent
+    stats = FlaggedContent.objects.aggregate(**{
+        status.value: Count("id", filter=Q(status=status)) for status in FlaggedContent.Status
+    })
+    # Reviewed flags moved to the archive still count
+    for status, n in archive.rollup_totals("flag").items():
+        if status in stats:
+            stats[status] += n
+    return stats
+
+
+def _compute_suspension_stats():
+    from .models import UserSuspension
+    return UserSuspension.objects.aggregate(
+        active=Count("id", filter=Q(is_active=True)),
+        reinstated=Count("id", filter=Q(is_active=False)),
+        permanent=Count("id", filter=Q(is_active=True, suspended_until__isnull=True)),
+        temporary=Count("id", filter=Q(is_active=True, suspended_until__isnull=False)),
+    )
+
+
+def flag_stats():
+    """{status: number of flags} for every FlaggedContent.Status"""
+    return _cached(FLAG_STATS_KEY, _compute_flag_stats)
+
+
+def suspension_stats():
+    """Active, reinstated, permanent and temporary suspension counts"""
+    return _cached(SUSPENSION_STATS_KEY, _compute_suspension_stats)
+
+
+def invalidate_flags():
+    cache.delete(FLAG_STATS_KEY)
+
+
+def invalidate_suspensions():
+    cache.delete(SUSPENSION_STATS_KEY)
@@ -0,0 +1,109 @@
+"""
+In-process cache of who is currently suspended.
+
+SuspensionMiddleware checks every authenticated request, so instead of querying
+UserSuspension each time we keep a map of suspended user id -> suspension, and a
+min-heap of temporary suspensions ordered by when they end. The cache is reloaded
+(one query) when a UserSuspension is saved or deleted (see moderation/signals.py),
+when another process bumps the shared version key, or after RELOAD_INTERVAL.
+
+Expired suspensions stop counting as soon as their end time passes; the scheduler
+job `expire_suspensions` then marks them inactive in the database.
+"""
+import heapq
+import threading
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+# The version key lives in the shared cache (settings.CACHES), so other processes
+# reload on their next check; this only bounds staleness if the key is lost
+RELOAD_INTERVAL = 30  # seconds
+VERSION_KEY = "moderation:suspensions:version"
+
+
+class SuspensionCache:
+    def __init__(self, reload_interval=RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self._suspended = {}  # user id -> (suspension id, suspended_until or None)
+        self._expiry_heap = []  # (suspended_until, user id, suspension id)
+        self._version = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self):
+        if self._loaded_at is None:
+            return True
+        if time.monotonic() - self._loaded_at > self.reload_interval:
+            return True
+        return cache.get(VERSION_KEY) != self._version
+
+    def load(self):
+        from .models import UserSuspension
+        version = cache.get(VERSION_KEY)
+        now = timezone.now()
+        suspended = {}
+        for suspension_id, user_id, until in (
+            UserSuspension.objects
+            .filter(is_active=True)
+            .exclude(suspended_until__lte=now)
+            .order_by("suspended_at")
+            .values_list("id", "user_id", "suspended_until")
+        ):
+            suspended[user_id] = (suspension_id, until)  # latest suspension wins
+        heap = [(until, user_id, suspension_id) for user_id, (suspension_id, until) in suspended.items() if until]
+        heapq.heapify(heap)
+        with self._lock:
+            self._suspended = suspended
+            self._expiry_heap = heap
+            self._version = version
+            self._loaded_at = time.monotonic()
+
+    def _drop_expired(self, now):
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                until, user_id, suspension_id = heapq.heappop(self._expiry_heap)
+                if self._suspended.get(user_id) == (suspension_id, until):
+                    del self._suspended[user_id]
+
+    def active_suspension_id(self, user_id):
+        """Id of the user's active, unexpired suspension, or None"""
+        if self._is_stale():
+            self.load()
+        self._drop_expired(timezone.now())
+        entry = self._suspended.get(user_id)
+        return entry[0] if entry else None
+
+    def is_suspended(self, user_id):
+        return self.active_suspension_id(user_id) is not None
+
+    def invalidate(self):
+        """Reload on next use, here and (with a shared cache) in every other process"""
+        cache.set(VERSION_KEY, time.time_ns(), None)
+        self._loaded_at = None
+
+
+suspensions = SuspensionCache()
+
+
+def expiry_times():
+    """For the scheduler: when each active temporary suspension runs out"""
+    from .models import UserSuspension
+    return list(
+        UserSuspension.objects
+        .filter(is_active=True, suspended_until__isnull=False)
+        .values_list("suspended_until", flat=True)
+    )
+
+
+def expire_suspensions(now=None):
+    """Mark every active suspension that has run out as inactive. Returns how many."""
+    from .models import UserSuspension
+    now = now or timezone.now()
+    expired = UserSuspension.objects.filter(is_active=True, suspended_until__lte=now).update(is_active=False)
+    if expired:
+        from . import stats
+        suspensions.invalidate()
+        stats.invalidate_suspensions()
+    return expired
@@ -1,3 +1,409 @@
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import Paginator
+from django.db import IntegrityError, OperationalError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from chat.models import Conversation, Message
+from posting.models import Cuisine, Post
+from profiles.models import Profile
+
+from . import activity_log, archive, notifications, stats
+from .models import (
+    ArchiveSegment,
+    FlaggedContent,
+    ModeratorActivityLog,
+    ModeratorNotification,
+    UserSuspension,
+    UserViolationStats,
+)
+from .suspensions import SuspensionCache
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author")
+        self.reporter = User.objects.create_user("reporter")
+        self.moderator = User.objects.create_user("moderator")
+        cuisine = Cuisine.objects.create(name="Thai")
+        self.post = Post.objects.create(author=self.author, cuisine=cuisine, event="Leftovers",
+                                        event_description="Come grab some")
+        self.old = timezone.now() - timedelta(days=archive.DEFAULT_AFTER_DAYS + 10)
+
+    def flag(self, status, flagged_at=None):
+        flag = FlaggedContent.objects.create(
+            content_type=ContentType.objects.get_for_model(Post),
+            object_id=self.post.id,
+            content_author=self.author,
+            flagged_by=self.reporter,
+            reason="spam",
+            status=status,
+        )
+        FlaggedContent.objects.filter(id=flag.id).update(flagged_at=flagged_at or self.old)
+        return flag
+
+    def notify(self, flag, created_at, is_read=True):
+        notification = ModeratorNotification.objects.create(moderator=self.moderator, flagged_content=flag,
+                                                            is_read=is_read)
+        ModeratorNotification.objects.filter(id=notification.id).update(created_at=created_at)
+        return notification
+
+    def test_archives_old_flags_reviewed_without_action(self):
+        flag = self.flag(FlaggedContent.Status.DISMISSED)
+        recent = self.flag(FlaggedContent.Status.DISMISSED, flagged_at=timezone.now())
+
+        result = archive.archive_old_records()
+
+        self.assertEqual(result["flag"], 1)
+        self.assertEqual(list(FlaggedContent.objects.values_list("id", flat=True)), [recent.id])
+        self.assertEqual(archive.archived_count("flag", self.author.id), 1)
+        self.assertEqual(archive.rollup_totals("flag"), {FlaggedContent.Status.DISMISSED: 1})
+        self.assertEqual([row.id for row in archive.archived_rows("flag", self.author.id)], [flag.id])
+        # Archived flags still count against their author
+        self.assertEqual(UserViolationStats.objects.get(user=self.author).flag_count, 2)
+
+    def test_keeps_flags_whose_content_was_removed(self):
+        deleted = self.flag(FlaggedContent.Status.DELETED)
+        edited = self.flag(FlaggedContent.Status.EDITED)
+
+        archive.archive_old_records()
+
+        self.assertEqual(set(FlaggedContent.objects.values_list("id", flat=True)), {deleted.id, edited.id})
+        self.assertFalse(ArchiveSegment.objects.filter(kind="flag").exists())
+
+    def test_flag_waits_for_its_newer_notifications(self):
+        flag = self.flag(FlaggedContent.Status.APPROVED)
+        notification = self.notify(flag, created_at=timezone.now())
+
+        archive.archive_old_records()
+
+        self.assertTrue(FlaggedContent.objects.filter(id=flag.id).exists())
+        self.assertTrue(ModeratorNotification.objects.filter(id=notification.id).exists())
+
+    def test_flag_goes_with_its_old_notifications(self):
+        flag = self.flag(FlaggedContent.Status.APPROVED)
+        self.notify(flag, created_at=self.old)
+
+        result = archive.archive_old_records()
+
+        self.assertEqual((result["moderator_notification"], result["flag"]), (1, 1))
+        self.assertFalse(FlaggedContent.objects.exists())
+        self.assertEqual(archive.archived_count("moderator_notification", self.moderator.id), 1)
+
+    def test_rerun_is_a_no_op(self):
+        self.flag(FlaggedContent.Status.DISMISSED)
+        archive.archive_old_records()
+        self.assertEqual(archive.archive_old_records()["flag"], 0)
+        self.assertEqual(archive.archived_count("flag", self.author.id), 1)
+
+    def archive_flags_over_months(self, months=3, per_month=2):
+        flags = []
+        for month in range(months):
+            for day in range(per_month):
+                flags.append(self.flag(FlaggedContent.Status.DISMISSED,
+                                       flagged_at=self.old - timedelta(days=31 * month + day)))
+        archive.archive_old_records()
+        return flags
+
+    def segment_reads(self, queries):
+        return [q["sql"] for q in queries if '"data"' in q["sql"]]
+
+    def test_limited_read_stops_after_the_newest_segment(self):
+        flags = self.archive_flags_over_months()
+        self.assertEqual(ArchiveSegment.objects.filter(kind="flag").count(), 3)
+        everything = [row.id for row in archive.archived_rows("flag", self.author.id)]
+        self.assertEqual(everything, [flag.id for flag in flags])
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = archive.archived_rows("flag", self.author.id, limit=2)
+        self.assertEqual([row.id for row in rows], everything[:2])
+        self.assertEqual(len(self.segment_reads(queries)), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = archive.archived_rows("flag", self.author.id, limit=3)
+        self.assertEqual([row.id for row in rows], everything[:3])
+        self.assertEqual(len(self.segment_reads(queries)), 2)
+
+    def test_archived_rows_page_through_paginator(self):
+        flags = self.archive_flags_over_months()
+        paginator = Paginator(archive.ArchivedRows("flag", self.author.id), 4)
+        self.assertEqual((paginator.count, paginator.num_pages), (6, 2))
+
+        with CaptureQueriesContext(connection) as queries:
+            first = paginator.page(1)
+            self.assertEqual([row.id for row in first], [flag.id for flag in flags[:4]])
+        self.assertEqual(len(self.segment_reads(queries)), 2)
+        self.assertEqual([row.id for row in paginator.page(2)], [flag.id for flag in flags[4:]])
+
+
+class SuspensionCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("suspended")
+        self.moderator = User.objects.create_user("moderator")
+        # Two workers' caches; neither reloads on a timer during the test
+        self.worker_a = SuspensionCache(reload_interval=3600)
+        self.worker_b = SuspensionCache(reload_interval=3600)
+
+    def test_cache_backend_is_shared_between_processes(self):
+        self.assertNotIn("locmem", settings.CACHES["default"]["BACKEND"])
+
+    def test_invalidation_reaches_other_instances(self):
+        self.assertFalse(self.worker_a.is_suspended(self.user.id))
+        self.assertFalse(self.worker_b.is_suspended(self.user.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            suspension = UserSuspension.objects.create(user=self.user, suspended_by=self.moderator, reason="spam")
+        self.assertEqual(self.worker_a.active_suspension_id(self.user.id), suspension.id)
+        self.assertEqual(self.worker_b.active_suspension_id(self.user.id), suspension.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            suspension.is_active = False
+            suspension.save()
+        self.assertFalse(self.worker_a.is_suspended(self.user.id))
+        self.assertFalse(self.worker_b.is_suspended(self.user.id))
+
+    def test_expired_suspension_stops_counting(self):
+        UserSuspension.objects.create(user=self.user, suspended_by=self.moderator, reason="spam",
+                                      suspended_until=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(self.worker_a.is_suspended(self.user.id))
+
+
+@mock.patch.object(activity_log.ActivityLogWriter, "_ensure_thread")  # tests flush by hand
+class ActivityLogWriterTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.org = User.objects.create_user("org")
+        self.writer = self.make_writer()
+
+    def make_writer(self):
+        writer = activity_log.ActivityLogWriter(directory=self.directory)
+        self.addCleanup(lambda: writer._journal and writer._journal.close())
+        return writer
+
+    def entry(self, description):
+        return {
+            "organization_id": self.org.id,
+            "action_type": ModeratorActivityLog.ActionType.POST_CREATED,
+            "performed_by_id": self.org.id,
+            "content_type_id": None,
+            "object_id": None,
+            "description": description,
+            "created_at": timezone.now(),
+        }
+
+    def descriptions(self):
+        return sorted(ModeratorActivityLog.objects.values_list("description", flat=True))
+
+    def test_entries_are_on_disk_before_the_flush(self, _):
+        self.writer.append(self.entry("one"))
+        with open(os.path.join(self.directory, f"{os.getpid()}.journal")) as journal:
+            self.assertIn('"one"', journal.read())
+
+        self.writer.flush()
+        self.assertEqual(self.descriptions(), ["one"])
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_journal_of_a_killed_worker_is_replayed_once_stale(self, _):
+        # What a worker leaves behind when it is killed before flushing
+        path = os.path.join(self.directory, "99999.journal")
+        with open(path, "w") as journal:
+            journal.write('{"organization_id": %d, "action_type": "post_created", "performed_by_id": null, '
+                          '"content_type_id": null, "object_id": null, "description": "orphan", '
+                          '"created_at": "2026-01-01T00:00:00+00:00"}\n{"organizat' % self.org.id)
+
+        self.writer.flush()
+        self.assertEqual(self.descriptions(), [])  # might still be a live worker
+
+        stale = time.time() - activity_log.STALE_AFTER - 1
+        os.utime(path, (stale, stale))
+        with self.assertLogs(activity_log.logger, "ERROR"):  # the torn last line
+            self.writer.flush()
+        self.assertEqual(self.descriptions(), ["orphan"])
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_failure_in_the_fallback_leaves_no_duplicates(self, _):
+        self.writer.append(self.entry("one"))
+        self.writer.append(self.entry("two"))
+        create = ModeratorActivityLog.objects.create
+        calls = []
+
+        def flaky_create(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise OperationalError("connection lost")
+            return create(**kwargs)
+
+        with mock.patch.object(ModeratorActivityLog.objects, "bulk_create", side_effect=IntegrityError), \
+                mock.patch.object(ModeratorActivityLog.objects, "create", side_effect=flaky_create), \
+                self.assertLogs(activity_log.logger, "ERROR"):
+            self.writer.flush()
+        self.assertEqual(self.descriptions(), [])  # "one" was rolled back with the batch
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+        self.make_writer().flush()
+        self.assertEqual(self.descriptions(), ["one", "two"])
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class ViolationStatsTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author")
+        self.other = User.objects.create_user("other")
+        self.reporter = User.objects.create_user("reporter")
+        self.cuisine = Cuisine.objects.create(name="Thai")
+
+    def flag_post_by(self, author):
+        post = Post.objects.create(author=author, cuisine=self.cuisine, event="Leftovers", event_description="Free")
+        return FlaggedContent.objects.create(content_type=ContentType.objects.get_for_model(Post),
+                                             object_id=post.id, flagged_by=self.reporter, reason="spam")
+
+    def test_counters_follow_flags(self):
+        first = self.flag_post_by(self.author)
+        self.assertEqual(first.content_author, self.author)
+        self.flag_post_by(self.author)
+        self.flag_post_by(self.other)
+        with self.assertNumQueries(1):
+            counts = UserViolationStats.counts_for([self.author.id, self.other.id, self.reporter.id])
+        self.assertEqual(counts, {self.author.id: 2, self.other.id: 1})
+
+        first.delete()
+        self.assertEqual(UserViolationStats.counts_for([self.author.id]), {self.author.id: 1})
+
+    def test_counts_survive_deleting_the_content(self):
+        flag = self.flag_post_by(self.author)
+        flag.delete_content(self.reporter)
+        self.assertEqual(UserViolationStats.counts_for([self.author.id]), {self.author.id: 1})
+
+
+class ModerationStatsTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author")
+        self.moderator = User.objects.create_user("moderator")
+        post = Post.objects.create(author=self.author, cuisine=Cuisine.objects.create(name="Thai"),
+                                   event="Leftovers", event_description="Free")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flags = [
+                FlaggedContent.objects.create(content_type=ContentType.objects.get_for_model(Post),
+                                              object_id=post.id, flagged_by=self.moderator, reason="spam")
+                for _ in range(3)
+            ]
+
+    def test_flag_counts_in_one_aggregate_and_cached(self):
+        with CaptureQueriesContext(connection) as queries:
+            counts = stats.flag_stats()
+        self.assertEqual(counts[FlaggedContent.Status.PENDING], 3)
+        self.assertEqual(set(counts), set(FlaggedContent.Status.values))
+        self.assertEqual(len([q for q in queries if 'FROM "moderation_flaggedcontent"' in q["sql"]]), 1)
+
+        # A bulk update skips the signals, so the cached copy is served until it expires
+        FlaggedContent.objects.update(status=FlaggedContent.Status.DISMISSED)
+        self.assertEqual(stats.flag_stats()[FlaggedContent.Status.PENDING], 3)
+
+    def test_flag_review_invalidates(self):
+        stats.flag_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flags[0].approve(self.moderator)
+        counts = stats.flag_stats()
+        self.assertEqual((counts[FlaggedContent.Status.PENDING], counts[FlaggedContent.Status.APPROVED]), (2, 1))
+
+    def test_suspension_counts_follow_suspensions(self):
+        self.assertEqual(stats.suspension_stats()["active"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            suspension = UserSuspension.objects.create(user=self.author, suspended_by=self.moderator, reason="spam")
+        self.assertEqual(stats.suspension_stats(), {"active": 1, "reinstated": 0, "permanent": 1, "temporary": 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            suspension.reinstate(self.moderator)
+        self.assertEqual(stats.suspension_stats()["reinstated"], 1)
+
+
+class FlagSnapshotTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author")
+        self.reporter = User.objects.create_user("reporter")
+        self.post = Post.objects.create(author=self.author, cuisine=Cuisine.objects.create(name="Thai"),
+                                        event="Leftovers", event_description="Free pad thai")
+        conversation = Conversation.get_or_create_dm(self.author, self.reporter)
+        self.message = Message.objects.create(conversation=conversation, sender=self.author, content="rude")
+
+    def flag(self, content):
+        return FlaggedContent.objects.create(content_type=ContentType.objects.get_for_model(content),
+                                             object_id=content.pk, flagged_by=self.reporter, reason="spam")
+
+    def test_snapshot_outlives_the_content(self):
+        flag = self.flag(self.post)
+        self.assertEqual(flag.content_snapshot, "Leftovers: Free pad thai")
+        flag.delete_content(self.reporter)
+
+        flag = FlaggedContent.objects.get(id=flag.id)
+        self.assertEqual((flag.content_snapshot, flag.content_author_id), ("Leftovers: Free pad thai", self.author.id))
+        FlaggedContent.attach_targets([flag])
+        self.assertIsNone(flag.target)
+
+    def test_targets_load_in_one_query_per_content_type(self):
+        other_post = Post.objects.create(author=self.author, cuisine=self.post.cuisine, event="More",
+                                         event_description="")
+        flags = [self.flag(self.post), self.flag(other_post), self.flag(self.message)]
+        flags = list(FlaggedContent.objects.filter(id__in=[flag.id for flag in flags]))
+        ContentType.objects.get_for_models(Post, Message)  # warm the content type cache
+        with self.assertNumQueries(2):
+            FlaggedContent.attach_targets(flags)
+            targets = {flag.object_id: flag.target for flag in flags if flag.content_type.model == "post"}
+            self.assertEqual(flags[0].content_object.pk, flags[0].object_id)
+        self.assertEqual(set(targets), {self.post.id, other_post.id})
+        self.assertEqual(next(flag for flag in flags if flag.target == self.message).content_snapshot, "rude")
+
+
+class ModeratorNotificationFanOutTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author")
+        self.moderators = [User.objects.create_user(name) for name in ("mod1", "mod2")]
+        Profile.objects.filter(user__in=self.moderators).update(role=Profile.Role.MODERATOR)
+        # Plain staff flags are dropped by the profile role signal; superusers keep theirs
+        self.staff = User.objects.create_superuser("staff")
+        self.post = Post.objects.create(author=self.author, cuisine=Cuisine.objects.create(name="Thai"),
+                                        event="Leftovers", event_description="Free")
+
+    def flag(self, **fields):
+        return FlaggedContent.objects.create(content_type=ContentType.objects.get_for_model(Post),
+                                             object_id=self.post.id, flagged_by=self.author, reason="spam",
+                                             **fields)
+
+    def notified(self):
+        return set(ModeratorNotification.objects.values_list("moderator__username", "flagged_content_id"))
+
+    def test_flagging_does_not_notify_inline(self):
+        self.flag()
+        self.assertFalse(ModeratorNotification.objects.exists())
+        self.assertEqual(len(notifications.pending_due_times()), 1)
+
+    def test_fan_out_reaches_moderators_and_staff_once(self):
+        first, second = self.flag(), self.flag()
+        reviewed = self.flag(status=FlaggedContent.Status.DISMISSED)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(notifications.fan_out(), 3)
+        statements = [q["sql"].split()[0] for q in queries if "SAVEPOINT" not in q["sql"]]
+        # Whatever the number of moderators: pick the batch, one INSERT ... SELECT, mark it done
+        self.assertEqual(statements, ["SELECT", "INSERT", "UPDATE"])
+        expected = {(name, flag.id) for name in ("mod1", "mod2", "staff") for flag in (first, second)}
+        self.assertEqual(self.notified(), expected)
+        self.assertNotIn(reviewed.id, {flag_id for _, flag_id in self.notified()})
+
+        self.assertEqual(notifications.fan_out(), 0)
+        self.assertEqual(notifications.pending_due_times(), [])
 
-# Create your tests here.
+        # A rerun over already notified flags (e.g. after a crash) adds nothing
+        FlaggedContent.objects.update(moderators_notified=False)
+        notifications.fan_out()
+        self.assertEqual(self.notified(), expected)
@@ -7,33 +7,23 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.db.models import Count, Q
 from django.core.paginator import Paginator
-from .models import FlaggedContent, UserSuspension, ModeratorNotification, ModeratorActivityLog
+from .models import FlaggedContent, UserSuspension, UserViolationStats, ModeratorNotification, ModeratorActivityLog
+from . import activity_log, archive
+from . import stats as moderation_stats
+from .suspensions import expire_suspensions, suspensions
 from .forms import ModeratorPostEditForm, ModeratorMessageEditForm, SuspendUserForm, ReinstateUserForm
 from posting.models import Post
 from chat.models import Message
 from userprivileges.roles import is_moderator
 from profiles.models import Profile
+from profiles import search as people_search
 
 
 def log_activity(organization, action_type, performed_by, description, related_content=None):
     """
-    Helper function to create activity log entries
+    Helper function to create activity log entries (buffered, see activity_log.py)
     """
-    content_type = None
-    object_id = None
-    
-    if related_content:
-        content_type = ContentType.objects.get_for_model(related_content.__class__)
-        object_id = related_content.id
-    
-    ModeratorActivityLog.objects.create(
-        organization=organization,
-        action_type=action_type,
-        performed_by=performed_by,
-        content_type=content_type,
-        object_id=object_id,
-        description=description
-    )
+    activity_log.record(organization, action_type, performed_by, description, related_content)
 
 
 @login_required
@@ -120,7 +110,7 @@ def review_flagged_content(request):
     # Get pending flags queryset (most recent first) - will paginate this
     pending_flags_qs = FlaggedContent.objects.filter(
         status=FlaggedContent.Status.PENDING
-    ).select_related('flagged_by', 'content_type').prefetch_related('content_object').order_by('-flagged_at')
+    ).select_related('flagged_by', 'content_type', 'content_author').order_by('-flagged_at')
     
     # Apply search filter if query provided
     if search_query:
@@ -131,26 +121,8 @@ def review_flagged_content(request):
             Q(status__icontains=search_query)
         )
         
-        # Also search in content text (for posts and messages)
-        post_ct = ContentType.objects.get_for_model(Post)
-        message_ct = ContentType.objects.get_for_model(Message)
-        
-        # Get post IDs that match search
-        post_ids = Post.objects.filter(
-            Q(event__icontains=search_query) |
-            Q(event_description__icontains=search_query)
-        ).values_list('id', flat=True)
-        
-        # Get message IDs that match search
-        message_ids = Message.objects.filter(
-            Q(content__icontains=search_query)
-        ).values_list('id', flat=True)
-        
-        # Add content search to query
-        search_q |= Q(
-            Q(content_type=post_ct, object_id__in=post_ids) |
-            Q(content_type=message_ct, object_id__in=message_ids)
-        )
+        # Also search in the flagged content's text
+        search_q |= Q(content_snapshot__icontains=search_query)
         
         pending_flags_qs = pending_flags_qs.filter(search_q)
     
@@ -167,51 +139,30 @@ def review_flagged_content(request):
         # EmptyPage or other pagination errors, default to page 1
         pending_flags_page = paginator.page(1)
     
+    # Live content for the page, one query per content type
+    FlaggedContent.attach_targets(pending_flags_page.object_list)
+    
     # Get recently reviewed flags (limit to 20 for performance)
     reviewed_flags = FlaggedContent.objects.exclude(
         status=FlaggedContent.Status.PENDING
     ).select_related('flagged_by', 'reviewed_by', 'content_type').order_by('-reviewed_at')[:20]
     
-    # Count by status (using efficient count queries)
-    stats = {
-        'pending': FlaggedContent.objects.filter(status=FlaggedContent.Status.PENDING).count(),
-        'approved': FlaggedContent.objects.filter(status=FlaggedContent.Status.APPROVED).count(),
-        'deleted': FlaggedContent.objects.filter(status=FlaggedContent.Status.DELETED).count(),
-        'dismissed': FlaggedContent.objects.filter(status=FlaggedContent.Status.DISMISSED).count(),
-        'edited': FlaggedContent.objects.filter(status=FlaggedContent.Status.EDITED).count(),
+    # Count by status (one cached aggregate)
+    stats = moderation_stats.flag_stats()
+    
+    # Violation counts for the authors on the current page, in one query
+    author_ids = {flag.content_author_id for flag in pending_flags_page if flag.content_author_id}
+    counts = UserViolationStats.counts_for(author_ids)
+    violation_counts = {
+        flag.content_author_id: {
+            'user': flag.content_author,
+            'count': counts[flag.content_author_id],
+            'is_suspended': suspensions.is_suspended(flag.content_author_id),
+        }
+        for flag in pending_flags_page
+        if flag.content_author_id in counts
     }
     
-    # Get violation counts for content authors (only for current page to optimize)
-    violation_counts = {}
-    post_ct = ContentType.objects.get_for_model(Post)
-    message_ct = ContentType.objects.get_for_model(Message)
-    
-    # Get unique authors from current page of pending flags only
-    authors = set()
-    for flag in pending_flags_page:
-        if flag.content_object:
-            if flag.content_type.model == 'post':
-                authors.add(flag.content_object.author)
-            elif flag.content_type.model == 'message':
-                authors.add(flag.content_object.sender)
-    
-    # Count violations per author (only for authors on current page)
-    for author in authors:
-        post_ids = Post.objects.filter(author=author).values_list('id', flat=True)
-        message_ids = Message.objects.filter(sender=author).values_list('id', flat=True)
-        
-        count = FlaggedContent.objects.filter(
-            Q(content_type=post_ct, object_id__in=post_ids) |
-            Q(content_type=message_ct, object_id__in=message_ids)
-        ).count()
-        
-        if count > 0:
-            violation_counts[author.id] = {
-                'user': author,
-                'count': count,
-                'is_suspended': author.profile.is_suspended() if hasattr(author, 'profile') else False
-            }
-    
     # Get unread notification count for current moderator
     unread_count = ModeratorNotification.objects.filter(
         moderator=request.user,
@@ -435,17 +386,7 @@ def suspend_user(request, user_id):
     else:
         form = SuspendUserForm()
     
-    # Get user's violation count (more efficient query)
-    post_ids = Post.objects.filter(author=user_to_suspend).values_list('id', flat=True)
-    message_ids = Message.objects.filter(sender=user_to_suspend).values_list('id', flat=True)
-    
-    post_ct = ContentType.objects.get_for_model(Post)
-    message_ct = ContentType.objects.get_for_model(Message)
-    
-    violation_count = FlaggedContent.objects.filter(
-        Q(content_type=post_ct, object_id__in=post_ids) |
-        Q(content_type=message_ct, object_id__in=message_ids)
-    ).count()
+    violation_count = UserViolationStats.count_for(user_to_suspend)
     
     return render(request, 'moderation/suspend_user.html', {
         'user_to_suspend': user_to_suspend,
@@ -507,32 +448,19 @@ def manage_suspensions(request):
     search_results = None
     
     if search_query:
-        # Search for users by username or email (exclude moderators/staff)
-        from profiles.models import Profile
-        search_users = User.objects.filter(
-            Q(username__icontains=search_query) | Q(email__icontains=search_query)
-        ).exclude(
-            is_staff=True
-        ).exclude(
-            is_superuser=True
-        ).exclude(
-            profile__role=Profile.Role.MODERATOR
-        ).select_related('profile').order_by('username')[:50]
+        # Search for users by username or email (exclude moderators/staff).
+        # Passed as exclude= so the limit counts only users that can be shown.
+        staff_ids = User.objects.filter(
+            Q(is_staff=True) | Q(is_superuser=True) | Q(profile__role=Profile.Role.MODERATOR)
+        ).values_list('id', flat=True)
+        search_users = people_search.search_users(search_query, limit=50, exclude=staff_ids)
         
-        # Get violation counts and suspension status for each user
-        post_ct = ContentType.objects.get_for_model(Post)
-        message_ct = ContentType.objects.get_for_model(Message)
+        # Get violation counts (one query) and suspension status for each user
+        violation_counts = UserViolationStats.counts_for([user.id for user in search_users])
         
         search_results = []
         for user in search_users:
-            # Get violation count
-            post_ids = Post.objects.filter(author=user).values_list('id', flat=True)
-            message_ids = Message.objects.filter(sender=user).values_list('id', flat=True)
-            
-            violation_count = FlaggedContent.objects.filter(
-                Q(content_type=post_ct, object_id__in=post_ids) |
-                Q(content_type=message_ct, object_id__in=message_ids)
-            ).count()
+            violation_count = violation_counts.get(user.id, 0)
             
             # Get active suspension
             active_suspension = UserSuspension.objects.filter(
@@ -552,18 +480,10 @@ def manage_suspensions(request):
                 'is_suspended': active_suspension is not None and not active_suspension.is_expired(),
             })
     
-    # Get active suspensions
-    active_suspensions = UserSuspension.objects.filter(is_active=True).select_related(
-        'user', 'suspended_by'
-    ).order_by('-suspended_at')
-    
-    # Check for expired suspensions and auto-reinstate
-    for suspension in active_suspensions:
-        if suspension.is_expired():
-            suspension.is_active = False
-            suspension.save()
+    # Auto-reinstate expired suspensions (one UPDATE)
+    expire_suspensions()
     
-    # Refresh active suspensions after auto-reinstatement
+    # Get active suspensions
     active_suspensions = UserSuspension.objects.filter(is_active=True).select_related(
         'user', 'suspended_by'
     ).order_by('-suspended_at')
@@ -574,12 +494,7 @@ def manage_suspensions(request):
     ).select_related('user', 'suspended_by', 'reinstated_by').order_by('-reinstated_at')[:20]
     
     # Stats
-    stats = {
-        'active': active_suspensions.count(),
-        'reinstated': UserSuspension.objects.filter(is_active=False).count(),
-        'permanent': UserSuspension.objects.filter(is_active=True, suspended_until__isnull=True).count(),
-        'temporary': UserSuspension.objects.filter(is_active=True, suspended_until__isnull=False).count(),
-    }
+    stats = moderation_stats.suspension_stats()
     
     return render(request, 'moderation/manage_suspensions.html', {
         'active_suspensions': active_suspensions,
@@ -604,17 +519,7 @@ def user_suspension_history(request, user_id):
         'suspended_by', 'reinstated_by'
     ).order_by('-suspended_at')
     
-    # Get violation count (more efficient query)
-    post_ids = Post.objects.filter(author=user).values_list('id', flat=True)
-    message_ids = Message.objects.filter(sender=user).values_list('id', flat=True)
-    
-    post_ct = ContentType.objects.get_for_model(Post)
-    message_ct = ContentType.objects.get_for_model(Message)
-    
-    violation_count = FlaggedContent.objects.filter(
-        Q(content_type=post_ct, object_id__in=post_ids) |
-        Q(content_type=message_ct, object_id__in=message_ids)
-    ).count()
+    violation_count = UserViolationStats.count_for(user)
     
     active_suspension = suspensions.filter(is_active=True).first()
     if active_suspension and active_suspension.is_expired():
@@ -707,10 +612,16 @@ def organization_activity_log(request, user_id=None):
         django_messages.error(request, f"{organization.username} is not an organization.")
         return redirect('moderation:review_flagged')
     
-    # Get activity logs for this organization
-    activity_logs = ModeratorActivityLog.objects.filter(
-        organization=organization
-    ).select_related('performed_by', 'content_type').order_by('-created_at')
+    # Get activity logs for this organization (older entries live in the archive)
+    show_archived = request.GET.get('archived') == '1'
+    archived_count = archive.archived_count('activity_log', organization.id)
+    if show_archived:
+        # Lazy: a page only decompresses the archive segments it needs
+        activity_logs = archive.ArchivedRows('activity_log', organization.id)
+    else:
+        activity_logs = ModeratorActivityLog.objects.filter(
+            organization=organization
+        ).select_related('performed_by', 'content_type').order_by('-created_at')
     
     # Paginate
     paginator = Paginator(activity_logs, 20)
@@ -722,8 +633,14 @@ def organization_activity_log(request, user_id=None):
         activity_logs_page = paginator.page(1)
     except:
         activity_logs_page = paginator.page(1)
+    if show_archived:
+        performers = User.objects.in_bulk({log.performed_by_id for log in activity_logs_page if log.performed_by_id})
+        for log in activity_logs_page:
+            log.performed_by = performers.get(log.performed_by_id)
     
     return render(request, 'moderation/organization_activity_log.html', {
         'organization': organization,
         'activity_logs': activity_logs_page,
+        'show_archived': show_archived,
+        'archived_count': archived_count,
     })
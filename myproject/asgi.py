@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings")
 
 application = get_asgi_application()
+
+# Fire scheduled jobs (e.g. publishing scheduled posts) from this worker
+from posting.scheduler import start_in_process_scheduler  # noqa: E402
+
+start_in_process_scheduler()
@@ -168,14 +168,49 @@ TEMPLATES = [
 ]
 
 TEMPLATES[0]['OPTIONS']['context_processors'] += [
-    'chat.context_processors.unread_messages',
-    "Friendslist.context_processors.pending_friend_requests_count",
-    "posting.context_processors.unread_posts_count",
-    "posting.context_processors.rsvp_notifications",
+    # Unread messages, friend requests, unread posts and notifications in one cached lookup
+    "posting.context_processors.badge_counts",
 ]
 
 WSGI_APPLICATION = "myproject.wsgi.application"
 
+# Each web worker runs a background scheduler that publishes scheduled posts on time.
+# Set to False if `python manage.py run_scheduler` runs as its own process instead;
+# that process polls the database for due work every 10 seconds (--interval).
+POSTING_SCHEDULER_IN_PROCESS = os.environ.get("POSTING_SCHEDULER_IN_PROCESS", "1") == "1"
+
+# Base URL encoded into post QR codes. After changing it, optionally run
+# `python manage.py regenerate_qr_codes` to pre-render the new codes.
+POSTING_QR_BASE_URL = os.environ.get("POSTING_QR_BASE_URL", "https://swe-b-27-0f4424ee120f.herokuapp.com")
+
+# Disk cache for rendered QR images (content-addressed, safe to wipe)
+POSTING_QR_CACHE_DIR = os.environ.get("POSTING_QR_CACHE_DIR", os.path.join(BASE_DIR, "qr_cache"))
+
+# Where moderator activity log entries are journaled until they are written, and
+# spooled while the database is unreachable (replayed automatically, see
+# moderation/activity_log.py)
+MODERATION_ACTIVITY_LOG_SPOOL_DIR = os.environ.get(
+    "MODERATION_ACTIVITY_LOG_SPOOL_DIR", os.path.join(BASE_DIR, "activity_log_spool")
+)
+
+# Activity logs, read notifications and reviewed flags older than this are moved
+# into compressed monthly archive segments (see moderation/archive.py)
+MODERATION_ARCHIVE_AFTER_DAYS = int(os.environ.get("MODERATION_ARCHIVE_AFTER_DAYS", "180"))
+
+# How far back the post feed, map and unread badge look (sliding window, per request)
+POSTING_FEED_WINDOW_HOURS = 48
+
+# Live chat (the Server-Sent Events stream in chat.views.message_stream) is ASGI-only.
+# The Procfile serves WSGI (myproject.wsgi), where the conversation page opens no
+# stream: your own messages appear when sent, other people's on the next page load.
+# To turn it on, serve myproject.asgi instead, e.g. with
+# `gunicorn myproject.asgi:application -k uvicorn_worker.UvicornWorker` (needs the
+# uvicorn-worker package), and see the README for the trade-offs.
+#
+# How new chat messages reach the streams open on other workers (see chat/realtime.py).
+# Unset: Postgres LISTEN/NOTIFY when the database is Postgres, in-process otherwise.
+# CHAT_PUBSUB_BACKEND = "chat.realtime.InProcessBackend"
+
 
 
 
@@ -191,6 +226,35 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+#
+# Must be shared by every worker: the suspension list, friend graph, people
+# search index, navbar badges and moderator stats are invalidated across
+# processes through version keys kept here. Redis when REDIS_URL is set (Heroku
+# Data for Redis), otherwise a database table (`python manage.py createcachetable`,
+# run by the release phase in the Procfile).
+
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            # Heroku's Redis TLS endpoints use self-signed certificates
+            "OPTIONS": {"ssl_cert_reqs": None} if REDIS_URL.startswith("rediss://") else {},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,278 @@
+"""
+Daily analytics rollups for posts, RSVPs and organizer thanks.
+
+DailyCuisineStats and DailyOrganizerStats hold one row per day and cuisine /
+organizer, so questions like "posts per cuisine per week" or "RSVP conversion
+per organizer" read a few hundred small rows instead of aggregating the raw
+Post, RSVP and OrganizerThank tables.
+
+The rollups count events on the day they happened: a post created, an RSVP
+made, an RSVP cancelled, a thank-you given. `refresh()` keeps them current
+incrementally. It only scans raw rows from the day of the last watermark
+onwards (by the created_at / cancelled_at indexes), recomputes those days and
+replaces their rollup rows, so re-running it is harmless and rows committed
+late within the watermark's day are still picked up.
+
+Because those days are recomputed from the rows that exist at the time, a hard
+delete changes its day's figures as long as the day is still being recomputed,
+i.e. until a refresh has run on a later day (the nightly run at the latest).
+After that the day is final and later deletions don't change it. Deletions are
+not events themselves; posts are normally soft-deleted and still counted.
+
+The `analytics_rollups` scheduler job refreshes REFRESH_DELAY after new
+activity (its due times come from the database, so any scheduler process sees
+them), and nightly to close the previous day. A run with no new activity since
+the watermark does nothing, and a run that finds another refresh in progress
+leaves it to that one, so workers don't queue up on the watermark lock. Signals
+also wake this process's scheduler right away. On demand:
+`python manage.py refresh_analytics_rollups` (`--rebuild` starts over).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+
+from .scheduler import scheduler
+
+WATERMARK = "daily"
+REFRESH_DELAY = timedelta(seconds=60)
+
+CUISINE_COUNTERS = ("posts", "rsvps", "rsvps_cancelled")
+ORGANIZER_COUNTERS = ("posts", "rsvps", "rsvps_cancelled", "thanks")
+
+# When this process last woke its scheduler for a refresh, so a burst of saves wakes it once
+_refresh_due = None
+
+
+def day_start(day):
+    """Aware datetime for local midnight at the start of `day`"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _counts(qs, time_field, dimension, since):
+    """{(day, dimension id): n} for rows of qs whose time_field is at or after since"""
+    return {
+        (day, key): n
+        for day, key, n in (
+            qs.filter(**{f"{time_field}__gte": since})
+            .annotate(day=TruncDate(time_field))
+            .values("day", dimension)
+            .annotate(n=Count("id"))
+            .values_list("day", dimension, "n")
+            .order_by()
+        )
+    }
+
+
+def _collect(since):
+    from .models import RSVP, OrganizerThank, Post
+    cancelled = RSVP.objects.filter(is_cancelled=True)
+    cuisine = defaultdict(dict)
+    organizer = defaultdict(dict)
+    for counter, counts in (
+        ("posts", _counts(Post.objects.all(), "created_at", "cuisine_id", since)),
+        ("rsvps", _counts(RSVP.objects.all(), "created_at", "post__cuisine_id", since)),
+        ("rsvps_cancelled", _counts(cancelled, "cancelled_at", "post__cuisine_id", since)),
+    ):
+        for key, n in counts.items():
+            cuisine[key][counter] = n
+    for counter, counts in (
+        ("posts", _counts(Post.objects.all(), "created_at", "author_id", since)),
+        ("rsvps", _counts(RSVP.objects.all(), "created_at", "post__author_id", since)),
+        ("rsvps_cancelled", _counts(cancelled, "cancelled_at", "post__author_id", since)),
+        ("thanks", _counts(OrganizerThank.objects.all(), "created_at", "organizer_id", since)),
+    ):
+        for key, n in counts.items():
+            organizer[key][counter] = n
+    return cuisine, organizer
+
+
+def _first_day():
+    """The earliest day with any activity, for the first run"""
+    from .models import RSVP, OrganizerThank, Post
+    firsts = [
+        model.objects.order_by("created_at").values_list("created_at", flat=True).first()
+        for model in (Post, RSVP, OrganizerThank)
+    ]
+    firsts = [first for first in firsts if first is not None]
+    return timezone.localtime(min(firsts)).date() if firsts else None
+
+
+def changed_since(moment):
+    """Whether any post, RSVP, cancellation or thank-you is newer than `moment`"""
+    from .models import RSVP, OrganizerThank, Post
+    return (
+        Post.objects.filter(created_at__gt=moment).exists()
+        or RSVP.objects.filter(created_at__gt=moment).exists()
+        or RSVP.objects.filter(cancelled_at__gt=moment).exists()
+        or OrganizerThank.objects.filter(created_at__gt=moment).exists()
+    )
+
+
+def refresh(now=None, skip_if_busy=False):
+    """
+    Bring the rollups up to date. Returns the first day that was recomputed,
+    or None if there was nothing to do (or, with skip_if_busy, another
+    refresh was already running).
+    """
+    from .models import DailyCuisineStats, DailyOrganizerStats, RollupWatermark
+    now = now or timezone.now()
+    RollupWatermark.objects.get_or_create(name=WATERMARK)
+    with transaction.atomic():
+        # The watermark row doubles as the lock, so concurrent refreshes take turns
+        watermark = (
+            RollupWatermark.objects.select_for_update(skip_locked=skip_if_busy).filter(name=WATERMARK).first()
+        )
+        if watermark is None:
+            return None
+        if watermark.processed_until is not None:
+            first_day = timezone.localtime(watermark.processed_until).date()
+        else:
+            first_day = _first_day()
+        if first_day is not None:
+            cuisine, organizer = _collect(day_start(first_day))
+            DailyCuisineStats.objects.filter(day__gte=first_day).delete()
+            DailyOrganizerStats.objects.filter(day__gte=first_day).delete()
+            DailyCuisineStats.objects.bulk_create(
+                [DailyCuisineStats(day=day, cuisine_id=key, **counts) for (day, key), counts in cuisine.items()],
+                batch_size=1000,
+            )
+            DailyOrganizerStats.objects.bulk_create(
+                [DailyOrganizerStats(day=day, organizer_id=key, **counts) for (day, key), counts in organizer.items()],
+                batch_size=1000,
+            )
+        watermark.processed_until = now
+        watermark.save(update_fields=["processed_until"])
+    return first_day
+
+
+def rebuild():
+    """Forget the watermark and recompute every day from the raw tables"""
+    from .models import RollupWatermark
+    RollupWatermark.objects.filter(name=WATERMARK).update(processed_until=None)
+    return refresh()
+
+
+def refresh_later():
+    """Wake this process's scheduler REFRESH_DELAY from now, unless it is already due to run"""
+    global _refresh_due
+    now = timezone.now()
+    if _refresh_due is not None and _refresh_due > now:
+        return
+    _refresh_due = now + REFRESH_DELAY
+    scheduler.schedule("analytics_rollups", _refresh_due)
+
+
+def next_run_times():
+    """
+    For the scheduler: REFRESH_DELAY after the last refresh if there has been
+    activity since, and once a night, just after local midnight
+    """
+    tomorrow = timezone.localtime().date() + timedelta(days=1)
+    times = [day_start(tomorrow) + timedelta(minutes=15)]
+    until = processed_until()
+    if until is None or changed_since(until):
+        times.append(until + REFRESH_DELAY if until else timezone.now())
+    return times
+
+
+def run_scheduled(now):
+    """Scheduler job: refresh if there is new activity, or the previous day still needs closing"""
+    until = processed_until()
+    if (
+        until is not None
+        and timezone.localtime(until).date() == timezone.localtime(now).date()
+        and not changed_since(until)
+    ):
+        return
+    refresh(now, skip_if_busy=True)
+
+
+# Readers
+
+def _in_range(qs, start=None, end=None):
+    if start:
+        qs = qs.filter(day__gte=start)
+    if end:
+        qs = qs.filter(day__lte=end)
+    return qs
+
+
+def cuisine_daily(start=None, end=None):
+    """DailyCuisineStats rows as (day, cuisine name, posts, rsvps, rsvps_cancelled), by day and cuisine"""
+    from .models import DailyCuisineStats
+    return (
+        _in_range(DailyCuisineStats.objects.all(), start, end)
+        .order_by("day", "cuisine__name")
+        .values_list("day", "cuisine__name", *CUISINE_COUNTERS)
+    )
+
+
+def cuisine_totals(start=None, end=None):
+    """(cuisine name, posts, rsvps, rsvps_cancelled) per cuisine over the range"""
+    from .models import DailyCuisineStats
+    return (
+        _in_range(DailyCuisineStats.objects.all(), start, end)
+        .values("cuisine__name")
+        .annotate(**{f"total_{c}": Sum(c) for c in CUISINE_COUNTERS})
+        .order_by("cuisine__name")
+        .values_list("cuisine__name", *(f"total_{c}" for c in CUISINE_COUNTERS))
+    )
+
+
+def cuisine_weekly(start=None, end=None):
+    """{"week": Monday, "cuisine": name, "posts": n, "rsvps": n} per cuisine per week"""
+    from .models import DailyCuisineStats
+    return (
+        _in_range(DailyCuisineStats.objects.all(), start, end)
+        .annotate(week=TruncWeek("day"), cuisine_name=F("cuisine__name"))
+        .values("week", "cuisine_name")
+        .annotate(posts_total=Sum("posts"), rsvps_total=Sum("rsvps"))
+        .order_by("week", "cuisine_name")
+    )
+
+
+def organizer_daily(start=None, end=None):
+    """DailyOrganizerStats rows as (day, organizer id, organizer username, posts, rsvps, rsvps_cancelled, thanks)"""
+    from .models import DailyOrganizerStats
+    return (
+        _in_range(DailyOrganizerStats.objects.all(), start, end)
+        .order_by("day", "organizer_id")
+        .values_list("day", "organizer_id", "organizer__username", *ORGANIZER_COUNTERS)
+    )
+
+
+def organizer_conversion(start=None, end=None, limit=50):
+    """
+    Per organizer over the range: posts, RSVPs, cancellations, thanks, RSVPs per
+    post and the share of RSVPs that were kept. Busiest organizers first.
+    """
+    from .models import DailyOrganizerStats
+    rows = (
+        _in_range(DailyOrganizerStats.objects.all(), start, end)
+        .values("organizer_id", "organizer__username")
+        .annotate(**{f"total_{c}": Sum(c) for c in ORGANIZER_COUNTERS})
+        .order_by("-total_rsvps", "-total_posts", "organizer__username")[:limit]
+    )
+    result = []
+    for row in rows:
+        posts, rsvps, cancelled = row["total_posts"], row["total_rsvps"], row["total_rsvps_cancelled"]
+        result.append({
+            "organizer_id": row["organizer_id"],
+            "username": row["organizer__username"],
+            "posts": posts,
+            "rsvps": rsvps,
+            "rsvps_cancelled": cancelled,
+            "thanks": row["total_thanks"],
+            "rsvps_per_post": round(rsvps / posts, 2) if posts else None,
+            "kept_rate": round(100 * max(rsvps - cancelled, 0) / rsvps) if rsvps else None,
+        })
+    return result
+
+
+def processed_until():
+    from .models import RollupWatermark
+    return RollupWatermark.objects.filter(name=WATERMARK).values_list("processed_until", flat=True).first()
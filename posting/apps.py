@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class PostingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posting'
+
+    def ready(self):
+        from . import signals
+        from .models import Post
+        from .scheduler import scheduler
+        from . import analytics, qr
+        scheduler.register("publish_posts", Post.publish_due_posts, Post.scheduled_publish_times)
+        scheduler.register("qr_codes", qr.run_scheduled, qr.pending_due_times)
+        scheduler.register("analytics_rollups", analytics.run_scheduled, analytics.next_run_times)
@@ -0,0 +1,86 @@
+"""
+Navbar badge counts (unread messages, friend requests, unread posts, notifications).
+
+All counters are computed together in one SELECT of scalar subqueries and cached
+per user. Signals in posting/signals.py drop a user's entry when something behind
+one of their counters changes; feed-wide changes (a post created, edited or
+published) bump a shared version that is part of every key. Entries also expire
+on their own, since posts age out of the feed without any write.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import F, Func, IntegerField, Subquery
+from django.db.models.functions import Coalesce
+
+CACHE_TIMEOUT = 60  # seconds
+FEED_VERSION_KEY = "badges:feed_version"
+
+# Counter name -> context variable the templates already use
+CONTEXT_NAMES = {
+    "unread_messages": "unread_count",
+    "pending_friend_requests": "pending_friend_requests_count",
+    "unread_posts": "unread_posts_count",
+    "unread_notifications": "notification_count",
+}
+
+
+def _cache_key(user_id):
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(FEED_VERSION_KEY, version, None)
+    return f"badges:{user_id}:{version}"
+
+
+def _count(qs):
+    """A queryset as a scalar COUNT(*) subquery"""
+    counted = qs.order_by().annotate(n=Func(F("id"), function="COUNT")).values("n")
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def compute(user):
+    from django.contrib.auth.models import User
+    from chat.models import Message
+    from Friendslist.models import FriendRequest
+    from .models import Notification, PostReadState
+
+    counts = {
+        "unread_messages": _count(
+            Message.objects
+            .filter(
+                conversation__memberships__user=user,
+                id__gt=F("conversation__memberships__last_read_message_id"),
+            )
+            .exclude(sender=user)
+        ),
+        "pending_friend_requests": _count(
+            FriendRequest.objects.filter(status="pending", to_user=user)
+        ),
+        "unread_posts": _count(PostReadState.unread_posts(user)),
+        "unread_notifications": _count(
+            Notification.objects.filter(user=user, is_read=False)
+        ),
+    }
+    return User.objects.filter(pk=user.pk).values(**counts).get()
+
+
+def get_counts(user):
+    """All badge counters for a user, from the cache when possible"""
+    key = _cache_key(user.pk)
+    counts = cache.get(key)
+    if counts is None:
+        counts = compute(user)
+        cache.set(key, counts, CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate_user(*user_ids):
+    if user_ids:
+        version = cache.get(FEED_VERSION_KEY)
+        cache.delete_many([f"badges:{user_id}:{version}" for user_id in user_ids])
+
+
+def invalidate_feed():
+    """The post feed changed, so every user's unread post count may have too"""
+    cache.set(FEED_VERSION_KEY, time.time_ns(), None)
@@ -1,42 +1,18 @@
-from .models import Post
-from django.utils import timezone
-from django.db.models import Q
+from django.utils.functional import SimpleLazyObject
+
+from . import badges
 from .models import Notification
-from datetime import timedelta
 
-two_days_ago = timezone.now() - timedelta(days=2)
 
-def unread_posts_count(request):
+def badge_counts(request):
+    """Every navbar counter from one cached lookup (see posting/badges.py)"""
     if not request.user.is_authenticated:
         return {}
 
-    count = (
-        Post.objects
-        .filter
-        (is_deleted=False,
-         status=Post.Status.PUBLISHED,
-         created_at__gte=two_days_ago
-        ).filter(
-            Q(pickup_deadline__isnull=True) |
-            Q(pickup_deadline__gt=timezone.now())
-        )
-        .exclude(read_users=request.user)  
-        .count()
+    counts = badges.get_counts(request.user)
+    context = {name: counts[counter] for counter, name in badges.CONTEXT_NAMES.items()}
+    # Latest unread notifications, only queried if a template shows them
+    context["rsvp_notifications"] = SimpleLazyObject(
+        lambda: list(Notification.objects.filter(user=request.user, is_read=False).order_by("-created_at")[:5])
     )
-
-    return {"unread_posts_count": count}
-
-def rsvp_notifications(request):
-    if not request.user.is_authenticated:
-        return {}
-
-    unread = Notification.objects.filter(
-        user=request.user,
-        is_read=False
-    ).order_by("-created_at")[:5]
-
-    return {
-        "rsvp_notifications": unread,
-        "notification_count": unread.count(),  # 👍 simpler & more efficient
-    }
-
+    return context
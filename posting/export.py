@@ -0,0 +1,151 @@
+"""
+Streaming data export for admins (posting.views.export_data).
+
+Datasets:
+- summary: total posts, and posts and RSVPs per cuisine
+- posts: one row per post, with its RSVP count
+- rsvps: one row per RSVP
+- cuisine_daily: posts and RSVPs per cuisine per day
+- organizer_daily: posts, RSVPs and thanks per organizer per day
+
+The aggregate datasets (summary, *_daily) read the daily rollups maintained by
+posting/analytics.py rather than the raw tables. Every dataset streams from a
+server-side cursor (`.iterator(chunk_size=...)`) straight into the response as
+CSV or JSON lines, so memory use does not depend on table size. Rows can be
+limited to a date range (created_at, or the rollup day), and user identities
+are replaced by stable pseudonyms unless anonymization is turned off.
+"""
+import csv
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+
+from . import analytics
+
+CHUNK_SIZE = 2000
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+class ExportError(ValueError):
+    """Bad export parameters"""
+
+
+class _Echo:
+    """csv.writer target that hands back each line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def pseudonym(user_id):
+    """A stable stand-in for a user id that cannot be reversed without SECRET_KEY"""
+    if user_id is None:
+        return None
+    digest = hmac.new(settings.SECRET_KEY.encode(), f"export-user:{user_id}".encode(), hashlib.sha256)
+    return digest.hexdigest()[:16]
+
+
+def _date_filter(qs, field, start, end):
+    # Plain datetime bounds (not __date) so the created_at indexes can be used
+    if start:
+        qs = qs.filter(**{f"{field}__gte": analytics.day_start(start)})
+    if end:
+        qs = qs.filter(**{f"{field}__lt": analytics.day_start(end + timedelta(days=1))})
+    return qs
+
+
+def _summary(start, end, anonymize):
+    totals = list(analytics.cuisine_totals(start, end))
+    yield ["metric", "cuisine", "value"]
+    yield ["total_posts", "", sum(posts for _, posts, _, _ in totals)]
+    for name, posts, _, _ in totals:
+        yield ["posts_by_cuisine", name, posts]
+    for name, _, rsvps, _ in totals:
+        yield ["rsvps_by_cuisine", name, rsvps]
+
+
+def _posts(start, end, anonymize):
+    from .models import Post
+    posts = (
+        _date_filter(Post.objects.all(), "created_at", start, end)
+        .annotate(rsvp_count=Count("rsvps", filter=Q(rsvps__is_cancelled=False)))
+        .order_by("id")
+    )
+    author = "author_id" if anonymize else "author__username"
+    yield ["id", "created_at", "status", "visibility", "cuisine", "location", "author",
+           "pickup_deadline", "is_deleted", "rsvp_count"]
+    for row in posts.values_list(
+        "id", "created_at", "status", "visibility", "cuisine__name", "location__building_name", author,
+        "pickup_deadline", "is_deleted", "rsvp_count",
+    ).iterator(chunk_size=CHUNK_SIZE):
+        row = list(row)
+        if anonymize:
+            row[6] = pseudonym(row[6])
+        yield row
+
+
+def _rsvps(start, end, anonymize):
+    from .models import RSVP
+    rsvps = _date_filter(RSVP.objects.all(), "created_at", start, end).order_by("id")
+    user = "user_id" if anonymize else "user__username"
+    yield ["id", "post_id", "cuisine", "user", "estimated_arrival_minutes", "created_at",
+           "is_cancelled", "cancelled_at"]
+    for row in rsvps.values_list(
+        "id", "post_id", "post__cuisine__name", user, "estimated_arrival_minutes", "created_at",
+        "is_cancelled", "cancelled_at",
+    ).iterator(chunk_size=CHUNK_SIZE):
+        row = list(row)
+        if anonymize:
+            row[3] = pseudonym(row[3])
+        yield row
+
+
+def _cuisine_daily(start, end, anonymize):
+    yield ["day", "cuisine", "posts", "rsvps", "rsvps_cancelled"]
+    yield from analytics.cuisine_daily(start, end).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _organizer_daily(start, end, anonymize):
+    yield ["day", "organizer", "posts", "rsvps", "rsvps_cancelled", "thanks"]
+    for day, organizer_id, username, *counts in analytics.organizer_daily(start, end).iterator(chunk_size=CHUNK_SIZE):
+        yield [day, pseudonym(organizer_id) if anonymize else username, *counts]
+
+
+DATASETS = {
+    "summary": _summary,
+    "posts": _posts,
+    "rsvps": _rsvps,
+    "cuisine_daily": _cuisine_daily,
+    "organizer_daily": _organizer_daily,
+}
+
+
+def _lines(rows, fmt):
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        header = next(rows)
+        for row in rows:
+            yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def stream(dataset, fmt="csv", start=None, end=None, anonymize=True):
+    """
+    Lines (str) of the export, produced lazily. The first row of each dataset is
+    its header; JSON lines use it as the keys. Raises ExportError up front for
+    bad parameters.
+    """
+    if dataset not in DATASETS:
+        raise ExportError(f"Unknown dataset {dataset!r}; choose from {', '.join(DATASETS)}")
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+    if start and end and start > end:
+        raise ExportError("start must not be after end")
+    return _lines(DATASETS[dataset](start, end, anonymize), fmt)
@@ -0,0 +1,123 @@
+import math
+
+from django.db.models import Q
+
+# Geohash alphabet (base32 without a, i, l, o)
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~5m cells, plenty for buildings on a campus
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE_LAT = 111.32
+
+DEFAULT_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 50.0
+
+# Never OR together more than this many geohash ranges in one query
+MAX_COVER_CELLS = 16
+
+
+def haversine_distance_km(lat1, lon1, lat2, lon2):
+    R = EARTH_RADIUS_KM
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (math.sin(dlat/2)**2 +
+         math.cos(math.radians(lat1)) *
+         math.cos(math.radians(lat2)) *
+         math.sin(dlon/2)**2)
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    return R * c
+
+
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    """Encode a lat/lng pair as a geohash string of the given length"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def geohash_cell_size(precision):
+    """Return (lat_degrees, lng_degrees) covered by one cell at this precision"""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) that fully contains the circle
+    of radius_km around (lat, lng). Longitude degrees shrink with cos(lat).
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)  # avoid blowing up at the poles
+    dlng = radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+    return (
+        max(lat - dlat, -90.0),
+        min(lat + dlat, 90.0),
+        max(lng - dlng, -180.0),
+        min(lng + dlng, 180.0),
+    )
+
+
+def covering_cells(min_lat, max_lat, min_lng, max_lng):
+    """
+    Return the set of geohash prefixes that together cover the bounding box.
+    Picks the finest precision that still needs at most MAX_COVER_CELLS cells.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_lat, cell_lng = geohash_cell_size(precision)
+        rows = math.ceil((max_lat - min_lat) / cell_lat) + 1
+        cols = math.ceil((max_lng - min_lng) / cell_lng) + 1
+        if rows * cols <= MAX_COVER_CELLS:
+            break
+
+    cells = set()
+    for r in range(rows + 1):
+        cell_point_lat = min(min_lat + r * cell_lat, max_lat)
+        for c in range(cols + 1):
+            cell_point_lng = min(min_lng + c * cell_lng, max_lng)
+            cells.add(encode_geohash(cell_point_lat, cell_point_lng, precision))
+    return cells
+
+
+def parse_radius_km(value):
+    """Parse the radius_km query param, falling back to the default and capping it"""
+    try:
+        radius = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RADIUS_KM
+    if not math.isfinite(radius) or radius <= 0:
+        return DEFAULT_RADIUS_KM
+    return min(radius, MAX_RADIUS_KM)
+
+
+def geohash_cells_q(cells, field="geohash"):
+    """
+    Build a Q that matches rows whose geohash falls inside any of the cells.
+    Uses ranges instead of startswith so SQLite can use the index too.
+    """
+    q = Q()
+    for cell in cells:
+        q |= Q(**{f"{field}__gte": cell, f"{field}__lt": cell + "~"})
+    return q
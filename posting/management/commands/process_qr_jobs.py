@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from posting import qr
+from posting.models import QRCodeJob
+
+
+class Command(BaseCommand):
+    help = 'Pre-renders QR codes for posts waiting in the QR job queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and poll for new jobs instead of exiting when the queue is empty',
+        )
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            done = qr.process_jobs()
+            total += done
+            if done:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        remaining = QRCodeJob.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'Rendered QR codes for {total} post(s). {remaining} job(s) left.'))
@@ -7,18 +7,8 @@ class Command(BaseCommand):
     help = 'Publishes all scheduled posts whose publish_at time has passed'
 
     def handle(self, *args, **options):
-        # Find all scheduled posts where publish_at <= current time
-        now = timezone.now()
-        scheduled_posts = Post.objects.filter(
-            status=Post.Status.SCHEDULED,
-            publish_at__lte=now
-        )
-
-        # Count how many posts we're about to publish
-        count = scheduled_posts.count()
-
-        # Update their status to PUBLISHED
-        scheduled_posts.update(status=Post.Status.PUBLISHED)
+        # Publish all scheduled posts where publish_at <= current time
+        count = Post.publish_due_posts(timezone.now())
 
         # Print success message
         if count == 0:
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from posting import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index used by the post feed'
+
+    def handle(self, *args, **options):
+        if not search.rebuild():
+            self.stdout.write(self.style.WARNING(
+                'No full-text index on this database. Run migrate first.'
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from posting import analytics
+
+
+class Command(BaseCommand):
+    help = 'Updates the daily post, RSVP and thanks rollups with activity since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Recompute every day from the raw tables instead of starting at the watermark',
+        )
+
+    def handle(self, *args, **options):
+        first_day = analytics.rebuild() if options['rebuild'] else analytics.refresh()
+        if first_day is None:
+            self.stdout.write('No activity to roll up yet.')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Rollups updated from {first_day} onwards.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from posting import qr
+
+
+class Command(BaseCommand):
+    help = 'Queues every live post for QR pre-rendering into the QR image cache'
+
+    def handle(self, *args, **options):
+        post_ids = qr.live_post_ids()
+        qr.enqueue(post_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Queued {len(post_ids)} post(s) for QR rendering against {qr.base_url()}.'
+        ))
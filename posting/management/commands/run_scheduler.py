@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from posting.scheduler import STANDALONE_RESYNC_INTERVAL, scheduler
+
+
+class Command(BaseCommand):
+    help = 'Runs the background scheduler in the foreground (publishes scheduled posts when due)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=STANDALONE_RESYNC_INTERVAL,
+            help='Seconds between checks of the database for due work scheduled by the web workers',
+        )
+
+    def handle(self, *args, **options):
+        # This process never receives the schedule() calls made in the web
+        # workers, so it has to poll for work they queued
+        scheduler.resync_interval = options['interval']
+        self.stdout.write(self.style.SUCCESS('Scheduler running. Press Ctrl+C to stop.'))
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            scheduler.stop()
+            self.stdout.write(self.style.SUCCESS('Scheduler stopped.'))
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:09
+
+from django.db import migrations, models
+
+from posting.geo import encode_geohash
+
+
+def backfill_geohash(apps, schema_editor):
+    """Compute the geohash for locations that already have coordinates."""
+    Location = apps.get_model('posting', 'Location')
+    locations = Location.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for location in locations:
+        location.geohash = encode_geohash(location.latitude, location.longitude)
+        location.save(update_fields=['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posting', '0017_seed_allergens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['latitude', 'longitude'], name='posting_loc_latitud_9520f0_idx'),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
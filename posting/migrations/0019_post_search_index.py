@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from posting import search
+
+
+def create_search_index(apps, schema_editor):
+    """Create the FTS5 table (SQLite) or tsvector column + GIN index (Postgres) and fill it."""
+    search.create_index(schema_editor)
+    search.rebuild()
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posting', '0018_location_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posting', '0019_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('status', 'published')), fields=['created_at', 'pickup_deadline'], name='post_active_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_qr_code_url(apps, schema_editor):
+    """Existing QR codes were all generated against the Heroku domain."""
+    Post = apps.get_model('posting', 'Post')
+    for post in Post.objects.exclude(qr_code_image='').exclude(qr_code_image__isnull=True):
+        post.qr_code_url = f"https://swe-b-27-0f4424ee120f.herokuapp.com/posts/{post.id}"
+        post.save(update_fields=['qr_code_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posting', '0020_post_active_feed_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='qr_code_url',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='QRCodeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.CharField(blank=True, max_length=255)),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='qr_code_job', to='posting.post')),
+            ],
+        ),
+        migrations.RunPython(backfill_qr_code_url, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posting', '0021_qrcodejob'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='post',
+            name='qr_code_url',
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_read_state(apps, schema_editor):
+    """bumped_at starts out as created_at; existing reads become read_posts entries."""
+    Post = apps.get_model('posting', 'Post')
+    PostReadState = apps.get_model('posting', 'PostReadState')
+    Post.objects.update(bumped_at=models.F('created_at'))
+
+    read_at = django.utils.timezone.now().timestamp()
+    read_posts = {}
+    reads = Post.read_users.through.objects.filter(post__is_deleted=False)
+    for post_id, user_id in reads.values_list('post_id', 'user_id').iterator():
+        read_posts.setdefault(user_id, {})[str(post_id)] = read_at
+    PostReadState.objects.bulk_create(
+        [PostReadState(user_id=user_id, read_posts=posts) for user_id, posts in read_posts.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posting', '0022_remove_post_qr_code_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='bumped_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.CreateModel(
+            name='PostReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seen_up_to', models.DateTimeField(blank=True, null=True)),
+                ('read_posts', models.JSONField(blank=True, default=dict)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='post_read_state', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_read_state, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='post',
+            name='read_users',
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posting', '0023_postreadstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCuisineStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('posts', models.PositiveIntegerField(default=0)),
+                ('rsvps', models.PositiveIntegerField(default=0)),
+                ('rsvps_cancelled', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyOrganizerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('posts', models.PositiveIntegerField(default=0)),
+                ('rsvps', models.PositiveIntegerField(default=0)),
+                ('rsvps_cancelled', models.PositiveIntegerField(default=0)),
+                ('thanks', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('processed_until', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='organizerthank',
+            index=models.Index(fields=['created_at'], name='thank_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['created_at'], name='post_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rsvp',
+            index=models.Index(fields=['created_at'], name='rsvp_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rsvp',
+            index=models.Index(condition=models.Q(('cancelled_at__isnull', False)), fields=['cancelled_at'], name='rsvp_cancelled_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyorganizerstats',
+            name='organizer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='dailycuisinestats',
+            name='cuisine',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='posting.cuisine'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyorganizerstats',
+            index=models.Index(fields=['organizer', 'day'], name='daily_organizer_stats_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyorganizerstats',
+            constraint=models.UniqueConstraint(fields=('day', 'organizer'), name='daily_organizer_stats_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycuisinestats',
+            constraint=models.UniqueConstraint(fields=('day', 'cuisine'), name='daily_cuisine_stats_unique'),
+        ),
+    ]
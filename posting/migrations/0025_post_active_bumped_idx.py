@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posting', '0024_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('status', 'published')), fields=['bumped_at'], name='post_active_bumped_idx'),
+        ),
+    ]
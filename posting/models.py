@@ -1,15 +1,15 @@
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils.text import get_valid_filename
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 User = get_user_model()
 import time
-import qrcode
-from io import BytesIO
-from django.core.files import File
 from django.utils import timezone
+from django.conf import settings
+from datetime import datetime, timedelta, timezone as dt_timezone
+from .geo import encode_geohash
 
 
 # Create your models here.
@@ -40,10 +40,46 @@ class Location(models.Model):
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     building_name = models.CharField(max_length=30)
+    # Geohash of (latitude, longitude), used as a spatial index for "near me" search
+    geohash = models.CharField(max_length=12, blank=True, default="", db_index=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["latitude", "longitude"]),
+        ]
 
     def __str__(self):
         return self.building_name
 
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ""
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"geohash"}
+        super().save(*args, **kwargs)
+
+
+class PostQuerySet(models.QuerySet):
+    def active_feed(self, now=None):
+        """
+        Published, not deleted, still within the feed freshness window and
+        not past the pickup deadline. The window slides with `now`, so it is
+        evaluated per request rather than once at import time.
+        Served by the post_active_feed_idx partial index.
+        """
+        now = now or timezone.now()
+        window = timedelta(hours=getattr(settings, "POSTING_FEED_WINDOW_HOURS", 48))
+        return self.filter(
+            status=Post.Status.PUBLISHED,
+            is_deleted=False,
+            created_at__gte=now - window,
+        ).filter(
+            models.Q(pickup_deadline__isnull=True) | models.Q(pickup_deadline__gt=now)
+        )
+
 
 class Post(models.Model):
     class Status(models.TextChoices):
@@ -68,9 +104,11 @@ class Post(models.Model):
     )
     publish_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # When the post last became "new" to readers: created, published or edited.
+    # Read tracking (PostReadState) compares against this.
+    bumped_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     image = models.ImageField(upload_to=event_image_upload_to, null=True, blank=True)
-    read_users = models.ManyToManyField(User, related_name="read_posts", blank=True)
     location = models.ForeignKey(
         Location,
         on_delete=models.SET_NULL,
@@ -78,6 +116,7 @@ class Post(models.Model):
         blank=True,
         related_name="posts",
     )
+    # Legacy stored QR PNGs; QR codes are now rendered on demand by posting.qr
     qr_code_image = models.ImageField(upload_to="qr_codes/", blank=True, null=True)
     is_deleted = models.BooleanField(default=False)
     pickup_deadline = models.DateTimeField(
@@ -86,8 +125,26 @@ class Post(models.Model):
         help_text="When will you stop giving out food? (Leave empty if no specific deadline)"
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Only live posts are indexed, so the active feed stays a small range scan
+            models.Index(
+                fields=['created_at', 'pickup_deadline'],
+                condition=models.Q(status='published', is_deleted=False),
+                name='post_active_feed_idx',
+            ),
+            # Analytics rollups (posting/analytics.py) scan posts created since a watermark
+            models.Index(fields=['created_at'], name='post_created_at_idx'),
+            # Unread posts (PostReadState): live posts bumped after the reader's watermark
+            models.Index(
+                fields=['bumped_at'],
+                condition=models.Q(status='published', is_deleted=False),
+                name='post_active_bumped_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.event} ({self.author})"
@@ -124,34 +181,127 @@ class Post(models.Model):
             #making the cuisine choice case-insensitive
         super().save(*args, **kwargs)
 
-        # Generate QR code after saving so we have self.id
-        if not self.qr_code_image:  # only generate if it doesn't exist
-            self.generate_qr_code()
-            super().save(update_fields=['qr_code_image'])
+    @classmethod
+    def publish_due_posts(cls, now=None):
+        """
+        Publish every scheduled post whose publish_at has passed.
+        The UPDATE is conditional, so running it from several processes at once is safe.
+        """
+        from . import badges
+        now = now or timezone.now()
+        published = cls.objects.filter(
+            status=cls.Status.SCHEDULED,
+            publish_at__lte=now
+        ).update(status=cls.Status.PUBLISHED, bumped_at=now)
+        if published:
+            badges.invalidate_feed()
+        return published
+
+    @classmethod
+    def scheduled_publish_times(cls):
+        """publish_at of every post still waiting to be published (for the scheduler)"""
+        return list(
+            cls.objects.filter(status=cls.Status.SCHEDULED, publish_at__isnull=False)
+            .values_list("publish_at", flat=True)
+        )
 
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('posting:post_detail', args=[self.id])
 
-    def generate_qr_code(self):
-    # build full url for the post
-        base_url = "https://swe-b-27-0f4424ee120f.herokuapp.com"  # change to real domain in production
-        detail_url = base_url + self.get_absolute_url()  # /posts/5/
+class PostReadState(models.Model):
+    """
+    Which posts a user has read, stored compactly instead of one row per (post, reader).
 
-        qr = qrcode.QRCode(
-            version=1,
-            box_size=10,
-            border=4
-        )
-        qr.add_data(detail_url)  # store URL only!
-        qr.make(fit=True)
+    Every post bumped at or before `seen_up_to` counts as read. Posts bumped after it
+    that the user opened are kept in `read_posts` as {post_id: read_at timestamp}.
+    Whenever the user reads something the watermark is moved up to just before their
+    oldest unread feed post, and entries it now covers are dropped, so the exception
+    set stays about as small as the feed itself.
+    """
+    # Keep reads of posts bumped in the last moment as exceptions, in case a post
+    # saved just before the watermark moved wasn't committed yet
+    WATERMARK_MARGIN = timedelta(minutes=1)
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="post_read_state")
+    seen_up_to = models.DateTimeField(null=True, blank=True)
+    read_posts = models.JSONField(default=dict, blank=True)
 
-        img = qr.make_image(fill_color="black", back_color="white")
-        blob = BytesIO()
-        img.save(blob, format='PNG')
+    def __str__(self):
+        return f"Read state for {self.user}"
+
+    def _has_read(self, post_id, bumped_at):
+        if self.seen_up_to and bumped_at <= self.seen_up_to:
+            return True
+        read_at = self.read_posts.get(str(post_id))
+        return read_at is not None and read_at >= bumped_at.timestamp()
+
+    @classmethod
+    def mark_read(cls, user, post):
+        state, _ = cls.objects.get_or_create(user=user)
+        if state._has_read(post.id, post.bumped_at):
+            return state
+        with transaction.atomic():
+            # Re-read under a row lock, so two tabs reading at once both keep their reads
+            state = cls.objects.select_for_update().get(pk=state.pk)
+            if not state._has_read(post.id, post.bumped_at):
+                state.read_posts[str(post.id)] = timezone.now().timestamp()
+                state._advance_watermark()
+                state.save(update_fields=["seen_up_to", "read_posts"])
+        return state
+
+    def _advance_watermark(self):
+        """Move seen_up_to as far as it can go and drop the exceptions it covers"""
+        now = timezone.now()
+        feed = Post.objects.active_feed(now)
+        if self.seen_up_to:
+            feed = feed.filter(bumped_at__gt=self.seen_up_to)
+        pending = list(feed.values_list("id", "bumped_at"))
+        unread = [bumped_at for post_id, bumped_at in pending if not self._has_read(post_id, bumped_at)]
+
+        watermark = now - self.WATERMARK_MARGIN
+        if unread:
+            watermark = min(watermark, min(unread) - timedelta(microseconds=1))
+        if self.seen_up_to is None or watermark > self.seen_up_to:
+            self.seen_up_to = watermark
+
+        # Only reads of feed posts above the watermark still carry information
+        live = {str(post_id) for post_id, bumped_at in pending if bumped_at > self.seen_up_to}
+        self.read_posts = {post_id: read_at for post_id, read_at in self.read_posts.items() if post_id in live}
+
+    @classmethod
+    def unread_posts(cls, user):
+        """
+        Active feed posts the user hasn't read: the feed above the watermark,
+        minus the few exceptions (matched by id and bump time).
+        """
+        state = cls.objects.filter(user=user).first()
+        feed = Post.objects.active_feed()
+        if state is None:
+            return feed
+        if state.seen_up_to:
+            feed = feed.filter(bumped_at__gt=state.seen_up_to)
+        read = models.Q()
+        for post_id, read_at in state.read_posts.items():
+            read_at = datetime.fromtimestamp(read_at, tz=dt_timezone.utc)
+            read |= models.Q(id=int(post_id), bumped_at__lte=read_at)
+        return feed.exclude(read) if read else feed
+
+    @classmethod
+    def unread_count(cls, user):
+        return cls.unread_posts(user).count()
+
+
+class QRCodeJob(models.Model):
+    """A post whose QR code should be pre-rendered into the QR image cache"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='qr_code_job')
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
 
-        self.qr_code_image.save(f'post_{self.id}_qr.png', File(blob), save=False)
-        blob.close()
+    def __str__(self):
+        return f"QR job for post {self.post_id}"
 
 class OrganizerThank(models.Model):
     thanker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='thanks_given')
@@ -160,6 +310,9 @@ class OrganizerThank(models.Model):
 
     class Meta:
         unique_together = ('thanker', 'organizer')
+        indexes = [
+            models.Index(fields=['created_at'], name='thank_created_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.thanker.username} thanked {self.organizer.username}"
@@ -181,6 +334,14 @@ class RSVP(models.Model):
     class Meta:
         unique_together = ('post', 'user')
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='rsvp_created_at_idx'),
+            models.Index(
+                fields=['cancelled_at'],
+                condition=models.Q(cancelled_at__isnull=False),
+                name='rsvp_cancelled_at_idx',
+            ),
+        ]
         verbose_name = "RSVP"
         verbose_name_plural = "RSVPs"
 
@@ -253,3 +414,50 @@ class Notification(models.Model):
 
     def __str__(self):
         return f"Notification for {self.user}: {self.message[:40]}"
+
+
+class DailyCuisineStats(models.Model):
+    """Posts and RSVPs per cuisine per day, maintained by posting/analytics.py"""
+    day = models.DateField()
+    cuisine = models.ForeignKey(Cuisine, on_delete=models.CASCADE, related_name="daily_stats")
+    posts = models.PositiveIntegerField(default=0)
+    rsvps = models.PositiveIntegerField(default=0)
+    rsvps_cancelled = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "cuisine"], name="daily_cuisine_stats_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.cuisine}: {self.posts} posts, {self.rsvps} RSVPs"
+
+
+class DailyOrganizerStats(models.Model):
+    """Posts, RSVPs to them and thanks received per organizer per day, maintained by posting/analytics.py"""
+    day = models.DateField()
+    organizer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="daily_stats")
+    posts = models.PositiveIntegerField(default=0)
+    rsvps = models.PositiveIntegerField(default=0)
+    rsvps_cancelled = models.PositiveIntegerField(default=0)
+    thanks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "organizer"], name="daily_organizer_stats_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["organizer", "day"], name="daily_organizer_stats_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.organizer}: {self.posts} posts, {self.rsvps} RSVPs"
+
+
+class RollupWatermark(models.Model):
+    """How far the daily rollups have been brought up to date"""
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.processed_until}"
@@ -0,0 +1,140 @@
+"""
+Keyset (cursor) pagination for the post feed and event history.
+
+Instead of OFFSET, each page remembers the sort key of its last/first row and
+the next query starts right after/before it, so page N costs the same as page 1.
+Cursors are opaque url-safe strings passed as ?after=... or ?before=...
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(*values):
+    raw = "|".join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, *types):
+    """Decode a cursor into a tuple of values, or None if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        if len(parts) != len(types):
+            return None
+        return tuple(cast(part) for cast, part in zip(types, parts))
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """A page of results plus the cursors to reach its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list) or self.has_previous()
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _created_at_key(post):
+    return encode_cursor(post.created_at.isoformat(), post.id)
+
+
+def paginate_by_created_at(qs, request, per_page, newest_first=True):
+    """
+    Keyset-paginate a Post queryset ordered by (created_at, id).
+    Reads ?after= / ?before= from the request.
+    """
+    after = decode_cursor(request.GET.get("after"), datetime.fromisoformat, int)
+    before = decode_cursor(request.GET.get("before"), datetime.fromisoformat, int)
+
+    # "forward" follows the page order; "backward" walks towards the first page
+    if newest_first:
+        forward, backward = ("-created_at", "-id"), ("created_at", "id")
+        past = lambda ts, pk: Q(created_at__lt=ts) | Q(created_at=ts, id__lt=pk)
+        future = lambda ts, pk: Q(created_at__gt=ts) | Q(created_at=ts, id__gt=pk)
+    else:
+        forward, backward = ("created_at", "id"), ("-created_at", "-id")
+        past = lambda ts, pk: Q(created_at__gt=ts) | Q(created_at=ts, id__gt=pk)
+        future = lambda ts, pk: Q(created_at__lt=ts) | Q(created_at=ts, id__lt=pk)
+
+    if before and not after:
+        rows = list(qs.filter(future(*before)).order_by(*backward)[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return KeysetPage(
+            rows,
+            next_cursor=_created_at_key(rows[-1]) if rows else None,
+            previous_cursor=_created_at_key(rows[0]) if rows and has_previous else None,
+        )
+
+    if after:
+        qs = qs.filter(past(*after))
+    rows = list(qs.order_by(*forward)[:per_page + 1])
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    return KeysetPage(
+        rows,
+        next_cursor=_created_at_key(rows[-1]) if rows and has_next else None,
+        previous_cursor=_created_at_key(rows[0]) if rows and after else None,
+    )
+
+
+def paginate_by_distance(posts, request, per_page):
+    """
+    Keyset-paginate an in-memory list already sorted by (distance_km, -id),
+    as produced by the "near me" feed.
+    """
+    after = decode_cursor(request.GET.get("after"), float, int)
+    before = decode_cursor(request.GET.get("before"), float, int)
+    key = lambda post: (post.distance_km, -post.id)
+    cursor_of = lambda post: encode_cursor(repr(post.distance_km), post.id)
+
+    if before and not after:
+        bound = (before[0], -before[1])
+        earlier = [post for post in posts if key(post) < bound]
+        rows = earlier[-per_page:]
+        return KeysetPage(
+            rows,
+            next_cursor=cursor_of(rows[-1]) if rows else None,
+            previous_cursor=cursor_of(rows[0]) if len(earlier) > per_page else None,
+        )
+
+    if after:
+        bound = (after[0], -after[1])
+        posts = [post for post in posts if key(post) > bound]
+    rows = posts[:per_page]
+    return KeysetPage(
+        rows,
+        next_cursor=cursor_of(rows[-1]) if len(posts) > per_page else None,
+        previous_cursor=cursor_of(rows[0]) if rows and after else None,
+    )
+
+
+def page_querystring(request):
+    """The current query string without pagination params, for building page links"""
+    params = request.GET.copy()
+    for name in ("page", "after", "before"):
+        params.pop(name, None)
+    return params.urlencode()
@@ -0,0 +1,213 @@
+"""
+QR codes for posts.
+
+A post's QR code only encodes its absolute URL, so it is rendered on demand
+(PNG or SVG) instead of being stored per post. Rendered images are addressed
+by a hash of their content inputs and kept in a bounded in-memory LRU plus a
+disk cache (POSTING_QR_CACHE_DIR) shared by the workers on a host, and served
+with a strong ETag and immutable cache headers.
+
+New posts are queued in QRCodeJob and pre-rendered in the background, by the
+scheduler or `process_qr_jobs`; until then the view renders on a cache miss.
+`regenerate_qr_codes` queues every live post again, e.g. after
+POSTING_QR_BASE_URL changes.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://swe-b-27-0f4424ee120f.herokuapp.com"
+FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+# Bump when the rendering parameters change, so every cached image gets a new hash
+RENDER_VERSION = 1
+MEMORY_CACHE_SIZE = 256  # images
+CLAIM_TIMEOUT = timedelta(minutes=10)  # a claimed job older than this is retried
+MAX_ATTEMPTS = 5
+BATCH_SIZE = 50
+
+
+def base_url():
+    return getattr(settings, "POSTING_QR_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+
+
+def post_qr_target(post_id):
+    """The URL a post's QR code encodes, built from the id alone (no DB access)"""
+    from django.urls import reverse
+    return base_url() + reverse('posting:post_detail', args=[post_id])
+
+
+def qr_digest(data, fmt):
+    """Content hash of a QR image: same inputs -> same bytes -> same hash"""
+    return hashlib.sha256(f"{RENDER_VERSION}:{fmt}:{data}".encode()).hexdigest()
+
+
+def render_qr(data, fmt="png"):
+    qr = qrcode.QRCode(
+        version=1,
+        box_size=10,
+        border=4
+    )
+    qr.add_data(data)  # store URL only!
+    qr.make(fit=True)
+
+    blob = BytesIO()
+    if fmt == "svg":
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(blob)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(blob, format='PNG')
+    return blob.getvalue()
+
+
+class QRImageCache:
+    """Bounded in-memory LRU in front of a directory of <digest>.<fmt> files"""
+
+    def __init__(self, max_items=MEMORY_CACHE_SIZE, directory=None):
+        self.max_items = max_items
+        self._directory = directory
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        return self._directory or getattr(
+            settings, "POSTING_QR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "qr_cache")
+        )
+
+    def _path(self, digest, fmt):
+        return os.path.join(self.directory, f"{digest}.{fmt}")
+
+    def _remember(self, key, content):
+        with self._lock:
+            self._items[key] = content
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get(self, digest, fmt):
+        key = (digest, fmt)
+        with self._lock:
+            content = self._items.get(key)
+            if content is not None:
+                self._items.move_to_end(key)
+                return content
+        try:
+            with open(self._path(digest, fmt), "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+        self._remember(key, content)
+        return content
+
+    def put(self, digest, fmt, content):
+        self._remember((digest, fmt), content)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write then rename, so concurrent readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, self._path(digest, fmt))
+        except OSError as exc:
+            logger.warning("Could not write QR cache file %s: %s", digest, exc)
+
+
+image_cache = QRImageCache()
+
+
+def get_post_qr(post_id, fmt="png"):
+    """Return (digest, image bytes) for a post's QR code, rendering only on a cache miss"""
+    data = post_qr_target(post_id)
+    digest = qr_digest(data, fmt)
+    content = image_cache.get(digest, fmt)
+    if content is None:
+        content = render_qr(data, fmt)
+        image_cache.put(digest, fmt, content)
+    return digest, content
+
+
+def post_qr_etag(post_id, fmt="png"):
+    return f'"{qr_digest(post_qr_target(post_id), fmt)}"'
+
+
+def enqueue(post_ids):
+    """Queue QR warm-up for the given posts (duplicates are ignored)"""
+    from .models import QRCodeJob
+    QRCodeJob.objects.bulk_create(
+        [QRCodeJob(post_id=post_id) for post_id in post_ids],
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(lambda: scheduler.schedule("qr_codes", timezone.now()))
+
+
+def pending_due_times():
+    """For the scheduler: due now if any job is waiting"""
+    from .models import QRCodeJob
+    if QRCodeJob.objects.filter(attempts__lt=MAX_ATTEMPTS).exists():
+        return [timezone.now()]
+    return []
+
+
+def process_jobs(now=None, limit=BATCH_SIZE):
+    """
+    Pre-render QR codes for up to `limit` queued posts into the image cache.
+    Each job is claimed with a conditional UPDATE, so several workers can
+    drain the queue at once. Returns the number of posts processed.
+    """
+    from .models import QRCodeJob
+    now = now or timezone.now()
+    done = 0
+
+    candidates = (
+        QRCodeJob.objects
+        .filter(attempts__lt=MAX_ATTEMPTS)
+        .exclude(claimed_at__gt=now - CLAIM_TIMEOUT)
+        .order_by("id")[:limit]
+    )
+    for job in candidates:
+        claimed = QRCodeJob.objects.filter(id=job.id, claimed_at=job.claimed_at).update(
+            claimed_at=now, attempts=job.attempts + 1
+        )
+        if not claimed:
+            continue  # another worker got it first
+
+        try:
+            for fmt in FORMATS:
+                get_post_qr(job.post_id, fmt)
+        except Exception as exc:
+            # One bad job must not stop the batch (or the scheduler thread running it)
+            logger.exception("QR generation failed for post %s", job.post_id)
+            QRCodeJob.objects.filter(id=job.id).update(last_error=str(exc)[:255])
+            continue
+        job.delete()
+        done += 1
+
+    return done
+
+
+def run_scheduled(now):
+    """Scheduler job: drain one batch, and come back right away if more are waiting"""
+    if process_jobs(now) >= BATCH_SIZE:
+        scheduler.schedule("qr_codes", timezone.now())
+
+
+def live_post_ids():
+    from .models import Post
+    return list(Post.objects.filter(is_deleted=False).values_list("id", flat=True))
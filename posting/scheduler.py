@@ -0,0 +1,158 @@
+"""
+Timer-driven background scheduler.
+
+Jobs (e.g. "publish scheduled posts") register a loader that returns the times
+they are next due, and a runner that does the work. The scheduler keeps every
+due time in a min-heap and sleeps until the earliest one, so work happens right
+when it is due instead of on the request path.
+
+Every runner must be idempotent (a conditional UPDATE), so it is safe for each
+gunicorn worker to run its own scheduler, or to run `manage.py run_scheduler`
+as a separate process alongside them.
+
+A job that raises is logged and retried after RETRY_DELAY; it never stops the
+scheduler or the other jobs due at the same time.
+
+`schedule()` only wakes the scheduler in the calling process. A standalone
+`run_scheduler` process never hears about work scheduled from the web
+workers, so it finds it by re-reading due times from the database every few
+seconds (see STANDALONE_RESYNC_INTERVAL) instead of every RESYNC_INTERVAL.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Re-read due times from the database this often, to pick up work scheduled
+# by other processes
+RESYNC_INTERVAL = 300  # seconds
+# A standalone scheduler gets no schedule() calls from the web workers, so it polls
+STANDALONE_RESYNC_INTERVAL = 10  # seconds
+# A failed job (or resync) is tried again after this long
+RETRY_DELAY = 60  # seconds
+
+
+class Scheduler:
+    def __init__(self, resync_interval=RESYNC_INTERVAL, retry_delay=RETRY_DELAY):
+        self.resync_interval = resync_interval
+        self.retry_delay = retry_delay
+        self._jobs = {}
+        self._heap = []  # (due_at, job_name)
+        self._retries = {}  # job_name -> when a failed job is tried again
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self._pid = None
+
+    def register(self, name, run, load_due_times):
+        """
+        run(now) does the work for everything due at or before now.
+        load_due_times() returns the datetimes at which the job is next due.
+        """
+        self._jobs[name] = (run, load_due_times)
+
+    def schedule(self, name, due_at):
+        """Wake the job `name` at due_at (called e.g. from a post_save signal)"""
+        if name not in self._jobs or due_at is None:
+            return
+        with self._cond:
+            heapq.heappush(self._heap, (due_at, name))
+            self._cond.notify()
+
+    def load(self):
+        """Rebuild the heap from the database, keeping failed jobs' retry times"""
+        retry_at = timezone.now() + timedelta(seconds=self.retry_delay)
+        with self._cond:
+            retries = dict(self._retries)
+        entries = []
+        for name, (run, load_due_times) in self._jobs.items():
+            try:
+                due_times = list(load_due_times())
+            except Exception:
+                logger.exception("Could not load due times for scheduler job %r", name)
+                due_times = [retry_at]
+            if name in retries:
+                # Don't run a failed job again before its retry time
+                due_times = [max(due_at, retries[name]) for due_at in due_times] + [retries[name]]
+            entries.extend((due_at, name) for due_at in due_times)
+        heapq.heapify(entries)
+        with self._cond:
+            self._heap = entries
+            self._cond.notify()
+
+    def run_pending(self):
+        """Run every job that has at least one due entry. A failing job is re-queued, not lost."""
+        now = timezone.now()
+        due = set()
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                due.add(heapq.heappop(self._heap)[1])
+        for name in due:
+            run, _ = self._jobs[name]
+            try:
+                run(now)
+            except Exception:
+                logger.exception("Scheduler job %r failed, retrying in %ss", name, self.retry_delay)
+                retry_at = timezone.now() + timedelta(seconds=self.retry_delay)
+                with self._cond:
+                    self._retries[name] = retry_at
+                self.schedule(name, retry_at)
+                close_old_connections()
+            else:
+                with self._cond:
+                    self._retries.pop(name, None)
+
+    def run_forever(self):
+        next_resync = 0
+        while not self._stopped:
+            if time.monotonic() >= next_resync:
+                try:
+                    self.load()
+                    next_resync = time.monotonic() + self.resync_interval
+                except Exception:
+                    logger.exception("Scheduler resync failed, retrying in %ss", self.retry_delay)
+                    next_resync = time.monotonic() + min(self.retry_delay, self.resync_interval)
+            self.run_pending()
+            close_old_connections()
+
+            with self._cond:
+                timeout = next_resync - time.monotonic()
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - timezone.now()).total_seconds())
+                if timeout > 0 and not self._stopped:
+                    self._cond.wait(timeout)
+
+    def start(self):
+        """Start the scheduler in a daemon thread (once per process)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._stopped = False
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self.run_forever, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+
+scheduler = Scheduler()
+
+
+def start_in_process_scheduler():
+    """
+    Called from the WSGI/ASGI entry points so every server worker fires due jobs.
+    Turn off with POSTING_SCHEDULER_IN_PROCESS = False when running
+    `manage.py run_scheduler` as a separate process instead.
+    """
+    if getattr(settings, "POSTING_SCHEDULER_IN_PROCESS", True):
+        scheduler.start()
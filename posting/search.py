@@ -0,0 +1,200 @@
+"""
+Full-text search index for the post feed.
+
+SQLite uses an FTS5 virtual table (posting_post_fts) keyed by post id.
+Postgres uses a tsvector column on posting_post with a GIN index.
+Rows are kept in sync by the Post signals in posting/signals.py, and can be
+rebuilt with `python manage.py rebuild_search_index`.
+"""
+import re
+
+from django.db import connection, DatabaseError
+
+FTS_TABLE = "posting_post_fts"
+PG_COLUMN = "search_vector"
+MAX_SEARCH_RESULTS = 1000
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# Cached result of is_enabled(); reset whenever the index is created or dropped
+_enabled = None
+
+# Text indexed for each post: event title, description, cuisine name, org username
+_SQLITE_SELECT = """
+    SELECT p.id, p.event, p.event_description, c.name, u.username
+    FROM posting_post p
+    JOIN posting_cuisine c ON c.id = p.cuisine_id
+    JOIN auth_user u ON u.id = p.author_id
+    WHERE p.is_deleted = 0 AND {where}
+"""
+
+_PG_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce(p.event, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(c.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(u.username, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(p.event_description, '')), 'C')
+"""
+
+
+def _vendor():
+    return connection.vendor
+
+
+def is_enabled():
+    """True if the database has a full-text index we know how to use"""
+    global _enabled
+    if _enabled is None:
+        _enabled = _index_exists()
+    return _enabled
+
+
+def _index_exists():
+    vendor = _vendor()
+    with connection.cursor() as cursor:
+        if vendor == "sqlite":
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+            )
+            return cursor.fetchone() is not None
+        if vendor == "postgresql":
+            cursor.execute(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'posting_post' AND column_name = %s",
+                [PG_COLUMN],
+            )
+            return cursor.fetchone() is not None
+    return False
+
+
+def create_index(schema_editor):
+    """Create the backend-specific search structures (called from a migration)"""
+    global _enabled
+    _enabled = None
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "event, event_description, cuisine, author, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except DatabaseError:
+            # SQLite built without FTS5 -> the feed falls back to icontains search
+            return
+    elif vendor == "postgresql":
+        schema_editor.execute(f"ALTER TABLE posting_post ADD COLUMN IF NOT EXISTS {PG_COLUMN} tsvector")
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS posting_post_search_vector_gin "
+            f"ON posting_post USING GIN ({PG_COLUMN})"
+        )
+
+
+def drop_index(schema_editor):
+    global _enabled
+    _enabled = None
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS posting_post_search_vector_gin")
+        schema_editor.execute(f"ALTER TABLE posting_post DROP COLUMN IF EXISTS {PG_COLUMN}")
+
+
+def _reindex_where(where, params):
+    """(Re)index every post matching the SQL condition on posting_post p"""
+    vendor = _vendor()
+    with connection.cursor() as cursor:
+        if vendor == "sqlite":
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT p.id FROM posting_post p WHERE {where})",
+                params,
+            )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, event, event_description, cuisine, author) "
+                + _SQLITE_SELECT.format(where=where),
+                params,
+            )
+        elif vendor == "postgresql":
+            cursor.execute(
+                f"UPDATE posting_post p SET {PG_COLUMN} = CASE WHEN p.is_deleted THEN NULL "
+                f"ELSE {_PG_DOCUMENT} END "
+                f"FROM posting_cuisine c, auth_user u "
+                f"WHERE c.id = p.cuisine_id AND u.id = p.author_id AND {where}",
+                params,
+            )
+
+
+def index_post(post_id):
+    """Add or refresh one post in the index (soft-deleted posts are removed)"""
+    if is_enabled():
+        _reindex_where("p.id = %s", [post_id])
+
+
+def index_cuisine(cuisine_id):
+    """Refresh all posts of a cuisine, e.g. after the cuisine was renamed"""
+    if is_enabled():
+        _reindex_where("p.cuisine_id = %s", [cuisine_id])
+
+
+def remove_post(post_id):
+    """Drop a hard-deleted post from the index"""
+    if _vendor() == "sqlite" and is_enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+    # On Postgres the tsvector lives on the post row and goes away with it
+
+
+def rebuild():
+    """Rebuild the whole index from posting_post"""
+    if not is_enabled():
+        return False
+    if _vendor() == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    _reindex_where("1 = 1", [])
+    return True
+
+
+def query_terms(query):
+    """The words of a search query; empty for e.g. punctuation-only input"""
+    return _TERM_RE.findall(query.lower())
+
+
+def search_post_ids(query, within=None, limit=MAX_SEARCH_RESULTS):
+    """
+    Return post ids matching the query, best match first.
+    Every word must match (as a prefix) somewhere in the post.
+    `within` (a Post queryset, e.g. the active feed) is applied inside the
+    ranked query, so the limit only counts posts the caller can show.
+    Returns None if no full-text index is available, so callers can fall back.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    if not is_enabled():
+        return None
+
+    vendor = _vendor()
+    id_column = "rowid" if vendor == "sqlite" else "posting_post.id"
+    within_sql, within_params = "", []
+    if within is not None:
+        subquery, within_params = within.order_by().values("id").query.sql_with_params()
+        within_sql = f"AND {id_column} IN ({subquery}) "
+
+    with connection.cursor() as cursor:
+        if vendor == "sqlite":
+            match = " ".join(f'"{term}"*' for term in terms)
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s {within_sql}"
+                f"ORDER BY bm25({FTS_TABLE}, 10.0, 2.0, 5.0, 5.0) LIMIT %s",
+                [match, *within_params, limit],
+            )
+        else:
+            tsquery = " & ".join(f"{term}:*" for term in terms)
+            cursor.execute(
+                f"SELECT posting_post.id FROM posting_post, to_tsquery('english', %s) query "
+                f"WHERE {PG_COLUMN} @@ query {within_sql}"
+                f"ORDER BY ts_rank({PG_COLUMN}, query) DESC LIMIT %s",
+                [tsquery, *within_params, limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
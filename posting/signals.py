@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from chat.models import Conversation, Message
+from Friendslist.models import FriendRequest
+from .models import Post, Cuisine, Notification, OrganizerThank, PostReadState, RSVP
+from .scheduler import scheduler
+from . import analytics, badges, qr, search
+
+
+@receiver(post_save, sender=Post)
+def sync_post_search_index(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the full-text index in sync with the post.
+    Soft-deleted posts (is_deleted=True) are dropped from the index.
+    """
+    # Saves that only touch the legacy QR image don't change searchable text
+    if update_fields is not None and set(update_fields) <= {"qr_code_image"}:
+        return
+    search.index_post(instance.id)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_search_index(sender, instance, **kwargs):
+    search.remove_post(instance.id)
+
+
+@receiver(post_save, sender=Cuisine)
+def sync_cuisine_search_index(sender, instance, created, **kwargs):
+    if not created:
+        search.index_cuisine(instance.id)
+
+
+@receiver(post_save, sender=Post)
+def schedule_post_publishing(sender, instance, **kwargs):
+    """Wake the scheduler exactly when a scheduled post is due"""
+    if instance.status == Post.Status.SCHEDULED and instance.publish_at:
+        publish_at = instance.publish_at
+        transaction.on_commit(lambda: scheduler.schedule("publish_posts", publish_at))
+
+
+@receiver(post_save, sender=Post)
+def queue_post_qr_code(sender, instance, created, **kwargs):
+    """Pre-render a new post's QR code in the background (see posting/qr.py)"""
+    if created:
+        qr.enqueue([instance.id])
+
+
+# Badge count cache invalidation (see posting/badges.py)
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_feed_badges(sender, **kwargs):
+    badges.invalidate_feed()
+
+
+@receiver(post_save, sender=PostReadState)
+def invalidate_read_state_badges(sender, instance, **kwargs):
+    badges.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_notification_badges(sender, instance, **kwargs):
+    badges.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=FriendRequest)
+@receiver(post_delete, sender=FriendRequest)
+def invalidate_friend_request_badges(sender, instance, **kwargs):
+    badges.invalidate_user(instance.to_user_id)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalidate_message_badges(sender, instance, **kwargs):
+    # Through the join table, so this still works while the conversation is being deleted
+    participant_ids = Conversation.participants.through.objects.filter(
+        conversation_id=instance.conversation_id
+    ).values_list("user_id", flat=True)
+    badges.invalidate_user(*participant_ids)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=RSVP)
+@receiver(post_delete, sender=RSVP)
+@receiver(post_save, sender=OrganizerThank)
+@receiver(post_delete, sender=OrganizerThank)
+def refresh_analytics_rollups(sender, **kwargs):
+    """Bring the daily rollups (posting/analytics.py) up to date shortly after activity"""
+    transaction.on_commit(analytics.refresh_later)
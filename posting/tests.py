@@ -1,3 +1,649 @@
-from django.test import TestCase
+import csv
+import json
+import math
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Friendslist.graph import FriendGraph, friend_graph
+from Friendslist.models import Friend, FriendRequest
+
+from . import analytics, badges, export, geo, qr, search
+from .models import (
+    RSVP,
+    Cuisine,
+    DailyCuisineStats,
+    Location,
+    Notification,
+    Post,
+    PostReadState,
+    QRCodeJob,
+    RollupWatermark,
+)
+from .pagination import decode_cursor, encode_cursor, paginate_by_created_at, paginate_by_distance
+from .scheduler import Scheduler
+from .views import apply_visibility_filter, user_can_view_post
+
+
+def make_post(author, cuisine, event="Leftover food", description="Come grab some", **fields):
+    return Post.objects.create(author=author, cuisine=cuisine, event=event, event_description=description, **fields)
+
+
+class PostVisibilityTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author")
+        self.reader = User.objects.create_user("reader")
+        cuisine = Cuisine.objects.create(name="Thai")
+        self.post = make_post(self.author, cuisine, visibility=Post.Visibility.FRIENDS_ONLY,
+                              status=Post.Status.PUBLISHED)
+        self.addCleanup(friend_graph.invalidate)
+
+    def visible(self):
+        return (
+            user_can_view_post(self.reader, self.post),
+            apply_visibility_filter(Post.objects.all(), self.reader).filter(id=self.post.id).exists(),
+        )
+
+    def test_friends_only_posts_need_a_friendship(self):
+        self.assertEqual(self.visible(), (False, False))
+        Friend.make_friends(self.author, self.reader)
+        self.assertEqual(self.visible(), (True, True))
+
+    def test_removed_friendship_revokes_access_in_every_worker(self):
+        Friend.make_friends(self.author, self.reader)
+        other_worker = FriendGraph()
+        self.assertTrue(other_worker.are_friends(self.reader, self.author))
+        self.assertEqual(self.visible(), (True, True))
+
+        Friend.break_friends(self.author, self.reader)
+        self.assertFalse(other_worker.are_friends(self.reader, self.author))
+        self.assertEqual(self.visible(), (False, False))
+
+    def test_repeat_checks_do_not_query_friendships(self):
+        Friend.make_friends(self.author, self.reader)
+        self.visible()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(user_can_view_post(self.reader, self.post))
+        self.assertFalse([q for q in queries if Friend._meta.db_table in q["sql"]])
+
+
+class AnalyticsRefreshTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author")
+        self.cuisine = Cuisine.objects.create(name="Thai")
+        self.today = timezone.localdate()
+
+    def post_on(self, day):
+        post = make_post(self.author, self.cuisine)
+        # Midday, or for today whenever it is now (never in the future)
+        created_at = min(analytics.day_start(day) + timedelta(hours=12), post.created_at)
+        Post.objects.filter(id=post.id).update(created_at=created_at)
+        return post
+
+    def posts_by_day(self):
+        return dict(DailyCuisineStats.objects.values_list("day", "posts"))
+
+    def test_first_refresh_counts_every_day(self):
+        earlier = self.today - timedelta(days=3)
+        self.post_on(earlier)
+        self.post_on(self.today)
+        post = make_post(self.author, self.cuisine)
+        RSVP.objects.create(post=post, user=self.author, estimated_arrival_minutes=10)
+
+        self.assertEqual(analytics.refresh(), earlier)
+        self.assertEqual(self.posts_by_day(), {earlier: 1, self.today: 2})
+        self.assertEqual(DailyCuisineStats.objects.get(day=self.today).rsvps, 1)
+
+    def test_due_only_after_new_activity(self):
+        self.post_on(self.today)
+        analytics.refresh()
+        self.assertEqual(len(analytics.next_run_times()), 1)  # just the nightly run
+
+        make_post(self.author, self.cuisine)
+        due = analytics.next_run_times()
+        self.assertEqual(due[1], analytics.processed_until() + analytics.REFRESH_DELAY)
+
+    def test_scheduled_run_without_new_activity_does_nothing(self):
+        self.post_on(self.today)
+        analytics.refresh()
+        until = analytics.processed_until()
+
+        analytics.run_scheduled(timezone.now())
+        self.assertEqual(analytics.processed_until(), until)
+
+        make_post(self.author, self.cuisine)
+        analytics.run_scheduled(timezone.now())
+        self.assertGreater(analytics.processed_until(), until)
+        self.assertEqual(self.posts_by_day(), {self.today: 2})
+
+    def test_scheduled_run_closes_the_previous_day(self):
+        yesterday = self.today - timedelta(days=1)
+        self.post_on(yesterday)
+        analytics.refresh(now=analytics.day_start(yesterday) + timedelta(hours=18))
+
+        analytics.run_scheduled(timezone.now())
+        self.assertEqual(timezone.localtime(analytics.processed_until()).date(), self.today)
+
+    def test_hard_delete_changes_only_days_still_being_recomputed(self):
+        earlier = self.today - timedelta(days=3)
+        old_post = self.post_on(earlier)
+        new_post = self.post_on(self.today)
+        self.post_on(self.today)
+        analytics.refresh()
+
+        old_post.delete()
+        new_post.delete()
+        analytics.refresh()
+        self.assertEqual(self.posts_by_day(), {earlier: 1, self.today: 1})
+
+    def test_rebuild_starts_over(self):
+        self.post_on(self.today - timedelta(days=3))
+        analytics.refresh()
+        RollupWatermark.objects.update(processed_until=timezone.now())
+        DailyCuisineStats.objects.all().delete()
+
+        analytics.rebuild()
+        self.assertEqual(sum(self.posts_by_day().values()), 1)
+
+
+class SchedulerTests(TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler(resync_interval=300, retry_delay=60)
+        self.runs = []
+
+    def register(self, name, due_times=(), fail=False):
+        def run(now):
+            self.runs.append(name)
+            if fail:
+                raise RuntimeError("job failed")
+        self.scheduler.register(name, run, lambda: list(due_times))
+
+    def test_runs_only_due_jobs(self):
+        now = timezone.now()
+        self.register("past")
+        self.register("future")
+        self.scheduler.schedule("past", now - timedelta(seconds=1))
+        self.scheduler.schedule("future", now + timedelta(hours=1))
+        self.scheduler.run_pending()
+        self.assertEqual(self.runs, ["past"])
+        self.assertEqual([name for _, name in self.scheduler._heap], ["future"])
+
+    def test_job_runs_once_for_several_due_entries(self):
+        now = timezone.now()
+        self.register("job")
+        for seconds in (3, 2, 1):
+            self.scheduler.schedule("job", now - timedelta(seconds=seconds))
+        self.scheduler.run_pending()
+        self.assertEqual(self.runs, ["job"])
+
+    def test_unknown_job_and_missing_time_are_ignored(self):
+        self.register("job")
+        self.scheduler.schedule("nope", timezone.now())
+        self.scheduler.schedule("job", None)
+        self.assertEqual(self.scheduler._heap, [])
+
+    def test_failing_job_does_not_stop_the_others(self):
+        now = timezone.now()
+        self.register("broken", fail=True)
+        self.register("healthy")
+        self.scheduler.schedule("broken", now)
+        self.scheduler.schedule("healthy", now)
+        with self.assertLogs("posting.scheduler", "ERROR"):
+            self.scheduler.run_pending()
+        self.assertCountEqual(self.runs, ["broken", "healthy"])
+        # The failed job is queued again for after the retry delay
+        (retry_at, name), = self.scheduler._heap
+        self.assertEqual(name, "broken")
+        self.assertGreaterEqual(retry_at, now + timedelta(seconds=60))
+
+    def test_retry_survives_resync_and_is_not_run_early(self):
+        now = timezone.now()
+        self.register("broken", due_times=[now], fail=True)
+        self.scheduler.load()
+        with self.assertLogs("posting.scheduler", "ERROR"):
+            self.scheduler.run_pending()
+        self.scheduler.load()  # the loader still says "due now"
+        self.scheduler.run_pending()
+        self.assertEqual(self.runs, ["broken"])
+        self.assertTrue(all(due_at >= now + timedelta(seconds=60) for due_at, _ in self.scheduler._heap))
+
+    def test_retry_is_cleared_after_success(self):
+        now = timezone.now()
+        outcomes = [True, False]
+
+        def run(now):
+            if outcomes.pop(0):
+                raise RuntimeError("first attempt fails")
+
+        self.scheduler.register("flaky", run, lambda: [])
+        self.scheduler.schedule("flaky", now)
+        with self.assertLogs("posting.scheduler", "ERROR"):
+            self.scheduler.run_pending()
+        self.scheduler._heap = [(now, "flaky")]  # retry comes due
+        self.scheduler.run_pending()
+        self.assertEqual(self.scheduler._retries, {})
+
+    def test_failing_loader_retries_instead_of_blocking_other_jobs(self):
+        now = timezone.now()
+
+        def broken_loader():
+            raise RuntimeError("loader failed")
+
+        self.scheduler.register("broken", lambda now: None, broken_loader)
+        self.register("healthy", due_times=[now])
+        with self.assertLogs("posting.scheduler", "ERROR"):
+            self.scheduler.load()
+        entries = dict((name, due_at) for due_at, name in self.scheduler._heap)
+        self.assertEqual(entries["healthy"], now)
+        self.assertGreater(entries["broken"], now)
+
+    def test_run_forever_survives_a_failing_job(self):
+        now = timezone.now()
+        self.register("broken", due_times=[now], fail=True)
+        self.scheduler.register("stop", lambda now: self.scheduler.stop(), lambda: [now])
+        with self.assertLogs("posting.scheduler", "ERROR"):
+            self.scheduler.run_forever()  # returns once "stop" has run
+        self.assertEqual(self.runs, ["broken"])
+        self.assertIn("broken", self.scheduler._retries)
+
+
+class PostSearchTests(TestCase):
+    def setUp(self):
+        if not search.is_enabled():
+            self.skipTest("No full-text index on this database")
+        self.org = User.objects.create_user("dining_hall")
+        self.cuisine = Cuisine.objects.create(name="italian")
+
+    def test_query_terms(self):
+        self.assertEqual(search.query_terms("Free PIZZA!"), ["free", "pizza"])
+        self.assertEqual(search.query_terms("?!  --"), [])
+
+    def test_every_term_must_match_as_a_prefix(self):
+        both = make_post(self.org, self.cuisine, event="Pizza night", description="Vegan options")
+        make_post(self.org, self.cuisine, event="Pizza lunch", description="Cheese only")
+        self.assertEqual(search.search_post_ids("piz veg"), [both.id])
+
+    def test_matches_cuisine_and_author(self):
+        post = make_post(self.org, self.cuisine)
+        self.assertEqual(search.search_post_ids("italian"), [post.id])
+        self.assertEqual(search.search_post_ids("dining_hall"), [post.id])
+
+    def test_soft_deleted_posts_are_dropped(self):
+        post = make_post(self.org, self.cuisine, event="Bagels")
+        post.is_deleted = True
+        post.save()
+        self.assertEqual(search.search_post_ids("bagels"), [])
+
+    def test_limit_applies_within_the_feed(self):
+        # The old post ranks higher, but is no longer in the feed
+        old = make_post(self.org, self.cuisine, event="Pizza pizza pizza", description="Pizza")
+        Post.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=30))
+        live = make_post(self.org, self.cuisine, event="Leftovers", description="Some pizza")
+        self.assertEqual(search.search_post_ids("pizza", limit=1), [old.id])
+        self.assertEqual(search.search_post_ids("pizza", within=Post.objects.active_feed(), limit=1), [live.id])
+
+    def test_feed_search(self):
+        pizza = make_post(self.org, self.cuisine, event="Pizza")
+        sushi = make_post(self.org, self.cuisine, event="Sushi")
+        response = self.client.get(reverse("posting:post_list"), {"q": "pizza"})
+        self.assertEqual([post.id for post in response.context["posts"]], [pizza.id])
+        # Nothing searchable in the query: the whole feed, not an empty one
+        response = self.client.get(reverse("posting:post_list"), {"q": "?!"})
+        self.assertCountEqual([post.id for post in response.context["posts"]], [pizza.id, sushi.id])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        org = User.objects.create_user("org")
+        cuisine = Cuisine.objects.create(name="thai")
+        base = timezone.now() - timedelta(hours=1)
+        self.posts = [make_post(org, cuisine, event=f"Post {i}") for i in range(7)]
+        # Three posts share a timestamp, so the id has to break the tie
+        for i, post in enumerate(self.posts):
+            Post.objects.filter(id=post.id).update(created_at=base + timedelta(minutes=min(i, 3)))
+        self.newest_first = sorted(
+            Post.objects.all(), key=lambda post: (post.created_at, post.id), reverse=True
+        )
+
+    def page(self, newest_first=True, **params):
+        request = self.factory.get("/", params)
+        return paginate_by_created_at(Post.objects.all(), request, 3, newest_first=newest_first)
+
+    def walk(self, newest_first=True):
+        pages = [self.page(newest_first)]
+        while pages[-1].has_next():
+            pages.append(self.page(newest_first, after=pages[-1].next_cursor))
+        return pages
+
+    def test_forward_walk_visits_every_post_once_in_order(self):
+        for newest_first in (True, False):
+            pages = self.walk(newest_first)
+            seen = [post.id for page in pages for post in page]
+            expected = [post.id for post in self.newest_first]
+            self.assertEqual(seen, expected if newest_first else expected[::-1])
+            self.assertEqual([len(page) for page in pages], [3, 3, 1])
+            self.assertFalse(pages[0].has_previous())
+
+    def test_backward_walk_returns_the_same_pages(self):
+        pages = self.walk()
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = self.page(before=page.previous_cursor)
+            self.assertEqual([post.id for post in page], [post.id for post in expected])
+        self.assertFalse(page.has_previous())
+
+    def test_malformed_cursor_starts_from_the_first_page(self):
+        first = self.page()
+        for cursor in ("garbage", encode_cursor("not-a-date", 1), encode_cursor("2024-01-01T00:00:00")):
+            self.assertEqual([post.id for post in self.page(after=cursor)], [post.id for post in first])
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(1.5, 7), float, int), (1.5, 7))
+        self.assertIsNone(decode_cursor("", int))
+
+    def test_distance_pages_break_ties_by_id(self):
+        class Near:
+            def __init__(self, id, distance_km):
+                self.id, self.distance_km = id, distance_km
+
+        posts = sorted(
+            [Near(1, 0.5), Near(2, 0.5), Near(3, 0.5), Near(4, 1.0), Near(5, 2.0)],
+            key=lambda post: (post.distance_km, -post.id),
+        )
+        first = paginate_by_distance(posts, self.factory.get("/"), 2)
+        second = paginate_by_distance(posts, self.factory.get("/", {"after": first.next_cursor}), 2)
+        third = paginate_by_distance(posts, self.factory.get("/", {"after": second.next_cursor}), 2)
+        self.assertEqual([post.id for page in (first, second, third) for post in page], [3, 2, 1, 4, 5])
+        self.assertFalse(third.has_next())
+        back = paginate_by_distance(posts, self.factory.get("/", {"before": third.previous_cursor}), 2)
+        self.assertEqual([post.id for post in back], [post.id for post in second])
+
+
+class PostReadStateTests(TestCase):
+    def setUp(self):
+        org = User.objects.create_user("org")
+        cuisine = Cuisine.objects.create(name="mexican")
+        self.reader = User.objects.create_user("reader")
+        self.posts = [make_post(org, cuisine, event=f"Tacos {i}") for i in range(3)]
+
+    def test_reads_are_kept_and_counted_once(self):
+        self.assertEqual(PostReadState.unread_count(self.reader), 3)
+        PostReadState.mark_read(self.reader, self.posts[1])
+        PostReadState.mark_read(self.reader, self.posts[1])
+        self.assertEqual(PostReadState.unread_count(self.reader), 2)
+        for post in self.posts:
+            PostReadState.mark_read(self.reader, post)
+        self.assertEqual(PostReadState.unread_count(self.reader), 0)
+
+    def test_bumped_post_is_unread_again(self):
+        PostReadState.mark_read(self.reader, self.posts[0])
+        Post.objects.filter(id=self.posts[0].id).update(bumped_at=timezone.now() + timedelta(seconds=1))
+        self.assertIn(self.posts[0].id, PostReadState.unread_posts(self.reader).values_list("id", flat=True))
+
+
+class PostQRTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_dir = directory.name
+        patcher = mock.patch.object(qr, "image_cache", qr.QRImageCache(directory=self.cache_dir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        org = User.objects.create_user("org")
+        self.post = make_post(org, Cuisine.objects.create(name="indian"))
+        self.url = reverse("posting:post_qr", args=[self.post.id, "png"])
+        self.etag = qr.post_qr_etag(self.post.id, "png")
+
+    def test_renders_on_demand(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertTrue(response.content.startswith(b"\x89PNG"))
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertIn("immutable", response["Cache-Control"])
+        svg = self.client.get(reverse("posting:post_qr", args=[self.post.id, "svg"]))
+        self.assertEqual(svg["Content-Type"], "image/svg+xml")
+
+    def test_if_none_match(self):
+        for header in (self.etag, f'"other", {self.etag}', f"W/{self.etag}", "*"):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(response.status_code, 304, header)
+            self.assertEqual(response["ETag"], self.etag)
+        for header in ('"other"', f'"{self.etag.strip(chr(34))}-stale"', self.etag[:-2] + '"'):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=header).status_code, 200, header)
+
+    def test_unknown_format_and_hidden_posts(self):
+        self.assertEqual(self.client.get(reverse("posting:post_qr", args=[self.post.id, "gif"])).status_code, 404)
+        Post.objects.filter(id=self.post.id).update(visibility=Post.Visibility.FRIENDS_ONLY)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_new_posts_are_queued_and_prerendered(self):
+        self.assertTrue(QRCodeJob.objects.filter(post=self.post).exists())
+        self.assertEqual(qr.process_jobs(), 1)
+        self.assertFalse(QRCodeJob.objects.exists())
+
+        # Another worker on the host reads the images from disk instead of rendering them
+        other_worker = qr.QRImageCache(directory=self.cache_dir)
+        with mock.patch.object(qr, "image_cache", other_worker), mock.patch.object(qr, "render_qr") as render:
+            digest, content = qr.get_post_qr(self.post.id, "png")
+        render.assert_not_called()
+        self.assertEqual(f'"{digest}"', self.etag)
+        self.assertTrue(content.startswith(b"\x89PNG"))
+
+    def test_failing_job_is_recorded_and_does_not_stop_the_batch(self):
+        other = make_post(self.post.author, self.post.cuisine)
+        real_render = qr.render_qr
+
+        def render(data, fmt="png"):
+            if data == qr.post_qr_target(self.post.id):
+                raise ValueError("bad payload")
+            return real_render(data, fmt)
+
+        with mock.patch.object(qr, "render_qr", side_effect=render):
+            self.assertEqual(qr.process_jobs(), 1)
+        job = QRCodeJob.objects.get()
+        self.assertEqual((job.post_id, job.attempts, job.last_error), (self.post.id, 1, "bad payload"))
+        self.assertFalse(QRCodeJob.objects.filter(post=other).exists())
+
+    def test_regenerate_queues_live_posts(self):
+        make_post(self.post.author, self.post.cuisine, is_deleted=True)
+        QRCodeJob.objects.all().delete()
+        call_command("regenerate_qr_codes", stdout=StringIO())
+        self.assertEqual(list(QRCodeJob.objects.values_list("post_id", flat=True)), [self.post.id])
+
+        call_command("process_qr_jobs", stdout=StringIO())
+        self.assertFalse(QRCodeJob.objects.exists())
+
+
+class GeoTests(TestCase):
+    LAT, LNG = 40.0, -74.0
+    KM_PER_DEGREE = 2 * math.pi * geo.EARTH_RADIUS_KM / 360  # along a meridian
+
+    def setUp(self):
+        self.org = User.objects.create_user("org")
+        self.cuisine = Cuisine.objects.create(name="Thai")
+
+    def post_north(self, km):
+        """A post `km` due north of (LAT, LNG)"""
+        location = Location.objects.create(latitude=self.LAT + km / self.KM_PER_DEGREE, longitude=self.LNG,
+                                           building_name=f"{km} km")
+        return make_post(self.org, self.cuisine, location=location)
+
+    def near_me(self, **params):
+        response = self.client.get(reverse("posting:post_list"),
+                                   {"sort": "distance", "lat": self.LAT, "lng": self.LNG, **params})
+        self.assertTrue(response.context["near_me"])
+        return response.context["radius_km"], [post.id for post in response.context["posts"]]
+
+    def test_parse_radius_km(self):
+        self.assertEqual(geo.parse_radius_km("2.5"), 2.5)
+        for bad in (None, "", "abc", "nan", "inf", "0", "-3"):
+            self.assertEqual(geo.parse_radius_km(bad), geo.DEFAULT_RADIUS_KM, bad)
+        self.assertEqual(geo.parse_radius_km("500"), geo.MAX_RADIUS_KM)
+
+    def test_covering_cells_cover_the_box(self):
+        for radius in (0.05, 1, geo.DEFAULT_RADIUS_KM, geo.MAX_RADIUS_KM):
+            min_lat, max_lat, min_lng, max_lng = geo.bounding_box(self.LAT, self.LNG, radius)
+            cells = geo.covering_cells(min_lat, max_lat, min_lng, max_lng)
+            self.assertLessEqual(len(cells), geo.MAX_COVER_CELLS)
+            for i in range(11):
+                for j in range(11):
+                    lat = min_lat + (max_lat - min_lat) * i / 10
+                    lng = min_lng + (max_lng - min_lng) * j / 10
+                    geohash = geo.encode_geohash(lat, lng)
+                    self.assertTrue(any(geohash.startswith(cell) for cell in cells), (radius, lat, lng))
+
+    def test_geohash_cells_q(self):
+        inside = Location.objects.create(latitude=self.LAT, longitude=self.LNG, building_name="inside")
+        Location.objects.create(latitude=-self.LAT, longitude=-self.LNG, building_name="far away")
+        cells = geo.covering_cells(*geo.bounding_box(self.LAT, self.LNG, 1))
+        matched = Location.objects.filter(geo.geohash_cells_q(cells))
+        self.assertEqual(list(matched), [inside])
+
+    def test_posts_just_inside_the_radius(self):
+        inside = self.post_north(geo.DEFAULT_RADIUS_KM - 0.05)
+        closest = self.post_north(0.5)
+        self.post_north(geo.DEFAULT_RADIUS_KM + 0.05)
+        self.assertEqual(self.near_me(), (geo.DEFAULT_RADIUS_KM, [closest.id, inside.id]))
+
+    def test_bad_radius_falls_back_to_the_default(self):
+        inside = self.post_north(geo.DEFAULT_RADIUS_KM - 0.05)
+        self.post_north(geo.DEFAULT_RADIUS_KM + 0.05)
+        self.assertEqual(self.near_me(radius_km="abc"), (geo.DEFAULT_RADIUS_KM, [inside.id]))
+
+    def test_radius_is_capped(self):
+        inside = self.post_north(geo.MAX_RADIUS_KM - 0.5)
+        self.post_north(geo.MAX_RADIUS_KM + 0.5)
+        self.assertEqual(self.near_me(radius_km="500"), (geo.MAX_RADIUS_KM, [inside.id]))
+
+
+class ActiveFeedTests(TestCase):
+    def setUp(self):
+        self.org = User.objects.create_user("org")
+        self.cuisine = Cuisine.objects.create(name="Thai")
+
+    def post_aged(self, hours, **fields):
+        post = make_post(self.org, self.cuisine, **fields)
+        Post.objects.filter(id=post.id).update(created_at=timezone.now() - timedelta(hours=hours))
+        return post
+
+    def feed(self, now=None):
+        return set(Post.objects.active_feed(now).values_list("id", flat=True))
+
+    def test_window_slides_with_now(self):
+        fresh = self.post_aged(47)
+        self.post_aged(49)
+        self.assertEqual(self.feed(), {fresh.id})
+        # The same query an hour and a half later: no stale cutoff from when the worker started
+        self.assertEqual(self.feed(timezone.now() + timedelta(hours=1.5)), set())
+
+    @override_settings(POSTING_FEED_WINDOW_HOURS=2)
+    def test_window_is_configurable(self):
+        fresh = self.post_aged(1)
+        self.post_aged(3)
+        self.assertEqual(self.feed(), {fresh.id})
+
+    def test_excludes_drafts_deleted_and_past_pickup(self):
+        live = self.post_aged(1, pickup_deadline=timezone.now() + timedelta(hours=1))
+        self.post_aged(1, pickup_deadline=timezone.now() - timedelta(minutes=1))
+        self.post_aged(1, is_deleted=True)
+        self.post_aged(1, status=Post.Status.DRAFT)
+        self.assertEqual(self.feed(), {live.id})
+
+    def test_partial_index_matches_the_feed_filter(self):
+        index = next(index for index in Post._meta.indexes if index.name == "post_active_feed_idx")
+        self.assertEqual(index.fields, ["created_at", "pickup_deadline"])
+        self.assertEqual(dict(index.condition.children), {"status": "published", "is_deleted": False})
+
+
+class BadgeCountsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader")
+        self.friend = User.objects.create_user("friend")
+        self.client.force_login(self.user)
+        self.url = reverse("posting:badge_counts")
+
+    def test_counts_in_one_statement_then_from_the_cache(self):
+        FriendRequest.objects.create(from_user=self.friend, to_user=self.user)
+        Notification.objects.create(user=self.user, message="New RSVP")
+        with self.assertNumQueries(2):  # the user's read state, then every counter at once
+            counts = badges.compute(self.user)
+        self.assertEqual(counts["pending_friend_requests"], 1)
+        self.assertEqual(counts["unread_notifications"], 1)
+
+        badges.get_counts(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(badges.get_counts(self.user), counts)
+        self.assertFalse([q for q in queries if "friendrequest" in q["sql"].lower()])
+
+    def test_json_endpoint_sees_invalidated_counts(self):
+        self.assertEqual(self.client.get(self.url).json()["unread_notifications"], 0)
+        Notification.objects.create(user=self.user, message="New RSVP")
+        FriendRequest.objects.create(from_user=self.friend, to_user=self.user)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        self.assertEqual(response.json()["unread_notifications"], 1)
+        self.assertEqual(response.json()["pending_friend_requests"], 1)
+
+    def test_new_posts_bump_every_users_unread_count(self):
+        before = badges.get_counts(self.user)["unread_posts"]
+        make_post(self.friend, Cuisine.objects.create(name="Thai"))
+        self.assertEqual(badges.get_counts(self.user)["unread_posts"], before + 1)
+
+
+class ExportDataTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin")
+        self.org = User.objects.create_user("org")
+        self.student = User.objects.create_user("student")
+        cuisine = Cuisine.objects.create(name="Thai")
+        self.post = make_post(self.org, cuisine)
+        self.old_post = make_post(self.org, cuisine)
+        Post.objects.filter(id=self.old_post.id).update(created_at=timezone.now() - timedelta(days=30))
+        RSVP.objects.create(post=self.post, user=self.student, estimated_arrival_minutes=10)
+        self.client.force_login(self.admin)
+
+    def export(self, **params):
+        return self.client.get(reverse("posting:export_data"), params)
+
+    def test_streams_posts_as_csv_anonymized_by_default(self):
+        response = self.export(dataset="posts")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(line.decode() for line in response.streaming_content))
+        self.assertEqual([int(row["id"]) for row in rows], [self.post.id, self.old_post.id])
+        self.assertEqual({row["author"] for row in rows}, {export.pseudonym(self.org.id)})
+        self.assertEqual(rows[0]["rsvp_count"], "1")
+
+    def test_jsonl_date_range_and_usernames(self):
+        today = timezone.localdate().isoformat()
+        response = self.export(dataset="rsvps", format="jsonl", start=today, end=today, anonymize="0")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([(row["post_id"], row["user"]) for row in rows], [(self.post.id, "student")])
+
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        response = self.export(dataset="posts", format="jsonl", end=yesterday)
+        self.assertEqual([json.loads(line)["id"] for line in b"".join(response.streaming_content).splitlines()],
+                         [self.old_post.id])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.export(dataset="nope").status_code, 400)
+        self.assertEqual(self.export(format="xml").status_code, 400)
+        self.assertEqual(self.export(start="yesterday").status_code, 400)
+        self.assertEqual(self.export(start="2026-02-01", end="2026-01-01").status_code, 400)
+
+    def test_staff_only(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.export().status_code, 302)
@@ -1,32 +1,31 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Cuisine, Post, Location, OrganizerThank, RSVP, Notification
+from .models import Cuisine, Post, Location, OrganizerThank, RSVP, Notification, PostReadState
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
 from django.contrib.contenttypes.models import ContentType
 from .forms import PostForm, RSVPForm
 from django.contrib import messages
-from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.db import IntegrityError
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.utils import timezone
-import csv
-from django.db.models import Count
+from django.db.models import Case, When, IntegerField
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Q
 import json
 from django.urls import reverse
-import math
-from django.db.models import Q, F, FloatField, ExpressionWrapper
-from django.db.models.functions import Power
+from . import analytics, badges, export, qr, search
+from .pagination import page_querystring, paginate_by_created_at, paginate_by_distance
+from .geo import bounding_box, covering_cells, geohash_cells_q, haversine_distance_km, parse_radius_km
 from datetime import timedelta
+from django.utils.dateparse import parse_date
 from django.http import Http404
-from Friendslist.models import Friend
+from Friendslist.graph import friend_graph
+from moderation import activity_log, archive
 from moderation.models import ModeratorActivityLog
 from profiles.models import Profile
 
-two_days_ago = timezone.now() - timedelta(days=2)
-
 def apply_visibility_filter(qs, user):
     if not user.is_authenticated:
         return qs.filter(visibility=Post.Visibility.PUBLIC)
@@ -35,13 +34,13 @@ def apply_visibility_filter(qs, user):
     if user.is_staff or user.is_superuser:
         return qs
 
-    # Authenticated normal user → use Friend model
-    friends = Friend.get_friends(user)
+    # Authenticated normal user → friends from the cached friend graph
+    friend_ids = friend_graph.friend_ids(user)
 
     return qs.filter(
         Q(visibility=Post.Visibility.PUBLIC)
         | Q(author=user)
-        | Q(visibility=Post.Visibility.FRIENDS_ONLY, author__in=friends)
+        | Q(visibility=Post.Visibility.FRIENDS_ONLY, author__in=friend_ids)
     )
 
 
@@ -73,47 +72,23 @@ def user_can_view_post(user, post):
         return True
 
     # Check friendship
-    friends = Friend.get_friends(user)
-    return friends.filter(id=post.author_id).exists()
+    return friend_graph.are_friends(user, post.author_id)
 
 def index(request):
-    # Lazy publish: Check for scheduled posts that are due and publish them
-    # This ensures posts appear on time even if Heroku Scheduler runs only every 10 min
-    Post.objects.filter(
-        status=Post.Status.SCHEDULED,
-        publish_at__lte=timezone.now()
-    ).update(status=Post.Status.PUBLISHED)
-
     # search text
     q = request.GET.get("q", "").strip()
 
     # filters
     cuisine_id = request.GET.get("cuisine", "").strip()
     selected_org = request.GET.get("org", "").strip()
-    date_order = request.GET.get("date_order", "newest").strip()  # 'newest' or 'oldest'
+    # 'newest', 'oldest' or 'relevance' (best search match first, default when searching)
+    date_order = request.GET.get("date_order", "").strip() or ("relevance" if q else "newest")
     sort = request.GET.get("sort", "").strip()                    # '' or 'distance'
     lat_param = request.GET.get("lat")
     lng_param = request.GET.get("lng")
 
     # Start with published posts that are not deleted and not expired 
-    qs = (
-    Post.objects.filter(
-        status=Post.Status.PUBLISHED,
-        is_deleted=False,
-        created_at__gte=two_days_ago
-    ).filter(
-    Q(pickup_deadline__isnull=True) | Q(pickup_deadline__gt=timezone.now())
-    ).select_related("cuisine", "author")
-    )
-
-    # Search across event, description, cuisine name, and org username
-    if q:
-        qs = qs.filter(
-            Q(event__icontains=q) |
-            Q(event_description__icontains=q) |
-            Q(cuisine__name__icontains=q) |
-            Q(author__username__icontains=q)
-        )
+    qs = Post.objects.active_feed().select_related("cuisine", "author")
 
     # Cuisine filter
     if cuisine_id:
@@ -123,36 +98,82 @@ def index(request):
     if selected_org:
         qs = qs.filter(author__username=selected_org)
 
-    #distance ordering 
-    # distance ordering 
+    # distance ordering: only posts inside radius_km, ranked by great-circle distance
+    radius_km = parse_radius_km(request.GET.get("radius_km"))
+    user_lat = user_lng = None
     if sort == "distance" and lat_param and lng_param:
         try:
             user_lat = float(lat_param)
             user_lng = float(lng_param)
-
-            qs = qs.annotate(
-                distance=ExpressionWrapper(
-                    Power(F("location__latitude") - user_lat, 2) +
-                    Power(F("location__longitude") - user_lng, 2),
-                    output_field=FloatField(),
-                )
-            ).order_by("distance")
+            if not (-90 <= user_lat <= 90 and -180 <= user_lng <= 180):
+                raise ValueError
         except ValueError:
             # If lat/lng are invalid, fall back to date ordering below
             sort = ""   # force it to behave like "no distance sort"
+        else:
+            # Prefilter with the geohash index + bounding box so we only load nearby rows
+            min_lat, max_lat, min_lng, max_lng = bounding_box(user_lat, user_lng, radius_km)
+            qs = qs.filter(
+                geohash_cells_q(
+                    covering_cells(min_lat, max_lat, min_lng, max_lng),
+                    field="location__geohash",
+                ),
+                location__latitude__range=(min_lat, max_lat),
+                location__longitude__range=(min_lng, max_lng),
+            ).select_related("location")
+
+    qs = apply_visibility_filter(qs, request.user)
+
+    # Search across event, description, cuisine name, and org username.
+    # A query with no words in it (e.g. only punctuation) shows the whole feed.
+    ranked_ids = None
+    if q and search.query_terms(q):
+        # Ranked inside the filtered feed, so the result cap never drops live posts
+        ranked_ids = search.search_post_ids(q, within=qs)
+        if ranked_ids is None:
+            # No full-text index on this database, fall back to a plain scan
+            qs = qs.filter(
+                Q(event__icontains=q) |
+                Q(event_description__icontains=q) |
+                Q(cuisine__name__icontains=q) |
+                Q(author__username__icontains=q)
+            )
+        else:
+            qs = qs.filter(id__in=ranked_ids)
 
 # Date ordering (only if NOT distance)
     if sort != "distance":
         if date_order == "oldest":
             qs = qs.order_by("created_at")
+        elif date_order == "relevance" and ranked_ids:
+            qs = qs.order_by(Case(
+                *[When(id=post_id, then=rank) for rank, post_id in enumerate(ranked_ids)],
+                output_field=IntegerField(),
+            ))
         else:
             qs = qs.order_by("-created_at")        
 
-    qs = apply_visibility_filter(qs, request.user)
-
-    paginator = Paginator(qs, 5)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    near_me = sort == "distance" and user_lat is not None
+    results = qs
+    if near_me:
+        # Exact haversine ranking over the (small) set of nearby candidates
+        results = []
+        for post in qs:
+            post.distance_km = haversine_distance_km(
+                user_lat, user_lng, post.location.latitude, post.location.longitude
+            )
+            if post.distance_km <= radius_km:
+                results.append(post)
+        results.sort(key=lambda post: (post.distance_km, -post.id))
+
+    # Keyset pagination: page N costs the same as page 1
+    if near_me:
+        page_obj = paginate_by_distance(results, request, 5)
+    elif date_order == "relevance" and ranked_ids:
+        # Ranked search results are already capped, so page numbers are fine here
+        page_obj = Paginator(qs, 5).get_page(request.GET.get("page"))
+    else:
+        page_obj = paginate_by_created_at(qs, request, 5, newest_first=date_order != "oldest")
 
     
 
@@ -171,7 +192,7 @@ def index(request):
     return render(request, "posting/posts.html", {
         "posts": page_obj,
         "page_obj": page_obj,
-        "total_posts": qs.count(),
+        "page_query": page_querystring(request),
         "search_query": q,
         "cuisines": cuisines,
         "selected_cuisine_id": cuisine_id,
@@ -179,29 +200,23 @@ def index(request):
         "selected_org": selected_org,
         "selected_date_order": date_order,
         "sort": sort,  
+        "radius_km": radius_km,
+        "near_me": near_me,
     })
 
 def event_history(request): 
-    # Lazy publish: Check for scheduled posts that are due
-    Post.objects.filter(
-        status=Post.Status.SCHEDULED,
-        publish_at__lte=timezone.now()
-    ).update(status=Post.Status.PUBLISHED)
-
     # Start with all posts, newest first, excluding soft-deleted
     qs = Post.objects.filter(is_deleted=False).order_by("-created_at")
 
     # Apply the same visibility rules we use elsewhere
     qs = apply_visibility_filter(qs, request.user)
 
-    paginator = Paginator(qs, 10)   # 10 per page, same as before
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate_by_created_at(qs, request, 10)   # 10 per page, same as before
 
     return render(request, "posting/event_history.html", {
         "posts": page_obj,
         "page_obj": page_obj,
-        "total_posts": qs.count(),
+        "page_query": page_querystring(request),
     })
 
 @login_required
@@ -227,19 +242,15 @@ def create_post(request):
             
             post.save()
             
-            # Log activity for organization (gracefully handle missing table)
-            try:
-                if hasattr(request.user, 'profile') and request.user.profile.role == Profile.Role.ORG:
-                    ModeratorActivityLog.objects.create(
-                        organization=request.user,
-                        action_type=ModeratorActivityLog.ActionType.POST_CREATED,
-                        performed_by=request.user,
-                        content_type=ContentType.objects.get_for_model(Post),
-                        object_id=post.id,
-                        description=f"Post created: {post.event[:100]}"
-                    )
-            except Exception:
-                pass  # Logging is optional, don't break post creation
+            # Log activity for organization (buffered, written off the request path)
+            if hasattr(request.user, 'profile') and request.user.profile.role == Profile.Role.ORG:
+                activity_log.record(
+                    organization=request.user,
+                    action_type=ModeratorActivityLog.ActionType.POST_CREATED,
+                    performed_by=request.user,
+                    description=f"Post created: {post.event[:100]}",
+                    related_content=post,
+                )
             
             return redirect("posting:post_list")
         else:
@@ -282,9 +293,9 @@ def post_detail(request, post_id):
         # Hide existence from unauthorized users
         raise Http404("Post not found")
     
-    # Track read users
+    # Track read posts
     if request.user.is_authenticated:
-        post.read_users.add(request.user)
+        PostReadState.mark_read(request.user, post)
     
     # Get RSVP information
     user_rsvp = None
@@ -301,8 +312,12 @@ def post_detail(request, post_id):
     
     # Get content type for Post model (for flagging)
     post_content_type = ContentType.objects.get_for_model(Post)
+    # Content-addressed QR url: changes only if what the QR encodes changes
+    qr_version = qr.qr_digest(qr.post_qr_target(post.id), "png")[:16]
+    qr_code_url = reverse("posting:post_qr", args=[post.id, "png"]) + f"?v={qr_version}"
     return render(request, "posting/post_detail.html", {
         "post": post,
+        "qr_code_url": qr_code_url,
         "post_content_type_id": post_content_type.id,
         "user_rsvp": user_rsvp,
         "active_rsvps": active_rsvps,
@@ -334,22 +349,19 @@ def edit_post(request, post_id):
                 if post.image:
                     post.image.delete(save=False)
                     post.image = None
+            # An edited post shows up as unread again for everyone
+            post.bumped_at = timezone.now()
             form.save()
-            post.read_users.clear()
             
-            # Log activity for organization (gracefully handle missing table)
-            try:
-                if hasattr(request.user, 'profile') and request.user.profile.role == Profile.Role.ORG:
-                    ModeratorActivityLog.objects.create(
-                        organization=request.user,
-                        action_type=ModeratorActivityLog.ActionType.POST_EDITED,
-                        performed_by=request.user,
-                        content_type=ContentType.objects.get_for_model(Post),
-                        object_id=post.id,
-                        description=f"Post edited: {post.event[:100]}"
-                    )
-            except Exception:
-                pass  # Logging is optional, don't break post editing
+            # Log activity for organization (buffered, written off the request path)
+            if hasattr(request.user, 'profile') and request.user.profile.role == Profile.Role.ORG:
+                activity_log.record(
+                    organization=request.user,
+                    action_type=ModeratorActivityLog.ActionType.POST_EDITED,
+                    performed_by=request.user,
+                    description=f"Post edited: {post.event[:100]}",
+                    related_content=post,
+                )
             
             return redirect('posting:post_detail', post_id=post.id)
     else:
@@ -373,49 +385,61 @@ def delete_post(request, post_id):
         # SOFT DELETE — marking it deleted instead of removing from DB
         post.is_deleted = True
         post.save()
-        # Clear read users when post is deleted
-        post.read_users.clear()
         
-        # Log activity for organization (gracefully handle missing table)
-        try:
-            if hasattr(request.user, 'profile') and request.user.profile.role == Profile.Role.ORG:
-                ModeratorActivityLog.objects.create(
-                    organization=request.user,
-                    action_type=ModeratorActivityLog.ActionType.POST_DELETED,
-                    performed_by=request.user,
-                    content_type=ContentType.objects.get_for_model(Post),
-                    object_id=post.id,
-                    description=f"Post deleted: {post.event[:100]}"
-                )
-        except Exception:
-            pass  # Logging is optional, don't break post deletion
+        # Log activity for organization (buffered, written off the request path)
+        if hasattr(request.user, 'profile') and request.user.profile.role == Profile.Role.ORG:
+            activity_log.record(
+                organization=request.user,
+                action_type=ModeratorActivityLog.ActionType.POST_DELETED,
+                performed_by=request.user,
+                description=f"Post deleted: {post.event[:100]}",
+                related_content=post,
+            )
         
         messages.success(request, 'Your post has been deleted.')
         return redirect("posting:post_list")
 
     return render(request, "posting/delete_post.html", {"post": post})
 
-def post_map(request):
-    # Lazy publish: Check for scheduled posts that are due
-    Post.objects.filter(
-        status=Post.Status.SCHEDULED,
-        publish_at__lte=timezone.now()
-    ).update(status=Post.Status.PUBLISHED)
 
+def _post_qr_etag(request, post_id, fmt):
+    return qr.post_qr_etag(post_id, fmt) if fmt in qr.FORMATS else None
+
+
+@condition(etag_func=_post_qr_etag)
+def post_qr(request, post_id, fmt):
+    """
+    QR code (PNG or SVG) for a post, rendered on demand from the post id.
+    The URL carries the content hash (?v=...), so responses are immutable and
+    revalidate with a strong ETag; `condition` answers If-None-Match with a 304.
+    """
+    if fmt not in qr.FORMATS:
+        raise Http404("Unknown QR format")
+
+    post = get_object_or_404(Post.objects.only("id", "author_id", "status", "visibility", "is_deleted"), id=post_id)
+    if not user_can_view_post(request.user, post):
+        raise Http404("Post not found")
+
+    digest, content = qr.get_post_qr(post_id, fmt)
+    response = HttpResponse(content, content_type=qr.FORMATS[fmt])
+    response["ETag"] = f'"{digest}"'
+    is_public = post.visibility == Post.Visibility.PUBLIC and post.status == Post.Status.PUBLISHED
+    response["Cache-Control"] = (
+        f"{'public' if is_public else 'private'}, max-age=31536000, immutable"
+    )
+    return response
+
+def post_map(request):
     # Only posts that actually have a location with coordinates
     posts = (
         Post.objects
+        .active_feed()
         .select_related("location")
         .filter(
             location__isnull=False,
             location__latitude__isnull=False,
             location__longitude__isnull=False,
-            is_deleted=False,
-            created_at__gte=two_days_ago,
         )
-        .filter(
-            Q(pickup_deadline__isnull=True) | Q(pickup_deadline__gt=timezone.now())
-            )
     )
 
     posts = apply_visibility_filter(posts, request.user)
@@ -436,18 +460,6 @@ def post_map(request):
     }
     return render(request, "posting/post_map.html", context)
 
-def haversine_distance_km(lat1, lon1, lat2, lon2):
-    R = 6371
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = (math.sin(dlat/2)**2 +
-         math.cos(math.radians(lat1)) *
-         math.cos(math.radians(lat2)) *
-         math.sin(dlon/2)**2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    return R * c
-
-
 @login_required
 @require_POST
 def thank_organizer(request):
@@ -482,39 +494,66 @@ def thank_organizer(request):
         })
 
 
+def _export_date(value):
+    if not value:
+        return None
+    parsed = parse_date(value)  # None for malformed input, ValueError for impossible dates
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
 
 
 @staff_member_required
 def export_data(request):
-    #Export anonymized data about posts as a CSV file.
-    #Admin-only (staff).
-
-    # Tell browser we are returning a CSV file
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="uva_leftovers_data.csv"'
-
-    writer = csv.writer(response)
-
-    # ---- Overall metrics ----
-    total_posts = Post.objects.count()
+    """
+    Stream an export as CSV or JSON lines. Admin-only (staff).
+    Query parameters: dataset (summary, posts, rsvps, cuisine_daily, organizer_daily), format (csv, jsonl),
+    start / end (YYYY-MM-DD, inclusive) and anonymize (1 by default; 0 to include usernames).
+    """
+    dataset = request.GET.get("dataset", "summary")
+    fmt = request.GET.get("format", "csv")
+    try:
+        start = _export_date(request.GET.get("start"))
+        end = _export_date(request.GET.get("end"))
+    except ValueError:
+        return HttpResponseBadRequest("start and end must be dates (YYYY-MM-DD)")
+    anonymize = request.GET.get("anonymize", "1") != "0"
 
-    writer.writerow(["Metric", "Value"])
-    writer.writerow(["Total posts", total_posts])
-    writer.writerow([])
+    try:
+        lines = export.stream(dataset, fmt, start, end, anonymize)
+    except export.ExportError as exc:
+        return HttpResponseBadRequest(str(exc))
 
-    # ---- Posts by cuisine (anonymized: no user info) ----
-    writer.writerow(["Cuisine", "Post count"])
+    response = StreamingHttpResponse(lines, content_type=export.FORMATS[fmt])
+    name = "data" if dataset == "summary" else dataset
+    response["Content-Disposition"] = f'attachment; filename="uva_leftovers_{name}.{fmt}"'
+    return response
 
-    cuisine_counts = (
-        Post.objects.values("cuisine__name")
-        .annotate(count=Count("id"))
-        .order_by("cuisine__name")
-    )
 
-    for row in cuisine_counts:
-        writer.writerow([row["cuisine__name"], row["count"]])
+@staff_member_required
+def analytics_dashboard(request):
+    """
+    Posts per cuisine per week and RSVP conversion per organizer, read from the
+    daily rollups. Admin-only (staff). ?weeks= sets the window (default 12).
+    """
+    try:
+        weeks = min(max(int(request.GET.get("weeks", 12)), 1), 104)
+    except ValueError:
+        weeks = 12
+    start = timezone.localdate() - timedelta(weeks=weeks)
+
+    cuisine_weeks = {}
+    for row in analytics.cuisine_weekly(start=start):
+        cuisine_weeks.setdefault(row["week"], []).append(row)
+
+    return render(request, "posting/analytics.html", {
+        "weeks": weeks,
+        "start": start,
+        "cuisine_weeks": sorted(cuisine_weeks.items(), reverse=True),
+        "organizers": analytics.organizer_conversion(start=start),
+        "processed_until": analytics.processed_until(),
+    })
 
-    return response
 
 @login_required
 def create_rsvp(request, post_id):
@@ -634,12 +673,32 @@ def view_post_rsvps(request, post_id):
 
 @login_required
 def notification_inbox(request):
-    notifications = Notification.objects.filter(
-        user=request.user
-    ).select_related("post", "rsvp").order_by("-created_at")
+    # Read notifications past the retention horizon live in the archive (moderation/archive.py)
+    show_archived = request.GET.get("archived") == "1"
+    if show_archived:
+        # Paged, so a page only decompresses the archive segments it needs
+        notifications = Paginator(archive.ArchivedRows("notification", request.user.id), 20).get_page(
+            request.GET.get("page")
+        )
+    else:
+        notifications = Notification.objects.filter(
+            user=request.user
+        ).select_related("post", "rsvp").order_by("-created_at")
 
     # Mark all unread as read once user visits inbox
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    if Notification.objects.filter(user=request.user, is_read=False).update(is_read=True):
+        badges.invalidate_user(request.user.id)
+
+    return render(request, "posting/notification_inbox.html", {
+        "notifications": notifications,
+        "show_archived": show_archived,
+        "archived_count": archive.archived_count("notification", request.user.id),
+    })
 
-    return render(request, "posting/notification_inbox.html", {"notifications": notifications})
 
+@login_required
+def badge_counts(request):
+    """Navbar counters as JSON, so the badges can refresh without a page load"""
+    response = JsonResponse(badges.get_counts(request.user))
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from profiles import search
+
+
+def create_search_index(apps, schema_editor):
+    """Enable pg_trgm and add trigram GIN indexes for people search (Postgres only)."""
+    search.create_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('profiles', '0017_add_bio_major_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
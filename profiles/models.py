@@ -43,23 +43,8 @@ class Profile(models.Model):
 
     def is_suspended(self):
         """Check if user has an active suspension"""
-        from moderation.models import UserSuspension
-        active_suspension = UserSuspension.objects.filter(
-            user=self.user,
-            is_active=True
-        ).first()
-        
-        if not active_suspension:
-            return False
-        
-        # Check if temporary suspension has expired
-        if active_suspension.is_expired():
-            # Auto-reinstate expired suspensions
-            active_suspension.is_active = False
-            active_suspension.save()
-            return False
-        
-        return True
+        from moderation.suspensions import suspensions
+        return suspensions.is_suspended(self.user_id)
     
     def save(self, *args, **kwargs):
         try:
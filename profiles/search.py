@@ -0,0 +1,314 @@
+"""
+People search (username, email, display name) with typo tolerance.
+
+Postgres: pg_trgm GIN indexes on lower(username), lower(email) and
+lower(display_name); matches are ranked by trigram word similarity, and each
+search runs under a statement timeout.
+
+Other databases (SQLite in development): an in-process trigram index over the
+same three fields, built with one query and reloaded when another process
+reports a change through the shared version key (or after RELOAD_INTERVAL).
+Scoring stops once the latency budget is spent and returns the best so far.
+
+Both backends match and rank the same way (see _score and _PG_SEARCH), best
+match first:
+- 3: the username or display name is the query;
+- 2: a word of the username or display name, or the email, starts with it;
+- 1.5: the username or display name contains it;
+- otherwise trigram word similarity to the username or display name, if at
+  least MIN_SIMILARITY.
+Emails only ever match by prefix, so a shared domain does not match everyone.
+Queries shorter than SHORT_QUERY characters only match by prefix.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import DatabaseError, OperationalError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 50
+LATENCY_BUDGET_MS = 150
+MIN_SIMILARITY = 0.3  # trigram word similarity below this is not a match
+SHORT_QUERY = 3  # characters; shorter queries say too little for substring or trigram matches
+RELOAD_INTERVAL = 300  # seconds
+VERSION_KEY = "profiles:people_index:version"
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Cached result of uses_trigram_index(); reset when the index is created or dropped
+_trigram_enabled = None
+
+_PG_INDEXES = {
+    "auth_user_username_trgm": "auth_user USING GIN (lower(username) gin_trgm_ops)",
+    "auth_user_email_trgm": "auth_user USING GIN (lower(email) gin_trgm_ops)",
+    "profiles_profile_display_name_trgm": "profiles_profile USING GIN (lower(display_name) gin_trgm_ops)",
+}
+
+_PG_PREFIX_MATCH = """
+        lower(u.username) LIKE %(prefix)s OR lower(u.username) LIKE %(word_prefix)s
+        OR lower(coalesce(p.display_name, '')) LIKE %(prefix)s
+        OR lower(coalesce(p.display_name, '')) LIKE %(word_prefix)s
+        OR lower(u.email) LIKE %(prefix)s
+"""
+
+_PG_FUZZY_MATCH = """
+        lower(u.username) LIKE %(substring)s OR lower(coalesce(p.display_name, '')) LIKE %(substring)s
+        OR %(q)s <%% lower(u.username) OR %(q)s <%% lower(p.display_name)
+"""
+
+_PG_SEARCH = """
+    SELECT u.id, GREATEST(
+        CASE WHEN lower(u.username) = %(q)s OR lower(coalesce(p.display_name, '')) = %(q)s THEN 3 ELSE 0 END,
+        CASE WHEN {prefix_match} THEN 2 ELSE 0 END,
+        CASE WHEN lower(u.username) LIKE %(substring)s OR lower(coalesce(p.display_name, '')) LIKE %(substring)s
+             THEN 1.5 ELSE 0 END,
+        word_similarity(%(q)s, lower(u.username)),
+        word_similarity(%(q)s, lower(coalesce(p.display_name, '')))
+    ) AS score
+    FROM auth_user u
+    LEFT JOIN profiles_profile p ON p.user_id = u.id
+    WHERE u.is_active AND ({match}) {among}
+    ORDER BY score DESC, lower(u.username)
+    LIMIT %(limit)s
+"""
+
+
+def normalize(text):
+    return " ".join(_WORD_RE.findall((text or "").lower()))
+
+
+def trigrams(text):
+    """pg_trgm-style trigrams: each word padded with two spaces in front and one behind"""
+    grams = set()
+    for word in _WORD_RE.findall((text or "").lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _score(query, query_grams, fields):
+    """How well (username, email, display name), all lowercased, match the query"""
+    username, email, display_name = fields
+    names = [value for value in (username, display_name) if value]
+    if query in names:
+        return 3.0
+    if email.startswith(query) or any(f" {query}" in f" {value}" for value in names):
+        return 2.0
+    if len(query) < SHORT_QUERY:
+        return 0.0
+    if any(query in value for value in names):
+        return 1.5
+    if not query_grams:
+        return 0.0
+    # Roughly pg_trgm's word_similarity: the share of the query's trigrams found in the value
+    return max((len(query_grams & trigrams(value)) / len(query_grams) for value in names), default=0.0)
+
+
+class PeopleIndex:
+    """In-process trigram index of every active user's searchable fields"""
+
+    def __init__(self, reload_interval=RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self._entries = {}  # user id -> (username, email, display name), lowercased
+        self._postings = {}  # trigram -> set of user ids
+        self._version = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self):
+        if self._loaded_at is None:
+            return True
+        if time.monotonic() - self._loaded_at > self.reload_interval:
+            return True
+        return cache.get(VERSION_KEY) != self._version
+
+    @staticmethod
+    def _rows(user_ids=None):
+        from django.contrib.auth.models import User
+        users = User.objects.filter(is_active=True)
+        if user_ids is not None:
+            users = users.filter(id__in=user_ids)
+        for user_id, username, email, display_name in users.values_list(
+            "id", "username", "email", "profile__display_name"
+        ):
+            # Lowercased like the lower(...) expressions the Postgres backend matches against
+            yield user_id, (username.lower(), (email or "").lower(), (display_name or "").lower())
+
+    @staticmethod
+    def _add(postings, user_id, fields):
+        for gram in trigrams(" ".join(fields)):
+            postings.setdefault(gram, set()).add(user_id)
+
+    def load(self):
+        version = cache.get(VERSION_KEY)
+        entries, postings = {}, {}
+        for user_id, fields in self._rows():
+            entries[user_id] = fields
+            self._add(postings, user_id, fields)
+        with self._lock:
+            self._entries = entries
+            self._postings = postings
+            self._version = version
+            self._loaded_at = time.monotonic()
+
+    def user_changed(self, user_id):
+        """Re-read one user; if their searchable fields changed, tell the other processes"""
+        if self._is_stale():
+            self.load()
+        fields = dict(self._rows([user_id])).get(user_id)
+        with self._lock:
+            old = self._entries.get(user_id)
+            if old == fields:
+                return
+            if old is not None:
+                for gram in trigrams(" ".join(old)):
+                    self._postings.get(gram, set()).discard(user_id)
+                del self._entries[user_id]
+            if fields is not None:
+                self._entries[user_id] = fields
+                self._add(self._postings, user_id, fields)
+            self._version = time.time_ns()
+        cache.set(VERSION_KEY, self._version, None)
+
+    def search(self, query, limit=MAX_RESULTS, among=None, budget_ms=LATENCY_BUDGET_MS):
+        if self._is_stale():
+            self.load()
+        deadline = time.monotonic() + budget_ms / 1000
+        query_grams = trigrams(query)
+        with self._lock:
+            entries = self._entries
+            if len(query) < SHORT_QUERY:
+                # Too short for trigrams to narrow it down: every user is scored (prefix only)
+                candidates = list(entries)
+            else:
+                hits = Counter()
+                for gram in query_grams:
+                    hits.update(self._postings.get(gram, ()))
+                needed = max(1, int(len(query_grams) * MIN_SIMILARITY))
+                candidates = [user_id for user_id, count in hits.most_common() if count >= needed]
+
+        scored = []
+        for i, user_id in enumerate(candidates):
+            if i % 256 == 0 and time.monotonic() > deadline:
+                logger.warning("People search for %r ran out of time after %d candidates", query, i)
+                break
+            if among is not None and user_id not in among:
+                continue
+            fields = entries.get(user_id)
+            if fields is None:
+                continue  # removed meanwhile
+            score = _score(query, query_grams, fields)
+            if score >= MIN_SIMILARITY:
+                scored.append((-score, fields[0], user_id))
+        scored.sort()
+        return [user_id for _, _, user_id in scored[:limit]]
+
+    def invalidate(self):
+        cache.set(VERSION_KEY, time.time_ns(), None)
+        self._loaded_at = None
+
+
+people_index = PeopleIndex()
+
+
+def uses_trigram_index():
+    """True if the database has the pg_trgm indexes"""
+    global _trigram_enabled
+    if _trigram_enabled is None:
+        _trigram_enabled = False
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", ["auth_user_username_trgm"])
+                _trigram_enabled = cursor.fetchone() is not None
+    return _trigram_enabled
+
+
+def create_index(schema_editor):
+    """Enable pg_trgm and create the GIN indexes (called from a migration; Postgres only)"""
+    global _trigram_enabled
+    _trigram_enabled = None
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, target in _PG_INDEXES.items():
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def drop_index(schema_editor):
+    global _trigram_enabled
+    _trigram_enabled = None
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in _PG_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def _search_postgres(query, limit, among, budget_ms):
+    escaped = query.replace("%", r"\%").replace("_", r"\_")
+    params = {
+        "q": query,
+        "prefix": escaped + "%",
+        "word_prefix": "% " + escaped + "%",
+        "substring": "%" + escaped + "%",
+        "limit": limit,
+    }
+    match = _PG_PREFIX_MATCH
+    if len(query) >= SHORT_QUERY:
+        match += " OR " + _PG_FUZZY_MATCH
+    among_sql = ""
+    if among is not None:
+        among_sql = "AND u.id = ANY(%(among)s)"
+        params["among"] = list(among)
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s", [int(budget_ms)])
+            # The threshold of the <% operator (default 0.6), so both backends agree on fuzzy matches
+            cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(MIN_SIMILARITY)])
+            cursor.execute(_PG_SEARCH.format(prefix_match=_PG_PREFIX_MATCH, match=match, among=among_sql), params)
+            return [row[0] for row in cursor.fetchall()]
+    except OperationalError:
+        logger.warning("People search for %r exceeded %d ms", query, budget_ms)
+        return []
+
+
+def search_user_ids(query, limit=MAX_RESULTS, among=None, budget_ms=LATENCY_BUDGET_MS):
+    """
+    Ids of active users matching the query, best match first.
+    `among` restricts the search to a set of user ids (e.g. someone's friends).
+    """
+    query = normalize(query) if "@" not in query else query.strip().lower()
+    if not query or (among is not None and not among):
+        return []
+    if uses_trigram_index():
+        return _search_postgres(query, limit, among, budget_ms)
+    return people_index.search(query, limit, among, budget_ms)
+
+
+def search_users(query, queryset=None, limit=MAX_RESULTS, among=None, exclude=()):
+    """
+    Users matching the query as a list, best match first.
+    `exclude` drops user ids before the limit is applied. `queryset` is applied
+    after it (use it for select_related), so filtering there can return fewer
+    than `limit` users even when more match.
+    """
+    from django.contrib.auth.models import User
+    exclude = set(exclude)
+    ids = [user_id for user_id in search_user_ids(query, limit + len(exclude), among) if user_id not in exclude]
+    if queryset is None:
+        queryset = User.objects.select_related("profile")
+    users = queryset.in_bulk(ids)
+    return [users[user_id] for user_id in ids if user_id in users][:limit]
+
+
+def user_changed(user_id):
+    """Keep the in-process index current after a user or profile was saved or deleted"""
+    try:
+        if not uses_trigram_index():
+            people_index.user_changed(user_id)
+    except DatabaseError:
+        people_index.invalidate()
@@ -1,10 +1,11 @@
 from django.core.files.base import ContentFile
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from allauth.account.signals import user_logged_in
 from allauth.socialaccount.models import SocialAccount
 from .models import Profile
+from . import search
 import os , mimetypes, requests
 from django.core.files.base import ContentFile
 from django.db import transaction
@@ -36,6 +37,17 @@ def update_staff_status_on_role_change(sender, instance, created, **kwargs):
         user.is_staff = False
         user.save(update_fields=['is_staff'])
 
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+def update_people_search(sender, instance, **kwargs):
+    """Keep the in-process people search index current (no-op with pg_trgm)"""
+    update_fields = kwargs.get("update_fields")
+    if update_fields and not {"username", "email", "is_active", "display_name"} & set(update_fields):
+        return
+    user_id = instance.pk if sender is User else instance.user_id
+    transaction.on_commit(lambda: search.user_changed(user_id))
+
 @receiver(user_logged_in)
 def update_profile_from_google(sender, request, user, **kwargs):
     profile, _ = Profile.objects.get_or_create(
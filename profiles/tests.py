@@ -1,3 +1,51 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from . import search
+from .models import Profile
+
+
+class SearchUsersTests(TestCase):
+    def setUp(self):
+        search.people_index.invalidate()
+        self.addCleanup(search.people_index.invalidate)
+        self.users = [User.objects.create_user(f"samwise{i}") for i in range(4)]
+
+    def test_limit_applies_after_exclude(self):
+        excluded = {self.users[0].id, self.users[1].id}
+        results = search.search_users("samwise", limit=2, exclude=excluded)
+        self.assertEqual(len(results), 2)
+        self.assertFalse({user.id for user in results} & excluded)
+
+    def test_among_restricts_results(self):
+        results = search.search_users("samwise", among={self.users[2].id})
+        self.assertEqual([user.id for user in results], [self.users[2].id])
+
+
+class PeopleMatchingTests(TestCase):
+    def setUp(self):
+        search.people_index.invalidate()
+        self.addCleanup(search.people_index.invalidate)
+        self.sam = User.objects.create_user("samwise", email="gardener@shire.example")
+        self.rosie = User.objects.create_user("rosie", email="rosie@shire.example")
+        Profile.objects.filter(user=self.rosie).update(display_name="Rosie Cotton")
+        search.people_index.invalidate()
+
+    def test_emails_match_by_prefix_only(self):
+        # Ranked first; the other address is only a fuzzy match (same domain)
+        self.assertEqual(search.search_user_ids("gardener@shire.example")[0], self.sam.id)
+        self.assertEqual(search.search_user_ids("garden"), [self.sam.id])
+        # The domain is a substring of every address; it must not match everyone
+        self.assertEqual(search.search_user_ids("shire"), [])
+
+    def test_ranking(self):
+        self.assertEqual(search.search_user_ids("rosie"), [self.rosie.id])  # exact username
+        self.assertEqual(search.search_user_ids("cot"), [self.rosie.id])  # word prefix of the display name
+        self.assertEqual(search.search_user_ids("wise"), [self.sam.id])  # substring of the username
+        self.assertEqual(search.search_user_ids("samwyse"), [self.sam.id])  # fuzzy
+
+    def test_short_queries_match_by_prefix_within_the_budget(self):
+        self.assertEqual(search.search_user_ids("co"), [self.rosie.id])
+        self.assertEqual(search.search_user_ids("is"), [])  # a substring, not a prefix
+        with self.assertLogs(search.logger, "WARNING"):
+            self.assertEqual(search.search_user_ids("ro", budget_ms=-1), [])
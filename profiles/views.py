@@ -4,7 +4,7 @@ from django.contrib.auth import logout
 from .models import Profile
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.models import User
-from Friendslist.models import Friend;
+from Friendslist.graph import friend_graph
 from posting.models import Post;
 from userprivileges.roles import is_moderator
 
@@ -145,7 +145,7 @@ def profile_edit(request):
 def view_profile(request, user_id):
     profile_user = get_object_or_404(User, pk=user_id)
     profile = getattr(profile_user, "profile", None)  # assuming OneToOne Profile
-    is_friend = Friend.are_friends(request.user, profile_user)
+    is_friend = friend_graph.are_friends(request.user, profile_user)
     user_posts = (
         Post.objects
         .filter(author=profile_user, is_deleted=False)  # or whatever field you use